@@ -1,12 +1,26 @@
-import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
+import hashlib
+import json
 import logging
+from scoring_rules import FundamentalRules
+
+# numpy is imported on first use so that importing this module stays cheap
 
 logger = logging.getLogger(__name__)
 
 class StockAnalyzer:
-    def __init__(self):
+    # Bump whenever scoring logic changes so stored results are recomputed
+    ANALYSIS_VERSION = 1
+    
+    def __init__(self, sector_stats=None, use_kernels=False, scoring_config=None, fundamental_parity=False):
+        # Optional SectorStatistics; when set, P/E and P/B are scored
+        # against the sector median instead of absolute bands
+        self.sector_stats = sector_stats
+        
+        # Opt into the NumPy kernels in indicators.py: Wilder RSI instead
+        # of a simple rolling mean, plus ATR, Bollinger %B and ADX
+        self.use_kernels = use_kernels
+        
         self.fundamental_weights = {
             'pe_ratio': 0.15,
             'pb_ratio': 0.10,
@@ -17,6 +31,12 @@ class StockAnalyzer:
             'revenue_growth': 0.15,
             'dividend_yield': 0.10
         }
+        self.fundamental_weights.update((scoring_config or {}).get('fundamental_weights') or {})
+        
+        # Point bands per metric (scoring_rules.py), optionally overridden by config
+        self.fundamental_rules = FundamentalRules.from_config(scoring_config)
+        # Also score with the if/elif form of the default rules and log any difference
+        self.fundamental_parity = fundamental_parity
         
         self.technical_weights = {
             'rsi': 0.25,
@@ -26,8 +46,49 @@ class StockAnalyzer:
             'support_resistance': 0.15
         }
     
-    def analyze_stock(self, stock_data):
-        """Main analysis function to evaluate if stock meets criteria"""
+    def get_parameter_version(self):
+        """Hash of the analysis version and scoring parameters"""
+        params = json.dumps({
+            'version': self.ANALYSIS_VERSION,
+            'use_kernels': self.use_kernels,
+            'fundamental_weights': self.fundamental_weights,
+            'fundamental_rules': self.fundamental_rules.to_dict(),
+            'technical_weights': self.technical_weights
+        }, sort_keys=True)
+        return hashlib.sha1(params.encode('utf-8')).hexdigest()[:12]
+    
+    def fingerprint_inputs(self, stock_data):
+        """Fingerprint everything analyze_stock depends on.
+        
+        Covers the last bar (date and close), the fundamentals, the sector
+        medians used for relative scoring and the parameter version; if none
+        of these changed, re-running the analysis would give the same result.
+        """
+        hist_data = stock_data['historical_data']
+        fundamental_data = stock_data['fundamental_data']
+        sector = fundamental_data.get('sector')
+        
+        inputs = {
+            'last_bar': hist_data.index[-1].strftime('%Y-%m-%d'),
+            'last_close': round(float(hist_data['Close'].iloc[-1]), 4),
+            'bars': len(hist_data),
+            'fundamentals': json.dumps(fundamental_data, sort_keys=True, default=str),
+            'params': self.get_parameter_version()
+        }
+        if self.sector_stats is not None:
+            inputs['sector_medians'] = [
+                self.sector_stats.get(sector, metric) for metric in ('pe_ratio', 'pb_ratio')
+            ]
+        
+        encoded = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+    
+    def analyze_stock(self, stock_data, fundamental_score=None):
+        """Main analysis function to evaluate if stock meets criteria.
+        
+        ``fundamental_score`` takes a score already computed in bulk by
+        score_fundamentals; otherwise it is computed here.
+        """
         try:
             # Check basic price decline criteria (30-40% in last 2 years)
             price_decline = stock_data['price_decline']
@@ -39,7 +100,8 @@ class StockAnalyzer:
                 return None
             
             # Fundamental analysis
-            fundamental_score = self.analyze_fundamentals(stock_data['fundamental_data'])
+            if fundamental_score is None:
+                fundamental_score = self.analyze_fundamentals(stock_data['fundamental_data'])
             
             # Technical analysis
             technical_score = self.analyze_technical(stock_data)
@@ -76,16 +138,14 @@ class StockAnalyzer:
             if len(recent_data) < 30:  # Need at least 30 days of data
                 return False
             
-            max_price_2y = stock_data['max_price_2y']
-            recent_prices = recent_data['Close']
-            
-            # Calculate decline range for recent prices
-            recent_declines = [(max_price_2y - price) / max_price_2y * 100 for price in recent_prices]
+            import numpy as np
+            import consolidation
             
             # Check if most recent prices are in 25-45% decline range (with some buffer)
-            in_range_count = sum(1 for decline in recent_declines if 25 <= decline <= 45)
+            recent_prices = recent_data['Close'].to_numpy(dtype=np.float64)
+            in_range = consolidation.in_band(recent_prices, stock_data['max_price_2y'], lower=25, upper=45)
             
-            return (in_range_count / len(recent_declines)) >= 0.7  # 70% of recent prices in range
+            return in_range.mean() >= 0.7  # 70% of recent prices in range
             
         except Exception as e:
             logger.error(f"Error checking hovering range: {str(e)}")
@@ -93,23 +153,111 @@ class StockAnalyzer:
     
     def analyze_fundamentals(self, fundamental_data):
         """Analyze fundamental strength of the stock"""
+        try:
+            sector = fundamental_data.get('sector')
+            relatives = None
+            if self.sector_stats is not None and sector:
+                relatives = {
+                    metric: self.get_sector_relative(sector, metric, fundamental_data.get(metric))
+                    for metric in self.fundamental_rules.relative_metrics
+                }
+            score = self.fundamental_rules.score(fundamental_data, relatives)
+            
+            if self.fundamental_parity:
+                reference = self.analyze_fundamentals_reference(fundamental_data)
+                if reference != score:
+                    logger.warning(f"Fundamental score mismatch: rules {score}, reference {reference} "
+                                   f"for {json.dumps(fundamental_data, sort_keys=True, default=str)}")
+            
+            return score
+        
+        except Exception as e:
+            logger.error(f"Error in fundamental analysis: {str(e)}")
+            return 0
+    
+    def score_fundamentals(self, fundamentals):
+        """Fundamental scores for many symbols at once (a list of fundamental_data dicts).
+        
+        Builds one float column per metric and evaluates every rule with
+        np.select; rows with a non-numeric metric score 0, as
+        analyze_fundamentals does when a comparison fails. Returns None
+        if the batch fails.
+        """
+        try:
+            import numpy as np
+            
+            # Columns are built from lists (None -> NaN); filling a numpy matrix
+            # element by element costs more than the scoring itself
+            values = {}
+            valid = np.ones(len(fundamentals), dtype=bool)
+            for metric in self.fundamental_rules.rules:
+                column = [fundamental_data.get(metric) for fundamental_data in fundamentals]
+                if not set(map(type, column)) <= {int, float, bool, type(None)}:
+                    invalid = [value is not None and not isinstance(value, (int, float)) for value in column]
+                    if any(invalid):
+                        valid &= ~np.array(invalid)
+                        column = [None if bad else value for value, bad in zip(column, invalid)]
+                values[metric] = np.array(column, dtype=np.float64)
+            
+            # Value / sector median where get_sector_relative would give one, else NaN
+            relatives = {}
+            sectors = [fundamental_data.get('sector') for fundamental_data in fundamentals]
+            for metric in self.fundamental_rules.relative_metrics:
+                if self.sector_stats is None:
+                    continue
+                medians = {sector: self.sector_stats.scoring_median(sector, metric) for sector in set(sectors) if sector}
+                median = np.array([medians.get(sector) or np.nan for sector in sectors], dtype=np.float64)
+                with np.errstate(invalid='ignore'):
+                    relatives[metric] = np.where(values[metric] > 0, values[metric] / median, np.nan)
+            
+            scores = np.where(valid, self.fundamental_rules.score_many(values, relatives), 0.0).tolist()
+            
+            if self.fundamental_parity:
+                for fundamental_data, score in zip(fundamentals, scores):
+                    reference = self.analyze_fundamentals_reference(fundamental_data)
+                    if abs(reference - score) > 1e-9:
+                        logger.warning(f"Fundamental score mismatch: rules {score}, reference {reference} "
+                                       f"for {json.dumps(fundamental_data, sort_keys=True, default=str)}")
+            
+            return scores
+        
+        except Exception as e:
+            logger.error(f"Error in batch fundamental analysis: {str(e)}")
+            return None
+    
+    def analyze_fundamentals_reference(self, fundamental_data):
+        """The default scoring rules as an if/elif chain, the reference for parity checks"""
         try:
             score = 0
             max_score = 10
             
+            sector = fundamental_data.get('sector')
+            pe_relative = self.get_sector_relative(sector, 'pe_ratio', fundamental_data.get('pe_ratio'))
+            pb_relative = self.get_sector_relative(sector, 'pb_ratio', fundamental_data.get('pb_ratio'))
+            
             # P/E Ratio Analysis
             pe_ratio = fundamental_data.get('pe_ratio')
-            if pe_ratio and 5 <= pe_ratio <= 25:  # Reasonable P/E
-                score += 1.5
-            elif pe_ratio and pe_ratio <= 15:  # Good P/E
+            if pe_relative is not None:
+                if pe_relative <= 0.8:  # Well below sector P/E
+                    score += 2
+                elif pe_relative <= 1.1:  # In line with sector P/E
+                    score += 1.5
+            elif pe_ratio and 5 <= pe_ratio <= 15:  # Good P/E
                 score += 2
+            elif pe_ratio and 5 <= pe_ratio <= 25:  # Reasonable P/E
+                score += 1.5
             
             # P/B Ratio Analysis
             pb_ratio = fundamental_data.get('pb_ratio')
-            if pb_ratio and pb_ratio <= 3:  # Good P/B
-                score += 1
+            if pb_relative is not None:
+                if pb_relative <= 0.75:  # Well below sector P/B
+                    score += 1.5
+                elif pb_relative <= 1.0:  # Below sector P/B
+                    score += 1
             elif pb_ratio and pb_ratio <= 1.5:  # Excellent P/B
                 score += 1.5
+            elif pb_ratio and pb_ratio <= 3:  # Good P/B
+                score += 1
             
             # Return on Equity
             roe = fundamental_data.get('roe')
@@ -158,6 +306,12 @@ class StockAnalyzer:
             logger.error(f"Error in fundamental analysis: {str(e)}")
             return 0
     
+    def get_sector_relative(self, sector, metric, value):
+        """Value as a multiple of its sector median, or None without sector stats"""
+        if self.sector_stats is None or not sector or value is None or value <= 0:
+            return None
+        return self.sector_stats.relative(sector, metric, value)
+    
     def analyze_technical(self, stock_data):
         """Analyze technical indicators for potential upward movement"""
         try:
@@ -199,15 +353,7 @@ class StockAnalyzer:
     def calculate_rsi(self, prices, period=14):
         """Calculate Relative Strength Index"""
         try:
-            delta = prices.diff()
-            gain = delta.where(delta > 0, 0)
-            loss = -delta.where(delta < 0, 0)
-            
-            avg_gain = gain.rolling(window=period).mean()
-            avg_loss = loss.rolling(window=period).mean()
-            
-            rs = avg_gain / avg_loss
-            rsi = 100 - (100 / (1 + rs))
+            rsi = self.calculate_rsi_series(prices, period)
             
             return rsi.iloc[-1] if not rsi.empty else None
             
@@ -215,14 +361,41 @@ class StockAnalyzer:
             logger.error(f"Error calculating RSI: {str(e)}")
             return None
     
+    def calculate_rsi_series(self, prices, period=14):
+        """Calculate the Relative Strength Index for every bar"""
+        if self.use_kernels:
+            import pandas as pd
+            import indicators
+            return pd.Series(indicators.wilder_rsi(prices.to_numpy(), period), index=prices.index)
+        
+        delta = prices.diff()
+        gain = delta.where(delta > 0, 0)
+        loss = -delta.where(delta < 0, 0)
+        
+        avg_gain = gain.rolling(window=period).mean()
+        avg_loss = loss.rolling(window=period).mean()
+        
+        rs = avg_gain / avg_loss
+        return 100 - (100 / (1 + rs))
+    
+    def calculate_macd(self, prices):
+        """MACD line, signal line and histogram for every bar"""
+        if self.use_kernels:
+            import pandas as pd
+            import indicators
+            lines = indicators.macd(prices.to_numpy())
+            return tuple(pd.Series(line, index=prices.index) for line in lines)
+        
+        exp1 = prices.ewm(span=12).mean()
+        exp2 = prices.ewm(span=26).mean()
+        macd = exp1 - exp2
+        signal = macd.ewm(span=9).mean()
+        return macd, signal, macd - signal
+    
     def analyze_macd(self, prices):
         """Analyze MACD for trend direction"""
         try:
-            exp1 = prices.ewm(span=12).mean()
-            exp2 = prices.ewm(span=26).mean()
-            macd = exp1 - exp2
-            signal = macd.ewm(span=9).mean()
-            histogram = macd - signal
+            macd, signal, histogram = self.calculate_macd(prices)
             
             # Check recent MACD signals
             recent_macd = macd.tail(5)
@@ -303,10 +476,11 @@ class StockAnalyzer:
     def analyze_support_resistance(self, prices):
         """Analyze support and resistance levels"""
         try:
-            recent_prices = prices.tail(60)  # Last 60 days
+            import numpy as np
+            recent_prices = prices.to_numpy(dtype=np.float64)[-60:]  # Last 60 days
             
             # Find potential support level (recent lows)
-            support_level = recent_prices.min()
+            support_level = np.nanmin(recent_prices)
             current_price = prices.iloc[-1]
             
             score = 0
@@ -316,7 +490,7 @@ class StockAnalyzer:
                 score += 1
             
             # Price bounced from support recently
-            if any(price <= support_level * 1.01 for price in recent_prices.tail(10)):
+            if np.nanmin(recent_prices[-10:]) <= support_level * 1.01:
                 score += 0.5
             
             return min(score, 1.5)
@@ -338,8 +512,12 @@ class StockAnalyzer:
         else:
             return "Avoid"
     
-    def get_detailed_analysis(self, stock_data):
-        """Get detailed analysis for a specific stock"""
+    def get_detailed_analysis(self, stock_data, features=None):
+        """Get detailed analysis for a specific stock.
+        
+        ``features`` is a stored daily feature row; when it is for the latest
+        bar its indicators are used instead of being recomputed.
+        """
         try:
             analysis = self.analyze_stock(stock_data)
             if not analysis:
@@ -349,9 +527,16 @@ class StockAnalyzer:
             fundamental_data = stock_data['fundamental_data']
             hist_data = stock_data['historical_data']
             
+            if features and features.get('trade_date') != hist_data.index[-1].strftime('%Y-%m-%d'):
+                features = None
+            
             # Calculate additional metrics
-            volatility = hist_data['Close'].pct_change().std() * np.sqrt(252) * 100  # Annualized volatility
-            rsi = self.calculate_rsi(hist_data['Close'])
+            if features:
+                volatility, rsi = features.get('volatility'), features.get('rsi')
+            else:
+                import numpy as np
+                volatility = hist_data['Close'].pct_change().std() * np.sqrt(252) * 100  # Annualized volatility
+                rsi = self.calculate_rsi(hist_data['Close'])
             
             detailed = {
                 **analysis,
@@ -367,8 +552,126 @@ class StockAnalyzer:
                 }
             }
             
+            if self.use_kernels and features:
+                detailed['detailed_metrics'].update({
+                    key: None if features.get(key) is None else round(features[key], 4)
+                    for key in ('atr', 'bollinger_percent_b', 'adx')
+                })
+            elif self.use_kernels:
+                detailed['detailed_metrics'].update(self.calculate_kernel_metrics(hist_data))
+            
+            detailed['consolidation'] = self.analyze_consolidation(stock_data)
+            
             return detailed
             
         except Exception as e:
             logger.error(f"Error in detailed analysis: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+    
+    def analyze_consolidation(self, stock_data, windows=(30, 60, 90, 180)):
+        """Range and decline-band occupancy over several windows, and when the current consolidation started"""
+        try:
+            import numpy as np
+            import consolidation
+            hist_data = stock_data['historical_data']
+            return consolidation.detect(hist_data['Close'].to_numpy(dtype=np.float64),
+                                        reference_high=stock_data['max_price_2y'],
+                                        windows=windows, dates=hist_data.index)
+        
+        except Exception as e:
+            logger.error(f"Error detecting consolidation: {str(e)}")
+            return None
+    
+    def calculate_kernel_metrics(self, hist_data):
+        """Volatility-band and trend-strength metrics from the indicator kernels"""
+        import numpy as np
+        import indicators
+        
+        high = hist_data['High'].to_numpy(dtype=np.float64)
+        low = hist_data['Low'].to_numpy(dtype=np.float64)
+        close = hist_data['Close'].to_numpy(dtype=np.float64)
+        
+        def last(values):
+            value = values[-1] if len(values) else np.nan
+            return None if np.isnan(value) else round(float(value), 4)
+        
+        return {
+            'atr': last(indicators.atr(high, low, close)),
+            'bollinger_percent_b': last(indicators.bollinger_percent_b(close)),
+            'adx': last(indicators.adx(high, low, close))
+        }
+    
+    def extract_feature_series(self, stock_data, hover_days=90):
+        """Every intermediate indicator for every bar, one row per trading day.
+        
+        Each row uses only data up to that day: the 2-year high is the running
+        maximum, the hover ratio compares the trailing ``hover_days`` of closes
+        with that day's high, and volatility is the expanding annualized
+        standard deviation. The last row matches what analyze_stock,
+        is_hovering_in_range and get_detailed_analysis compute.
+        """
+        import numpy as np
+        import pandas as pd
+        import indicators
+        import consolidation
+        
+        hist_data = stock_data['historical_data']
+        close = hist_data['Close']
+        closes = close.to_numpy(dtype=np.float64)
+        high = hist_data['High'].to_numpy(dtype=np.float64)
+        low = hist_data['Low'].to_numpy(dtype=np.float64)
+        
+        max_price = np.fmax.accumulate(closes)
+        
+        # Share of trailing-window closes 25-45% below that day's 2-year high
+        starts = hist_data.index.searchsorted(hist_data.index - pd.Timedelta(days=hover_days))
+        hover_ratio = consolidation.running_high_occupancy(closes, starts, lower=25, upper=45, min_periods=30)
+        
+        macd, signal, histogram = self.calculate_macd(close)
+        volume = hist_data['Volume']
+        
+        features = pd.DataFrame({
+            'close': closes,
+            'max_price_2y': max_price,
+            'price_decline': (max_price - closes) / max_price * 100,
+            'hover_ratio': hover_ratio,
+            'rsi': self.calculate_rsi_series(close).to_numpy(),
+            'macd': macd.to_numpy(),
+            'macd_signal': signal.to_numpy(),
+            'macd_histogram': histogram.to_numpy(),
+            'ma20': close.rolling(window=20).mean().to_numpy(),
+            'ma50': close.rolling(window=50).mean().to_numpy(),
+            'ma200': close.rolling(window=200).mean().to_numpy(),
+            'volume': volume.to_numpy(dtype=np.float64),
+            'volume_ma20': volume.rolling(window=20).mean().to_numpy(),
+            'support_60': close.rolling(window=60, min_periods=1).min().to_numpy(),
+            'volatility': (close.pct_change().expanding(min_periods=2).std() * np.sqrt(252) * 100).to_numpy(),
+            'atr': indicators.atr(high, low, closes),
+            'bollinger_percent_b': indicators.bollinger_percent_b(closes),
+            'adx': indicators.adx(high, low, closes)
+        }, index=hist_data.index)
+        
+        features.insert(0, 'trade_date', hist_data.index.strftime('%Y-%m-%d'))
+        return features
+    
+    def extract_features(self, stock_data, series=None):
+        """Features of the latest bar, used by the screener"""
+        try:
+            import numpy as np
+            if series is None:
+                series = self.extract_feature_series(stock_data)
+            latest = series.iloc[-1]
+            
+            features = {
+                key: None if value is None or (isinstance(value, float) and np.isnan(value)) else value
+                for key, value in latest.items()
+            }
+            features['current_price'] = features.pop('close')
+            return {
+                key: round(float(value), 4) if isinstance(value, (int, float, np.floating)) else value
+                for key, value in features.items()
+            }
+        
+        except Exception as e:
+            logger.error(f"Error extracting features: {str(e)}")
+            return {}
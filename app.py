@@ -1,9 +1,20 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
 from datetime import datetime, timedelta
 import os
+import atexit
 from data_collector import StockDataCollector
 from analyzer import StockAnalyzer
+from scoring_rules import load_scoring_config
 from database import Database, Stock
+from sector_stats import SectorStatistics
+from chart_series import ChartSeriesCache, encode_array
+from live import LiveRanker
+from screener import FeatureTable
+from snapshot import SnapshotManager
+from singleflight import SingleFlight
+from profiling import SlowLog, StageTimer, profile_call, profiling_requested
+import export
+from columnar import create_analytics, to_records
 import logging
 
 # Configure logging
@@ -15,81 +26,671 @@ app.config['SECRET_KEY'] = 'your-secret-key-here'
 
 # Initialize components
 db = Database()
-collector = StockDataCollector()
-analyzer = StockAnalyzer()
+db.create_tables()
+sector_stats = SectorStatistics(db)
+sector_stats.load()
+flights = SingleFlight()
+slow_log = SlowLog(threshold=float(os.environ.get('SLOW_SYMBOL_SECONDS', 2.0)))
+# Optional: refresh price history for the whole scan over one pooled aiohttp session
+async_collector = None
+if os.environ.get('ASYNC_COLLECTOR') == '1':
+    from async_collector import AsyncStockDataCollector
+    async_collector = AsyncStockDataCollector(base_url=os.environ.get('YAHOO_BASE_URL'),
+                                              price_dtype=os.environ.get('PRICE_DTYPE', 'float64'))
+collector = StockDataCollector(sector_stats=sector_stats, db=db,
+                               price_dtype=os.environ.get('PRICE_DTYPE', 'float64'),
+                               flights=flights, async_collector=async_collector)
+analyzer = StockAnalyzer(sector_stats=sector_stats,
+                         use_kernels=os.environ.get('USE_INDICATOR_KERNELS') == '1',
+                         scoring_config=load_scoring_config(os.environ['SCORING_CONFIG'])
+                         if os.environ.get('SCORING_CONFIG') else None,
+                         fundamental_parity=os.environ.get('FUNDAMENTAL_PARITY') == '1')
+chart_series = ChartSeriesCache(analyzer)
+live_ranker = LiveRanker(collector, analyzer)
+feature_table = FeatureTable()
+feature_table.load(db.get_screen_features())
+# Cross-universe queries; ANALYTICS_ENGINE=duckdb answers them from a columnar copy
+analytics = create_analytics(db, os.environ.get('ANALYTICS_ENGINE'))
+
+FEATURE_FLUSH_SIZE = 100
+
+# Warm start: cached stock records are mapped from the last snapshot
+snapshots = SnapshotManager(collector,
+                            path=os.environ.get('SNAPSHOT_PATH', 'stock_analyzer.snapshot'),
+                            interval=int(os.environ.get('SNAPSHOT_INTERVAL', 300)))
+snapshots.load()
+
+def warm_caches():
+    """Load heavy libraries and caches ahead of the first request"""
+    import numpy, pandas, yfinance  # noqa: F401 - imported for their side effect
+    sector_stats.load()
+    collector.session  # creates the shared HTTP session
+    logger.info("Caches warmed")
+
+def start_background_tasks():
+    """Refresh expired snapshot entries and snapshot periodically (call once per process)"""
+    snapshots.start()
+    atexit.register(snapshots.stop)
 
 @app.route('/')
 def index():
     """Main dashboard page"""
     return render_template('index.html')
 
-@app.route('/api/scan')
-def scan_stocks():
-    """API endpoint to scan for stocks meeting criteria"""
-    try:
-        # Get list of NSE stocks
-        stocks = collector.get_nse_stocks()
-        logger.info(f"Found {len(stocks)} NSE stocks to analyze")
-        
-        results = []
-        for stock_symbol in stocks[:50]:  # Limit to first 50 for demo
-            try:
-                # Get stock data
-                stock_data = collector.get_stock_data(stock_symbol)
-                if not stock_data:
-                    continue
-                
-                # Analyze stock
-                analysis = analyzer.analyze_stock(stock_data)
-                if analysis and analysis['meets_criteria']:
-                    results.append({
+def run_scan():
+    """Scan the universe for stocks meeting criteria; returns the response payload"""
+    # Get list of NSE stocks
+    stocks = collector.get_nse_stocks()
+    logger.info(f"Found {len(stocks)} NSE stocks to analyze")
+    
+    # Batch-refresh expired history up front when the async collector is enabled
+    collector.prefetch_stock_data(stocks[:50])
+    
+    # Fingerprints of the inputs behind each symbol's last analysis
+    fingerprints = db.get_analysis_fingerprints()
+    recomputed = skipped = 0
+    
+    # Daily feature frames, written in bulk every FEATURE_FLUSH_SIZE symbols
+    feature_frames = {}
+    
+    # First pass: fetch and cache every symbol, noting which ones need a new analysis
+    fetched = []
+    for stock_symbol in stocks[:50]:  # Limit to first 50 for demo
+        timer = StageTimer(stock_symbol, 'scan')
+        try:
+            # Get stock data
+            stock_data = collector.get_stock_data(stock_symbol)
+            timer.lap('fetch')
+            if not stock_data:
+                slow_log.record(timer)
+                continue
+            
+            # Cache fundamentals for sector aggregates
+            fundamental_data = stock_data['fundamental_data']
+            sector = fundamental_data.get('sector')
+            db.save_stock(stock_symbol, stock_data.get('name', stock_symbol),
+                          sector, fundamental_data.get('market_cap'))
+            if db.save_fundamentals(stock_symbol, sector, fundamental_data):
+                sector_stats.mark_dirty(sector)
+            timer.lap('save_fundamentals')
+            
+            # Carry the previous result forward if none of its inputs changed
+            fingerprint = analyzer.fingerprint_inputs(stock_data)
+            previous = fingerprints.get(stock_symbol)
+            unchanged = bool(previous and previous['fingerprint'] == fingerprint)
+            fetched.append({
+                'symbol': stock_symbol,
+                'stock_data': stock_data,
+                'fingerprint': fingerprint,
+                'previous': previous if unchanged and previous['analysis_id'] is not None else None,
+                'recompute': not unchanged,
+                'timer': timer
+            })
+        
+        except Exception as e:
+            logger.error(f"Error analyzing {stock_symbol}: {str(e)}")
+            timer.error = str(e)
+            slow_log.record(timer)
+    
+    # Score the fundamentals of every symbol being re-analysed in one batch;
+    # any symbol missing from the batch is scored on its own by analyze_stock
+    pending = [entry for entry in fetched if entry['recompute']]
+    batch_scores = analyzer.score_fundamentals([entry['stock_data']['fundamental_data'] for entry in pending])
+    fundamental_scores = dict(zip((entry['symbol'] for entry in pending), batch_scores or []))
+    
+    results = []
+    for entry in fetched:
+        stock_symbol, stock_data, timer = entry['symbol'], entry['stock_data'], entry['timer']
+        fundamental_data = stock_data['fundamental_data']
+        timer.resume()
+        try:
+            if entry['recompute']:
+                recomputed += 1
+                analysis = analyzer.analyze_stock(stock_data, fundamental_scores.get(stock_symbol))
+                if analysis:
+                    db.save_analysis_result({
+                        **analysis,
                         'symbol': stock_symbol,
-                        'name': stock_data.get('name', stock_symbol),
-                        'current_price': analysis['current_price'],
-                        'price_decline': analysis['price_decline'],
+                        'current_price': float(analysis['current_price']),
+                        'price_decline': float(analysis['price_decline']),
+                        'meets_criteria': bool(analysis['meets_criteria']),
+                        'input_fingerprint': entry['fingerprint']
+                    })
+                else:
+                    db.save_analysis_fingerprint(stock_symbol, entry['fingerprint'])
+            else:
+                skipped += 1
+                analysis = entry['previous']
+            timer.lap('analysis')
+            
+            # Persist every intermediate indicator and keep the screener's row
+            # current; unchanged inputs whose last bar is already stored have
+            # nothing new to derive
+            last_bar = stock_data['historical_data'].index[-1].strftime('%Y-%m-%d')
+            stored = feature_table.get(stock_symbol)
+            if entry['recompute'] or stored is None or stored.get('trade_date') != last_bar:
+                series = analyzer.extract_feature_series(stock_data)
+                feature_frames[stock_symbol] = series
+                if len(feature_frames) >= FEATURE_FLUSH_SIZE:
+                    db.save_daily_features(feature_frames)
+                    feature_frames = {}
+                
+                feature_table.update(stock_symbol, {
+                    **fundamental_data,
+                    **analyzer.extract_features(stock_data, series),
+                    'name': stock_data.get('name', stock_symbol),
+                    **({
                         'fundamental_score': analysis['fundamental_score'],
                         'technical_score': analysis['technical_score'],
                         'overall_score': analysis['overall_score'],
-                        'recommendation': analysis['recommendation']
-                    })
-                    
-            except Exception as e:
-                logger.error(f"Error analyzing {stock_symbol}: {str(e)}")
-                continue
+                        'recommendation': analysis['recommendation'],
+                        'meets_criteria': bool(analysis['meets_criteria'])
+                    } if analysis else {})
+                })
+                timer.lap('features')
+            
+            # Refresh the live leaderboard's baseline from the new bars
+            if live_ranker.running:
+                live_ranker.seed(stock_data)
+                timer.lap('live_seed')
+            
+            if analysis and analysis['meets_criteria']:
+                results.append({
+                    'symbol': stock_symbol,
+                    'name': stock_data.get('name', stock_symbol),
+                    'current_price': analysis['current_price'],
+                    'price_decline': analysis['price_decline'],
+                    'fundamental_score': analysis['fundamental_score'],
+                    'technical_score': analysis['technical_score'],
+                    'overall_score': analysis['overall_score'],
+                    'recommendation': analysis['recommendation']
+                })
+        
+        except Exception as e:
+            logger.error(f"Error analyzing {stock_symbol}: {str(e)}")
+            timer.error = str(e)
+            continue
+        
+        finally:
+            slow_log.record(timer)
+    
+    db.save_daily_features(feature_frames)
+    
+    # Re-aggregate only the sectors whose fundamentals changed
+    sector_stats.refresh()
+    logger.info(f"Scan complete: {recomputed} recomputed, {skipped} unchanged")
+    
+    # Sort by overall score
+    results.sort(key=lambda x: x['overall_score'], reverse=True)
+    
+    return {
+        'success': True,
+        'stocks': results[:20],  # Return top 20
+        'rescan': {
+            'recomputed': recomputed,
+            'skipped': skipped
+        },
+        'timestamp': datetime.now().isoformat()
+    }
+
+@app.route('/api/scan')
+def scan_stocks():
+    """API endpoint to scan for stocks meeting criteria"""
+    try:
+        if profiling_requested(request.args.get('profile')):
+            # Profiled scans run on their own so the profile covers real work
+            payload, profile_path = profile_call('scan', run_scan)
+            return jsonify({**payload, 'profile': profile_path})
+        
+        # Concurrent scan requests share a single run
+        return jsonify(flights.do(('scan',), run_scan))
+        
+    except Exception as e:
+        logger.error(f"Error in scan_stocks: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/results')
+def get_results():
+    """Filter, sort and page through stored scan results"""
+    try:
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+        meets_criteria = request.args.get('meets_criteria')
         
-        # Sort by overall score
-        results.sort(key=lambda x: x['overall_score'], reverse=True)
+        rows, next_cursor = db.query_results(
+            min_overall=request.args.get('min_overall', type=float),
+            min_fundamental=request.args.get('min_fundamental', type=float),
+            min_technical=request.args.get('min_technical', type=float),
+            sector=request.args.get('sector'),
+            min_decline=request.args.get('min_decline', type=float),
+            max_decline=request.args.get('max_decline', type=float),
+            meets_criteria=None if meets_criteria is None else meets_criteria.lower() in ('1', 'true'),
+            sort=request.args.get('sort', 'overall_score'),
+            descending=request.args.get('order', 'desc').lower() != 'asc',
+            cursor=request.args.get('cursor'),
+            limit=limit
+        )
         
         return jsonify({
             'success': True,
-            'stocks': results[:20],  # Return top 20
-            'timestamp': datetime.now().isoformat()
+            'stocks': rows,
+            'next_cursor': next_cursor
         })
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error in get_results: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Numeric result columns the dashboard keeps in typed arrays
+DASHBOARD_COLUMNS = ('current_price', 'price_decline', 'fundamental_score', 'technical_score', 'overall_score')
+
+@app.route('/api/results/delta')
+def get_results_delta():
+    """Scored stocks changed since ?epoch=&since=, as typed-array columns for the dashboard"""
+    try:
+        import numpy as np
+        epoch, version, full, rows = feature_table.changes_since(
+            request.args.get('epoch'),
+            request.args.get('since', type=int),
+            columns=('name', 'recommendation', 'meets_criteria') + DASHBOARD_COLUMNS,
+            where=lambda row: row.get('overall_score') is not None
+        )
+        
+        def column(key, dtype='float64'):
+            return encode_array(np.array([np.nan if row[key] is None else float(row[key]) for row in rows]), dtype)
         
+        return jsonify({
+            'success': True,
+            'epoch': epoch,
+            'version': version,
+            'full': full,
+            'count': len(rows),
+            'symbols': [row['symbol'] for row in rows],
+            'names': [row['name'] or row['symbol'] for row in rows],
+            'recommendations': [row['recommendation'] for row in rows],
+            'columns': {key: column(key) for key in DASHBOARD_COLUMNS},
+            'meets_criteria': encode_array([bool(row['meets_criteria']) for row in rows], 'uint8'),
+            'versions': encode_array([row['version'] for row in rows], 'uint32')
+        })
+    
     except Exception as e:
-        logger.error(f"Error in scan_stocks: {str(e)}")
+        logger.error(f"Error in get_results_delta: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+def load_stock_details(symbol):
+    """Stock data, stored features and detailed analysis for one symbol"""
+    timer = StageTimer(symbol, 'detail')
+    try:
+        stock_data = collector.get_stock_data(symbol)
+        timer.lap('fetch')
+        if not stock_data:
+            return None
+        
+        # Precomputed indicators for the latest bar, if the last scan stored them
+        features = db.get_latest_features([stock_data['symbol']]).get(stock_data['symbol'])
+        timer.lap('load_features')
+        analysis = analyzer.get_detailed_analysis(stock_data, features)
+        timer.lap('analysis')
+        return stock_data, features, analysis
+    
+    finally:
+        slow_log.record(timer)
+
 @app.route('/api/stock/<symbol>')
 def get_stock_details(symbol):
     """Get detailed analysis for a specific stock"""
     try:
-        stock_data = collector.get_stock_data(symbol)
-        if not stock_data:
+        symbol = symbol.upper()
+        symbol = symbol if symbol.endswith('.NS') else symbol + '.NS'
+        
+        profile_path = None
+        if profiling_requested(request.args.get('profile')):
+            details, profile_path = profile_call(f'stock-{symbol}', load_stock_details, symbol)
+        else:
+            # Concurrent requests for the same symbol share one fetch and analysis
+            details = flights.do(('stock_detail', symbol), load_stock_details, symbol)
+        if not details:
             return jsonify({'success': False, 'error': 'Stock not found'}), 404
+        stock_data, features, analysis = details
         
-        analysis = analyzer.get_detailed_analysis(stock_data)
+        response = {
+            'success': True,
+            'stock': analysis,
+            'features': features
+        }
+        if profile_path:
+            response['profile'] = profile_path
+        
+        # Optional downsampled chart series (?series=1&points=200)
+        if request.args.get('series', '0').lower() in ('1', 'true'):
+            points = min(max(request.args.get('points', 200, type=int), 10), 2000)
+            response['series'] = chart_series.get(stock_data['symbol'], stock_data['historical_data'], points)
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        logger.error(f"Error getting details for {symbol}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/stock/<symbol>/features')
+def get_stock_features(symbol):
+    """Stored daily indicator history for charts and backtests"""
+    try:
+        symbol = symbol.upper()
+        symbol = symbol if symbol.endswith('.NS') else symbol + '.NS'
+        columns = request.args.get('columns')
+        history = db.get_feature_history(
+            symbol,
+            days=min(max(request.args.get('days', 365, type=int), 1), 3650),
+            columns=columns.split(',') if columns else None
+        )
         
         return jsonify({
             'success': True,
-            'stock': analysis
+            'symbol': symbol,
+            'features': history
         })
+    
+    except Exception as e:
+        logger.error(f"Error getting features for {symbol}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/screen')
+def run_screen():
+    """Run an ad-hoc screen, e.g. ?where=price_decline between 30 and 40 and roe >= 0.15"""
+    try:
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        matched, rows = feature_table.screen(
+            request.args.get('where', ''),
+            score=request.args.get('score'),
+            descending=request.args.get('order', 'desc').lower() != 'asc',
+            limit=limit
+        )
         
+        return jsonify({
+            'success': True,
+            'matched': matched,
+            'stocks': rows
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'fields': feature_table.columns()
+        }), 400
     except Exception as e:
-        logger.error(f"Error getting details for {symbol}: {str(e)}")
+        logger.error(f"Error in run_screen: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def stream_export(dataset):
+    """Stream a dataset as CSV or Parquet, filtered by ?symbols=, ?start=, ?end= and ?columns="""
+    try:
+        file_format = request.args.get('format', 'csv').lower()
+        if file_format not in export.FORMATS:
+            raise ValueError(f"Unsupported format: {file_format} (use csv or parquet)")
+        if file_format == 'parquet' and not export.parquet_available():
+            return jsonify({
+                'success': False,
+                'error': 'Parquet export requires pyarrow'
+            }), 501
+        
+        symbols = [symbol.strip().upper() for symbol in request.args.get('symbols', '').split(',') if symbol.strip()]
+        symbols = [symbol if symbol.endswith('.NS') else symbol + '.NS' for symbol in symbols]
+        start, end = request.args.get('start'), request.args.get('end')
+        for value in (start, end):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+        
+        available = dict(db.get_export_columns(dataset))
+        columns = [column.strip() for column in request.args.get('columns', '').split(',') if column.strip()]
+        unknown = [column for column in columns if column not in available]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)} (available: {', '.join(available)})")
+        columns = columns or list(available)
+        
+        batch_size = request.args.get('batch_size', 5000, type=int)
+        if not 1 <= batch_size <= db.MAX_EXPORT_BATCH:
+            raise ValueError(f"batch_size must be between 1 and {db.MAX_EXPORT_BATCH}")
+        
+        chunks = db.iter_export(dataset, columns, symbols=symbols, start=start, end=end,
+                                batch_size=batch_size)
+        if file_format == 'parquet':
+            body = export.stream_parquet(columns, [available[column] for column in columns], chunks)
+        else:
+            body = export.stream_csv(columns, chunks)
+        
+        mimetype, extension = export.FORMATS[file_format]
+        filename = f"{dataset}-{datetime.now().strftime('%Y%m%d')}.{extension}"
+        return Response(body, mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error exporting {dataset}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/export/results')
+def export_results():
+    """Full analysis_results history as CSV or Parquet (?format=parquet)"""
+    return stream_export('results')
+
+@app.route('/api/export/prices')
+def export_prices():
+    """Stored price history as CSV or Parquet (?format=parquet)"""
+    return stream_export('prices')
+
+def run_analytics(question, **kwargs):
+    """Answer a cross-universe question over ?source=features|prices"""
+    try:
+        source = request.args.get('source', 'features')
+        if source not in ('features', 'prices'):
+            raise ValueError(f"Unknown source: {source} (use features or prices)")
+        
+        frame = getattr(analytics, question)(source=source, **kwargs)
+        return jsonify({
+            'success': True,
+            'engine': analytics.name,
+            'stocks': to_records(frame)
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error in {question}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/analytics/declines')
+def get_declines():
+    """Every symbol's decline from its 2-year high, e.g. ?min=30&max=40"""
+    return run_analytics('decline_from_high',
+                         min_decline=request.args.get('min', type=float),
+                         max_decline=request.args.get('max', type=float),
+                         lookback_days=request.args.get('lookback_days', 730, type=int))
+
+@app.route('/api/analytics/rolling-low')
+def get_rolling_lows():
+    """Every symbol's rolling low over ?window= bars (default 60)"""
+    return run_analytics('rolling_low', window=min(max(request.args.get('window', 60, type=int), 1), 1000))
+
+@app.route('/api/analytics/hovering')
+def get_hovering():
+    """Share of recent closes in the 25-45% decline band, per symbol"""
+    return run_analytics('hovering',
+                         hover_days=request.args.get('days', 90, type=int),
+                         lower=request.args.get('lower', 25, type=float),
+                         upper=request.args.get('upper', 45, type=float),
+                         min_ratio=request.args.get('min_ratio', 0.7, type=float))
+
+@app.route('/api/quotes', methods=['POST'])
+def get_quotes():
+    """Latest price, change and stored scores for a batch of symbols"""
+    try:
+        payload = request.get_json(silent=True) or {}
+        symbols = payload.get('symbols')
+        if not isinstance(symbols, list) or not symbols:
+            return jsonify({'success': False, 'error': 'symbols must be a non-empty list'}), 400
+        if len(symbols) > 500:
+            return jsonify({'success': False, 'error': 'At most 500 symbols per request'}), 400
+        
+        symbols = [str(symbol).upper() for symbol in symbols]
+        symbols = [symbol if symbol.endswith('.NS') else symbol + '.NS' for symbol in symbols]
+        
+        prices = collector.get_quotes(symbols)
+        scores = db.get_latest_scores(symbols)
+        
+        quotes = {}
+        for symbol in symbols:
+            quotes[symbol] = {
+                **prices.get(symbol, {}),
+                **scores.get(symbol, {}),
+                'symbol': symbol
+            }
+        
+        return jsonify({
+            'success': True,
+            'quotes': quotes,
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"Error in get_quotes: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/watchlist', methods=['GET'])
+def get_watchlist():
+    """Get watchlist with latest prices and scores"""
+    try:
+        watchlist = db.get_watchlist()
+        prices = collector.get_quotes([item['symbol'] for item in watchlist]) if watchlist else {}
+        for item in watchlist:
+            item['quote'] = prices.get(item['symbol'])
+        
+        return jsonify({
+            'success': True,
+            'watchlist': watchlist
+        })
+    
+    except Exception as e:
+        logger.error(f"Error in get_watchlist: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/watchlist', methods=['POST'])
+def add_to_watchlist():
+    """Add a stock to the watchlist"""
+    payload = request.get_json(silent=True) or {}
+    symbol = payload.get('symbol')
+    if not symbol:
+        return jsonify({'success': False, 'error': 'symbol is required'}), 400
+    
+    if not db.add_to_watchlist(symbol, payload.get('notes', '')):
+        return jsonify({'success': False, 'error': 'Could not add to watchlist'}), 500
+    
+    return jsonify({'success': True, 'symbol': symbol})
+
+@app.route('/api/watchlist/<symbol>', methods=['DELETE'])
+def remove_from_watchlist(symbol):
+    """Remove a stock from the watchlist"""
+    if not db.remove_from_watchlist(symbol):
+        return jsonify({'success': False, 'error': 'Could not remove from watchlist'}), 500
+    
+    return jsonify({'success': True, 'symbol': symbol})
+
+@app.route('/api/live/start', methods=['POST'])
+def start_live():
+    """Start polling live quotes and re-ranking the top-K leaderboard"""
+    try:
+        payload = request.get_json(silent=True) or {}
+        try:
+            k = min(max(int(payload.get('k', live_ranker.leaderboard.k)), 1), 200)
+            interval = max(int(payload.get('interval', live_ranker.interval)), 5)
+        except (TypeError, ValueError):
+            raise ValueError("k and interval must be integers")
+        symbols = payload.get('symbols')
+        if symbols is not None and not (isinstance(symbols, list) and all(isinstance(s, str) for s in symbols)):
+            raise ValueError("symbols must be a list of strings")
+        
+        started = live_ranker.start(symbols=symbols, k=k, interval=interval,
+                                    market_hours_only=bool(payload.get('market_hours_only', True)))
+        
+        return jsonify({
+            'success': True,
+            'started': started,
+            'running': live_ranker.running
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error in start_live: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/live/stop', methods=['POST'])
+def stop_live():
+    """Stop live quote polling"""
+    stopped = live_ranker.stop()
+    return jsonify({'success': True, 'stopped': stopped, 'running': live_ranker.running})
+
+@app.route('/api/live/leaderboard')
+def get_live_leaderboard():
+    """Current top-K ranking at live prices"""
+    try:
+        limit = request.args.get('limit', type=int)
+        return jsonify({
+            'success': True,
+            **live_ranker.snapshot(limit),
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"Error in get_live_leaderboard: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -100,19 +701,110 @@ def update_data():
     """Manually trigger data update"""
     try:
         collector.update_stock_list()
+        statements = collector.prefetch_financial_statements()
+        
+        adjusted = []
+        for symbol in collector.get_nse_stocks():
+            if collector.sync_corporate_actions(symbol):
+                chart_series.invalidate(symbol)
+                adjusted.append(symbol)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Data update initiated',
+            'financial_statements': statements,
+            'corporate_actions_applied': adjusted
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/maintenance/retention', methods=['POST'])
+def apply_retention():
+    """Downsample and archive old analysis results"""
+    try:
+        report = db.apply_retention_policy(
+            full_days=request.args.get('full_days', 7, type=int),
+            downsample=request.args.get('downsample', 'day'),
+            archive_days=request.args.get('archive_days', 365, type=int),
+            batch_size=request.args.get('batch_size', 500, type=int),
+            # Opt-in: the one-time switch-over runs a full VACUUM that locks the database
+            enable_incremental_vacuum=request.args.get('enable_incremental_vacuum', '0').lower() in ('1', 'true')
+        )
+        if report is None:
+            return jsonify({'success': False, 'error': 'Retention policy failed'}), 500
+        
         return jsonify({
             'success': True,
-            'message': 'Data update initiated'
+            'report': report
         })
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    except Exception as e:
+        logger.error(f"Error in apply_retention: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/admin/stats')
+def get_admin_stats():
+    """Request coalescing counters and cache sizes"""
+    return jsonify({
+        'success': True,
+        'single_flight': flights.get_stats(),
+        'caches': {
+            'stock_records': len(collector.record_cache),
+            'quotes': len(collector.quote_cache),
+            'chart_series': len(chart_series.entries)
+        },
+        'snapshot': snapshots.status(),
+        'async_collector': async_collector.get_stats() if async_collector else None,
+        'analytics': analytics.get_stats(),
+        'slow_log': {
+            'threshold': slow_log.threshold,
+            'recorded': slow_log.recorded
+        },
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/api/admin/slow-log')
+def get_slow_log():
+    """Recent symbols whose fetch or analysis exceeded the slow threshold"""
+    context = request.args.get('context')
+    return jsonify({
+        'success': True,
+        'threshold': slow_log.threshold,
+        'recorded': slow_log.recorded,
+        'entries': slow_log.get_entries(limit=request.args.get('limit', type=int), context=context)
+    })
+
+@app.route('/api/maintenance/snapshot', methods=['POST'])
+def write_snapshot():
+    """Write a warm-start snapshot now"""
+    try:
+        written = snapshots.dump(force=True)
+        return jsonify({
+            'success': written,
+            'snapshot': snapshots.status()
+        }), 200 if written else 500
+    
     except Exception as e:
+        logger.error(f"Error in write_snapshot: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
 if __name__ == '__main__':
-    # Create database tables
-    db.create_tables()
+    start_background_tasks()
     
     # Run the app
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Asynchronous price collector for the Stock Recovery Analyzer
+
+``AsyncStockDataCollector`` fetches daily history and quotes for many symbols
+from Yahoo Finance's chart endpoint over one pooled aiohttp session, on a
+single thread. Connections are kept alive and reused across symbols, and the
+JSON responses are parsed straight into the NumPy arrays behind a
+``StockRecord``, without building an intermediate DataFrame.
+
+The chart endpoint carries no fundamentals, so records take them from the
+database's fundamentals cache. ``base_url`` can point at a local stub server:
+``python async_collector.py`` starts one and times a batch of fetches.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from data_collector import StockDataCollector
+from stock_record import StockRecord
+
+# aiohttp, numpy and pandas are imported on first use; aiohttp is only
+# needed when the async collector is enabled
+
+logger = logging.getLogger(__name__)
+
+class AsyncStockDataCollector:
+    DEFAULT_BASE_URL = 'https://query1.finance.yahoo.com'
+    CHART_PATH = '/v8/finance/chart/{symbol}'
+    # Chart quote fields in StockRecord.COLUMNS order
+    QUOTE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    
+    def __init__(self, base_url=None, max_connections=64, max_connections_per_host=32,
+                 keepalive_timeout=30, concurrency=256, timeout=20, max_retries=2,
+                 history_range='2y', price_dtype='float64'):
+        self.base_url = (base_url or self.DEFAULT_BASE_URL).rstrip('/')
+        # Pool limits: total open sockets, sockets per host, idle keep-alive seconds
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        # Symbol fetches in progress at once; the rest wait for a free slot
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.history_range = history_range
+        self.price_dtype = price_dtype
+        
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'bytes': 0,
+                      'last_batch_symbols': 0, 'last_batch_seconds': None}
+    
+    def create_session(self):
+        """aiohttp session over a keep-alive connection pool (call inside a running loop)"""
+        import aiohttp
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+        )
+    
+    async def get_chart(self, session, symbol, range_, interval='1d', events=None):
+        """Chart result for a symbol, retrying throttled and failed requests"""
+        import aiohttp
+        url = self.base_url + self.CHART_PATH.format(symbol=symbol)
+        params = {'range': range_, 'interval': interval, 'includePrePost': 'false'}
+        if events:
+            params['events'] = events
+        
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats['retries'] += 1
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+            try:
+                self.stats['requests'] += 1
+                async with session.get(url, params=params) as response:
+                    if response.status in self.RETRY_STATUSES and attempt < self.max_retries:
+                        continue
+                    body = await response.read()
+                    self.stats['bytes'] += len(body)
+                    if response.status != 200:
+                        logger.warning(f"Chart request for {symbol} returned HTTP {response.status}")
+                        return None
+                    
+                    results = (json.loads(body).get('chart') or {}).get('result')
+                    return results[0] if results else None
+            
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Error fetching chart for {symbol}: {str(e)}")
+        
+        return None
+    
+    def parse_chart(self, result):
+        """(index, values) from a chart result; values is (5 x bars) in COLUMNS order"""
+        import numpy as np
+        
+        timestamps = np.asarray(result.get('timestamp') or [], dtype='int64')
+        quote = result['indicators']['quote'][0]
+        # Missing prices arrive as null, which float conversion turns into NaN
+        raw = np.empty((len(self.QUOTE_FIELDS), len(timestamps)), dtype='float64')
+        for row, field in enumerate(self.QUOTE_FIELDS):
+            raw[row] = np.asarray(quote.get(field) or [None] * len(timestamps), dtype='float64')
+        
+        index = self.local_dates(timestamps, result.get('meta', {}))
+        
+        # Drop bars without a close and the duplicate bar Yahoo appends intraday
+        keep = ~np.isnan(raw[3]) & ~index.duplicated(keep='last')
+        values = np.ascontiguousarray(raw[:, keep], dtype=self.price_dtype)
+        return index[keep], values
+    
+    def local_dates(self, timestamps, meta):
+        """DatetimeIndex of epoch seconds at midnight in the exchange's time zone"""
+        import numpy as np
+        import pandas as pd
+        
+        # Same dates as yfinance. Flooring the epoch seconds by the exchange's
+        # UTC offset is ~10x faster than DatetimeIndex.normalize(); IST has no
+        # daylight saving to get wrong
+        timestamps = np.asarray(timestamps, dtype='int64')
+        timezone = meta.get('exchangeTimezoneName') or 'Asia/Kolkata'
+        offset = meta.get('gmtoffset')
+        if offset is not None:
+            midnights = ((timestamps + offset) // 86400 * 86400 - offset) * 10**9
+            return pd.DatetimeIndex(midnights.view('datetime64[ns]')).tz_localize('UTC').tz_convert(timezone)
+        return pd.to_datetime(timestamps, unit='s', utc=True).tz_convert(timezone).normalize()
+    
+    def parse_events(self, result):
+        """(date, type, value) splits and dividends of a chart result, as get_corporate_actions reports them"""
+        chart_events = result.get('events') or {}
+        stamped = []
+        for split in (chart_events.get('splits') or {}).values():
+            if split.get('denominator'):
+                stamped.append((split['date'], 'split', split['numerator'] / split['denominator']))
+        for dividend in (chart_events.get('dividends') or {}).values():
+            stamped.append((dividend['date'], 'dividend', float(dividend['amount'])))
+        if not stamped:
+            return []
+        
+        dates = self.local_dates([stamp for stamp, _, _ in stamped], result.get('meta', {})).strftime('%Y-%m-%d')
+        return sorted((date, action_type, value) for date, (_, action_type, value) in zip(dates, stamped)
+                      if value > 0)
+    
+    def build_record(self, symbol, result, fundamental_data):
+        """StockRecord from a chart result and cached fundamentals"""
+        index, values = self.parse_chart(result)
+        if not len(index):
+            return None
+        
+        meta = result.get('meta', {})
+        name = meta.get('longName') or meta.get('shortName') or symbol
+        fundamental_data = {metric: (fundamental_data or {}).get(metric)
+                            for metric in StockDataCollector.FUNDAMENTAL_FIELDS}
+        # Same reduced info a Ticker.info fetch would have produced
+        info = {'longName': name}
+        info.update({key: fundamental_data[metric] for metric, key in StockDataCollector.FUNDAMENTAL_FIELDS.items()
+                     if fundamental_data[metric] is not None})
+        return StockRecord.from_arrays(symbol, name, index, values, fundamental_data, info, recent_days=90)
+    
+    async def fetch_records(self, symbols, fundamentals=None):
+        """Fetch history for all symbols concurrently; returns {symbol: (StockRecord, events)}.
+        
+        Records hold the chart's bars as Yahoo serves them (split-adjusted,
+        not dividend-adjusted); StockDataCollector.finish_record turns them
+        and the (date, type, value) events into raw and adjusted history.
+        """
+        fundamentals = fundamentals or {}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def fetch(session, symbol):
+            async with semaphore:
+                result = await self.get_chart(session, symbol, self.history_range, events='div,splits')
+            try:
+                if not result:
+                    return symbol, None
+                record = self.build_record(symbol, result, fundamentals.get(symbol))
+                return symbol, (record, self.parse_events(result)) if record is not None else None
+            except Exception as e:
+                logger.error(f"Error parsing chart for {symbol}: {str(e)}")
+                return symbol, None
+        
+        started = time.perf_counter()
+        async with self.create_session() as session:
+            fetched = await asyncio.gather(*(fetch(session, symbol) for symbol in symbols))
+        
+        records = {symbol: record for symbol, record in fetched if record is not None}
+        self.stats['failures'] += len(symbols) - len(records)
+        self.stats['last_batch_symbols'] = len(symbols)
+        self.stats['last_batch_seconds'] = round(time.perf_counter() - started, 3)
+        return records
+    
+    async def fetch_quotes(self, symbols):
+        """Latest price and daily change per symbol, shaped like StockDataCollector.fetch_quotes"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def fetch(session, symbol):
+            async with semaphore:
+                result = await self.get_chart(session, symbol, '5d')
+            if not result:
+                return symbol, None
+            index, values = self.parse_chart(result)
+            if not len(index):
+                return symbol, None
+            
+            price = float(values[3][-1])
+            previous = float(values[3][-2]) if len(index) > 1 else price
+            return symbol, {
+                'price': price,
+                'previous_close': previous,
+                'change': price - previous,
+                'change_percent': (price - previous) / previous * 100 if previous else None,
+                'as_of': index[-1].strftime('%Y-%m-%d')
+            }
+        
+        async with self.create_session() as session:
+            fetched = await asyncio.gather(*(fetch(session, symbol) for symbol in symbols))
+        return {symbol: quote for symbol, quote in fetched if quote is not None}
+    
+    def collect(self, symbols, fundamentals=None):
+        """Blocking wrapper around fetch_records for use from worker threads"""
+        try:
+            return asyncio.run(self.fetch_records(list(symbols), fundamentals))
+        except Exception as e:
+            logger.error(f"Error collecting stock data: {str(e)}")
+            return {}
+    
+    def collect_quotes(self, symbols):
+        """Blocking wrapper around fetch_quotes"""
+        try:
+            return asyncio.run(self.fetch_quotes(list(symbols)))
+        except Exception as e:
+            logger.error(f"Error collecting quotes: {str(e)}")
+            return {}
+    
+    def get_stats(self):
+        return dict(self.stats)
+
+async def _serve_stub_charts(port=0, latency=0.02, histories=32):
+    """Local chart endpoint serving synthetic history; returns (runner, base_url, connections)"""
+    import zlib
+    from aiohttp import web
+    from loadtest import StubUpstream
+    
+    stub = StubUpstream(latency=0)
+    peers = set()
+    # Responses are encoded once per (history, range) so that the stub, which
+    # shares the event loop with the client, costs little next to parsing
+    bodies = {}
+    
+    def encode(name, range_):
+        hist = stub.history(name)
+        if range_ == '5d':
+            hist = hist.iloc[-5:]
+        return json.dumps({'chart': {'result': [{
+            'meta': {'symbol': name, 'longName': stub.info(name)['longName'],
+                     'exchangeTimezoneName': 'Asia/Kolkata', 'gmtoffset': 19800},
+            # Bars stamped at the 09:15 IST open, as Yahoo does
+            'timestamp': [int(ts.value // 10**9) + 33300 for ts in hist.index.tz_localize('Asia/Kolkata')],
+            'indicators': {'quote': [{field: hist[column].tolist() for field, column
+                                      in zip(AsyncStockDataCollector.QUOTE_FIELDS, StockRecord.COLUMNS)}]}
+        }], 'error': None}}).encode()
+    
+    async def chart(request):
+        peers.add(request.transport.get_extra_info('peername'))
+        await asyncio.sleep(latency)
+        key = (f"STUB{zlib.crc32(request.match_info['symbol'].encode()) % histories}.NS",
+               request.query.get('range'))
+        if key not in bodies:
+            bodies[key] = encode(*key)
+        return web.Response(body=bodies[key], content_type='application/json')
+    
+    app = web.Application()
+    app.router.add_get('/v8/finance/chart/{symbol}', chart)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner, f'http://127.0.0.1:{runner.addresses[0][1]}', peers
+
+def benchmark(symbols=2000, latency=0.02):
+    """Time one batch of history fetches against a local stub chart server"""
+    async def run():
+        runner, base_url, peers = await _serve_stub_charts(latency=latency)
+        try:
+            collector = AsyncStockDataCollector(base_url=base_url)
+            names = [f'SYM{i}.NS' for i in range(symbols)]
+            records = await collector.fetch_records(names)
+            stats = collector.get_stats()
+            print(f"⚡ {len(records)}/{symbols} records in {stats['last_batch_seconds']:.2f}s "
+                  f"({symbols / stats['last_batch_seconds']:.0f} symbols/s) over {len(peers)} connections, "
+                  f"{stats['bytes'] / 1e6:.1f} MB, {latency * 1000:.0f} ms simulated upstream latency")
+        finally:
+            await runner.cleanup()
+    
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,130 @@
+import base64
+import threading
+from collections import OrderedDict
+import logging
+
+# numpy is imported on first use so that importing this module stays cheap
+
+logger = logging.getLogger(__name__)
+
+def lttb_indices(x, y, points):
+    """Pick ``points`` indices with Largest-Triangle-Three-Buckets.
+    
+    The first and last samples are always kept; every bucket in between
+    contributes the sample that forms the largest triangle with the previous
+    pick and the average of the next bucket, which preserves peaks and
+    troughs far better than striding.
+    """
+    import numpy as np
+    
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    
+    indices = np.empty(points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last bucket looks at the final point)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.nanargmax(area)) if np.isfinite(area).any() else start
+        indices[i + 1] = previous
+    
+    return indices
+
+def encode_array(values, dtype='float32'):
+    """Encode an array as little-endian bytes in base64 (a JS typed array payload)"""
+    import numpy as np
+    
+    array = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {
+        'dtype': dtype,
+        'length': int(array.size),
+        'data': base64.b64encode(array.tobytes()).decode('ascii')
+    }
+
+def build_chart_series(hist_data, analyzer, points=200):
+    """Build downsampled price, moving-average and RSI series for charting.
+    
+    The sample indices are chosen once from the close series and reused for
+    every other series, so all arrays stay aligned on the same dates.
+    """
+    import numpy as np
+    import pandas as pd
+    import consolidation
+    
+    close = hist_data['Close']
+    # 60-day trading range, the support level analyze_support_resistance uses
+    support, resistance = consolidation.rolling_extrema(close.to_numpy(dtype=np.float64), [60])[60]
+    series = {
+        'close': close,
+        'ma20': close.rolling(window=20).mean(),
+        'ma50': close.rolling(window=50).mean(),
+        'ma200': close.rolling(window=200).mean(),
+        'rsi': analyzer.calculate_rsi_series(close),
+        'support_60': pd.Series(support, index=close.index),
+        'resistance_60': pd.Series(resistance, index=close.index)
+    }
+    
+    timestamps = hist_data.index.map(lambda ts: ts.timestamp()).to_numpy(dtype=np.float64)
+    indices = lttb_indices(timestamps, close.to_numpy(dtype=np.float64), points)
+    
+    return {
+        'points': int(len(indices)),
+        'source_points': int(len(close)),
+        'dates': encode_array(timestamps[indices], 'uint32'),  # epoch seconds
+        **{
+            name: encode_array(values.to_numpy(dtype=np.float64)[indices])  # NaN during warm-up
+            for name, values in series.items()
+        }
+    }
+
+class ChartSeriesCache:
+    """LRU cache of chart series keyed by symbol, last bar date and point count"""
+    
+    def __init__(self, analyzer, max_entries=256):
+        self.analyzer = analyzer
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, symbol, hist_data, points=200):
+        """Get cached series for the latest bar, building them on a miss"""
+        try:
+            key = (symbol, hist_data.index[-1].strftime('%Y-%m-%d'), points)
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    return self.entries[key]
+            
+            series = build_chart_series(hist_data, self.analyzer, points)
+            
+            with self.lock:
+                self.entries[key] = series
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            
+            return series
+        
+        except Exception as e:
+            logger.error(f"Error building chart series for {symbol}: {str(e)}")
+            return None
+    
+    def invalidate(self, symbol):
+        """Drop all cached series for a symbol"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == symbol]:
+                del self.entries[key]
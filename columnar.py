@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Cross-universe analytics over stored price history and daily features
+
+Questions such as "2-year high per symbol", "rolling 60-day low for all
+stocks" or "every symbol down 30-40% today" span every symbol at once.
+``DuckDBAnalytics`` copies ``price_history`` and ``daily_features`` into an
+in-memory DuckDB database, refreshed when the SQLite file changes, and
+answers each question in one statement with window functions.
+``PandasAnalytics`` gives the same answers the way the app does today, one
+SQLite query per symbol followed by pandas. It is the fallback when DuckDB is
+not installed and the baseline for ``python columnar.py``, which benchmarks
+both on a synthetic database.
+"""
+
+import os
+import time
+import threading
+import logging
+
+# duckdb and pandas are imported on first use; duckdb is only needed for
+# the columnar engine
+
+logger = logging.getLogger(__name__)
+
+# Data sources: name -> (DuckDB table, date column, price columns). Scans fill
+# daily_features; price_history is only filled through save_price_history
+SOURCES = {
+    'features': ('features', 'trade_date', {'close': 'close', 'low': 'close'}),
+    'prices': ('prices', 'date', {'close': 'close', 'low': 'low'})
+}
+
+def to_records(frame):
+    """JSON-ready rows: NaN as None and dates as ISO strings"""
+    frame = frame.copy()
+    if 'date' in frame:
+        frame['date'] = frame['date'].astype(str)
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).to_dict('records')
+
+class DuckDBAnalytics:
+    """Window-function queries over a columnar copy of the SQLite tables"""
+    
+    name = 'duckdb'
+    
+    def __init__(self, db_path='stock_analyzer.db', feature_columns=(), refresh_interval=60,
+                 batch_size=100_000):
+        import duckdb
+        self.db_path = db_path
+        self.feature_columns = tuple(feature_columns)
+        # Minimum seconds between checks of the SQLite file for changes
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        
+        self.conn = duckdb.connect()
+        self.lock = threading.Lock()
+        self.loaded_version = None
+        self.checked_at = 0
+        self.stats = {'loads': 0, 'last_load_seconds': None, 'rows': {}}
+    
+    def source_version(self):
+        stat = os.stat(self.db_path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def refresh(self, force=False):
+        """Reload the tables if the SQLite file changed since the last load"""
+        now = time.time()
+        if not force and self.loaded_version is not None and now - self.checked_at < self.refresh_interval:
+            return False
+        
+        with self.lock:
+            self.checked_at = now
+            version = self.source_version()
+            if not force and version == self.loaded_version:
+                return False
+            self.load()
+            self.loaded_version = version
+            return True
+    
+    def load(self):
+        """Copy price_history and daily_features, sorted by symbol and date"""
+        import sqlite3
+        started = time.perf_counter()
+        features = ', '.join(f'{column} DOUBLE' for column in self.feature_columns)
+        tables = {
+            'prices': (
+                'symbol VARCHAR, date DATE, open DOUBLE, high DOUBLE, low DOUBLE, close DOUBLE, volume DOUBLE',
+                '''SELECT symbol, date, COALESCE(adj_open, open_price), COALESCE(adj_high, high_price),
+                          COALESCE(adj_low, low_price), COALESCE(adj_close, close_price),
+                          COALESCE(adj_volume, volume)
+                   FROM price_history ORDER BY symbol, date'''
+            ),
+            'features': (
+                f"symbol VARCHAR, trade_date DATE{', ' + features if features else ''}",
+                f"""SELECT symbol, trade_date{''.join(', ' + column for column in self.feature_columns)}
+                    FROM daily_features ORDER BY symbol, trade_date"""
+            )
+        }
+        
+        source = sqlite3.connect(f'file:{os.path.abspath(self.db_path)}?mode=ro', uri=True)
+        try:
+            for table, (schema, query) in tables.items():
+                # Build aside and swap, so queries never see a half-loaded table
+                self.conn.execute(f'CREATE OR REPLACE TABLE {table}_loading ({schema})')
+                self.stats['rows'][table] = self._copy(source, query, f'{table}_loading')
+                self.conn.execute('BEGIN')
+                self.conn.execute(f'DROP TABLE IF EXISTS {table}')
+                self.conn.execute(f'ALTER TABLE {table}_loading RENAME TO {table}')
+                self.conn.execute('COMMIT')
+        finally:
+            source.close()
+        
+        self.stats['loads'] += 1
+        self.stats['last_load_seconds'] = round(time.perf_counter() - started, 3)
+        logger.info(f"Loaded columnar tables in {self.stats['last_load_seconds']}s: {self.stats['rows']}")
+    
+    def _copy(self, source, query, table):
+        import pandas as pd
+        cursor = source.execute(query)
+        columns = [description[0] for description in cursor.description]
+        copied = 0
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                return copied
+            batch = pd.DataFrame.from_records(rows, columns=columns)
+            self.conn.register('batch', batch)
+            self.conn.execute(f'INSERT INTO {table} SELECT * FROM batch')
+            self.conn.unregister('batch')
+            copied += len(rows)
+    
+    def query(self, sql, params=None):
+        """Run SQL against the columnar tables and return a DataFrame"""
+        self.refresh()
+        cursor = self.conn.cursor()
+        try:
+            return cursor.execute(sql, params or []).fetchdf()
+        finally:
+            cursor.close()
+    
+    def decline_from_high(self, source='features', min_decline=None, max_decline=None, lookback_days=730):
+        """Latest close per symbol and its decline from the trailing ``lookback_days`` high"""
+        table, date, prices = SOURCES[source]
+        return self.query(f'''
+            SELECT symbol, date, close, high_2y,
+                   (high_2y - close) / high_2y * 100 AS price_decline
+            FROM (
+                SELECT symbol, {date} AS date, {prices['close']} AS close,
+                       max({prices['close']}) OVER (
+                           PARTITION BY symbol ORDER BY {date}
+                           RANGE BETWEEN INTERVAL {int(lookback_days)} DAYS PRECEDING AND CURRENT ROW
+                       ) AS high_2y,
+                       row_number() OVER (PARTITION BY symbol ORDER BY {date} DESC) AS recency
+                FROM {table}
+                WHERE {prices['close']} IS NOT NULL
+            )
+            WHERE recency = 1
+              AND ($1 IS NULL OR (high_2y - close) / high_2y * 100 >= $1)
+              AND ($2 IS NULL OR (high_2y - close) / high_2y * 100 <= $2)
+            ORDER BY price_decline DESC, symbol
+        ''', [min_decline, max_decline])
+    
+    def rolling_low(self, source='prices', window=60):
+        """Latest ``window``-bar low per symbol and how far the close sits above it"""
+        table, date, prices = SOURCES[source]
+        return self.query(f'''
+            SELECT symbol, date, close, rolling_low,
+                   (close - rolling_low) / rolling_low * 100 AS above_low
+            FROM (
+                SELECT symbol, {date} AS date, {prices['close']} AS close,
+                       min({prices['low']}) OVER (
+                           PARTITION BY symbol ORDER BY {date}
+                           ROWS BETWEEN {int(window) - 1} PRECEDING AND CURRENT ROW
+                       ) AS rolling_low,
+                       row_number() OVER (PARTITION BY symbol ORDER BY {date} DESC) AS recency
+                FROM {table}
+                WHERE {prices['close']} IS NOT NULL
+            )
+            WHERE recency = 1
+            ORDER BY above_low, symbol
+        ''')
+    
+    def hovering(self, source='features', hover_days=90, lower=25, upper=45, min_ratio=0.7,
+                 min_bars=30, lookback_days=730):
+        """Share of each symbol's last ``hover_days`` of closes that sit ``lower``-``upper``%
+        below its ``lookback_days`` high, as StockAnalyzer.is_hovering_in_range computes it"""
+        table, date, prices = SOURCES[source]
+        return self.query(f'''
+            WITH bars AS (
+                SELECT symbol, {date} AS date, {prices['close']} AS close,
+                       max({date}) OVER (PARTITION BY symbol) AS last_date
+                FROM {table}
+                WHERE {prices['close']} IS NOT NULL
+            ), history AS (
+                SELECT symbol, date, close, last_date,
+                       max(close) OVER (PARTITION BY symbol) AS high_2y
+                FROM bars
+                WHERE date >= last_date - INTERVAL {int(lookback_days)} DAYS
+            )
+            SELECT symbol, max(date) AS date, count(*) AS bars,
+                   avg(CASE WHEN (high_2y - close) / high_2y * 100 BETWEEN $1 AND $2 THEN 1.0 ELSE 0.0 END)
+                       AS hover_ratio,
+                   avg(CASE WHEN (high_2y - close) / high_2y * 100 BETWEEN $1 AND $2 THEN 1.0 ELSE 0.0 END) >= $3
+                       AS hovering
+            FROM history
+            WHERE date >= last_date - INTERVAL {int(hover_days)} DAYS
+            GROUP BY symbol
+            HAVING count(*) >= $4
+            ORDER BY hover_ratio DESC, symbol
+        ''', [lower, upper, min_ratio, min_bars])
+    
+    def get_stats(self):
+        return {'engine': self.name, **self.stats}
+
+class PandasAnalytics:
+    """The same questions answered per symbol from SQLite with pandas"""
+    
+    name = 'pandas'
+    
+    def __init__(self, db):
+        self.db = db
+    
+    def refresh(self, force=False):
+        return False
+    
+    def _symbols(self, source):
+        table = 'daily_features' if source == 'features' else 'price_history'
+        cursor = self.db.conn.cursor()
+        cursor.execute(f'SELECT DISTINCT symbol FROM {table}')
+        return [row['symbol'] for row in cursor.fetchall()]
+    
+    def _history(self, source, symbol, days):
+        """One symbol's closes (and lows) indexed by date, via the existing accessors"""
+        import pandas as pd
+        if source == 'features':
+            frame = pd.DataFrame(self.db.get_feature_history(symbol, days=days, columns=['close']))
+            if frame.empty:
+                return frame
+            frame['low'] = frame['close']
+            frame = frame.rename(columns={'trade_date': 'date'})
+        else:
+            frame = pd.DataFrame(self.db.get_price_history(symbol, days=days))
+            if frame.empty:
+                return frame
+            frame['close'] = frame['adj_close'].fillna(frame['close_price'])
+            frame['low'] = frame['adj_low'].fillna(frame['low_price'])
+        frame['date'] = pd.to_datetime(frame['date'])
+        return frame.dropna(subset=['close']).set_index('date')[['close', 'low']]
+    
+    def _collect(self, source, days, compute):
+        import pandas as pd
+        rows = []
+        for symbol in self._symbols(source):
+            history = self._history(source, symbol, days)
+            if len(history):
+                row = compute(history)
+                if row is not None:
+                    rows.append({'symbol': symbol, 'date': history.index[-1].date(), **row})
+        return pd.DataFrame(rows)
+    
+    def decline_from_high(self, source='features', min_decline=None, max_decline=None, lookback_days=730):
+        import pandas as pd
+        
+        def compute(history):
+            close = history['close'].iloc[-1]
+            high = history['close'][history.index >= history.index[-1] - pd.Timedelta(days=lookback_days)].max()
+            return {'close': close, 'high_2y': high, 'price_decline': (high - close) / high * 100}
+        
+        # Reads far enough back to cover the lookback from each symbol's latest bar
+        frame = self._collect(source, lookback_days + 3650, compute)
+        if frame.empty:
+            return frame
+        if min_decline is not None:
+            frame = frame[frame['price_decline'] >= min_decline]
+        if max_decline is not None:
+            frame = frame[frame['price_decline'] <= max_decline]
+        return frame.sort_values(['price_decline', 'symbol'], ascending=[False, True], ignore_index=True)
+    
+    def rolling_low(self, source='prices', window=60):
+        def compute(history):
+            close = history['close'].iloc[-1]
+            low = history['low'].iloc[-window:].min()
+            return {'close': close, 'rolling_low': low, 'above_low': (close - low) / low * 100}
+        
+        frame = self._collect(source, 3650, compute)
+        if frame.empty:
+            return frame
+        return frame.sort_values(['above_low', 'symbol'], ignore_index=True)
+    
+    def hovering(self, source='features', hover_days=90, lower=25, upper=45, min_ratio=0.7,
+                 min_bars=30, lookback_days=730):
+        import pandas as pd
+        
+        def compute(history):
+            last = history.index[-1]
+            closes = history['close'][history.index >= last - pd.Timedelta(days=lookback_days)]
+            recent = closes[closes.index >= last - pd.Timedelta(days=hover_days)]
+            if len(recent) < min_bars:
+                return None
+            declines = (closes.max() - recent) / closes.max() * 100
+            ratio = float(((declines >= lower) & (declines <= upper)).mean())
+            return {'bars': len(recent), 'hover_ratio': ratio, 'hovering': ratio >= min_ratio}
+        
+        frame = self._collect(source, lookback_days + 3650, compute)
+        if frame.empty:
+            return frame
+        return frame.sort_values(['hover_ratio', 'symbol'], ascending=[False, True], ignore_index=True)
+    
+    def get_stats(self):
+        return {'engine': self.name}
+
+def create_analytics(db, engine=None):
+    """DuckDBAnalytics if requested and installed, else PandasAnalytics"""
+    if engine == 'duckdb':
+        try:
+            return DuckDBAnalytics(db.db_path, feature_columns=db.FEATURE_COLUMNS)
+        except ImportError:
+            logger.warning("ANALYTICS_ENGINE=duckdb but duckdb is not installed; using pandas")
+    return PandasAnalytics(db)
+
+def benchmark(symbols=500, bars=500):
+    """Time both engines on a synthetic database and check they agree"""
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    from database import Database
+    
+    path = os.path.join(tempfile.mkdtemp(prefix='columnar-'), 'bench.db')
+    db = Database(path)
+    db.create_tables()
+    
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=bars)
+    for i in range(symbols):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+        frame = pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99,
+                              'Close': close, 'Volume': rng.integers(1e5, 1e6, bars)}, index=dates)
+        db.save_price_history(f'SYM{i}.NS', frame)
+        features = pd.DataFrame({column: np.nan for column in db.FEATURE_COLUMNS}, index=range(bars))
+        features['trade_date'] = dates.strftime('%Y-%m-%d')
+        features['close'] = close
+        db.save_daily_features({f'SYM{i}.NS': features})
+    
+    engines = [PandasAnalytics(db), DuckDBAnalytics(path, feature_columns=db.FEATURE_COLUMNS)]
+    started = time.perf_counter()
+    engines[1].refresh(force=True)
+    print(f"📦 {symbols} symbols x {bars} bars; DuckDB load: {time.perf_counter() - started:.2f}s")
+    
+    questions = {
+        'decline 30-40% (features)': lambda engine: engine.decline_from_high('features', 30, 40),
+        'decline from high (prices)': lambda engine: engine.decline_from_high('prices'),
+        'rolling 60-bar low (prices)': lambda engine: engine.rolling_low('prices', 60),
+        'hovering 25-45% (features)': lambda engine: engine.hovering('features')
+    }
+    print(f"{'question':<30}{'sqlite+pandas':>15}{'duckdb':>10}{'speedup':>9}  match")
+    for label, ask in questions.items():
+        timings, answers = [], []
+        for engine in engines:
+            started = time.perf_counter()
+            answers.append(ask(engine))
+            timings.append(time.perf_counter() - started)
+        
+        expected, actual = (answer.drop(columns='date').reset_index(drop=True) for answer in answers)
+        match = (len(expected) == len(actual) and
+                 np.allclose(expected.select_dtypes('number').to_numpy(float),
+                             actual[expected.select_dtypes('number').columns].to_numpy(float), equal_nan=True))
+        print(f"{label:<30}{timings[0] * 1000:>13.0f}ms{timings[1] * 1000:>8.0f}ms"
+              f"{timings[0] / timings[1]:>8.0f}x  {'✅' if match else '❌'}")
+    
+    db.close()
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Consolidation detection for the Stock Recovery Analyzer
+
+A recovering stock is expected to move sideways in a narrow range some way
+below its 2-year high before it turns. These kernels measure that over
+several trailing windows at once (30/60/90/180 bars by default):
+
+- ``rolling_extrema``: rolling min and max for every window in one pass. A
+  single series uses a monotonic deque per window; a 2-D panel (dates on
+  axis 0, symbols on axis 1) uses the van Herk/Gil-Werman block form, which
+  is also O(n) per series but vectorizes across symbols.
+- ``band_occupancy``: share of each window's closes that sit in a decline
+  band (25-45% below a reference high by default), from one cumulative sum.
+- ``running_high_occupancy``: the same share per bar, against each bar's
+  running high over a trailing window, as stored in the daily feature store.
+- ``consolidation_start``: where the trailing stretch whose high-low range
+  stays within ``max_range_pct`` of its high began, and how tight it is.
+- ``detect``: all of the above for the latest bar of a series or a panel.
+
+Series are expected to be NaN-free, as the collectors drop bars without a
+close; a NaN makes every window that contains it NaN.
+
+Run ``python consolidation.py`` to check the kernels against brute-force
+references and to print micro-benchmarks.
+"""
+
+import time
+from collections import deque
+import numpy as np
+from indicators import _as_2d, _restore
+
+DEFAULT_WINDOWS = (30, 60, 90, 180)
+
+def _deque_extrema(values, windows):
+    """Rolling (min, max) of a 1-D array for several windows in a single pass"""
+    data = values.tolist()
+    n = len(data)
+    state = [(window, deque(), deque(), np.full(n, np.nan), np.full(n, np.nan)) for window in windows]
+    last_nan = -1
+    
+    for t, value in enumerate(data):
+        if value != value:
+            # Every window containing a NaN is NaN, so start over after it
+            last_nan = t
+            for _, lows, highs, _, _ in state:
+                lows.clear()
+                highs.clear()
+            continue
+        
+        for window, lows, highs, low_out, high_out in state:
+            # Indices with increasing values (lows) or decreasing values
+            # (highs); the front is the extreme of the current window
+            while lows and data[lows[-1]] >= value:
+                lows.pop()
+            lows.append(t)
+            while highs and data[highs[-1]] <= value:
+                highs.pop()
+            highs.append(t)
+            if lows[0] <= t - window:
+                lows.popleft()
+            if highs[0] <= t - window:
+                highs.popleft()
+            
+            if t - last_nan >= window:
+                low_out[t] = data[lows[0]]
+                high_out[t] = data[highs[0]]
+    
+    return {window: (low_out, high_out) for window, _, _, low_out, high_out in state}
+
+def _block_extrema(array, window, ufunc, fill):
+    """van Herk/Gil-Werman rolling reduction of a (dates, symbols) array"""
+    n, columns = array.shape
+    out = np.full(array.shape, np.nan)
+    if n < window:
+        return out
+    
+    # Each window spans the tail of one block and the head of the next, so it
+    # is the reduction of a block suffix and a block prefix
+    blocks = np.vstack([array, np.full(((-n) % window, columns), fill)]).reshape(-1, window, columns)
+    prefix = np.empty_like(blocks)
+    suffix = np.empty_like(blocks)
+    prefix[:, 0] = blocks[:, 0]
+    suffix[:, -1] = blocks[:, -1]
+    # One step per position in the block, over every block and symbol at
+    # once; ufunc.accumulate along the middle axis is slower
+    for i in range(1, window):
+        ufunc(prefix[:, i - 1], blocks[:, i], out=prefix[:, i])
+        ufunc(suffix[:, window - i], blocks[:, window - i - 1], out=suffix[:, window - i - 1])
+    prefix = prefix.reshape(-1, columns)[:n]
+    suffix = suffix.reshape(-1, columns)[:n]
+    out[window - 1:] = ufunc(suffix[:n - window + 1], prefix[window - 1:])
+    return out
+
+def rolling_extrema(values, windows=DEFAULT_WINDOWS):
+    """Rolling min and max over each of ``windows`` bars; returns {window: (low, high)}"""
+    array, was_1d = _as_2d(values)
+    if was_1d:
+        return _deque_extrema(array[:, 0], windows)
+    return {
+        window: (_block_extrema(array, window, np.minimum, np.inf),
+                 _block_extrema(array, window, np.maximum, -np.inf))
+        for window in windows
+    }
+
+def in_band(values, reference_high, lower=25, upper=45):
+    """Whether each value is ``lower``-``upper``% below ``reference_high`` (per symbol for a panel)"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        declines = (reference_high - values) / reference_high * 100
+    return (declines >= lower) & (declines <= upper)
+
+def band_occupancy(values, reference_high, windows=DEFAULT_WINDOWS, lower=25, upper=45):
+    """Rolling share of closes in the decline band over each window; returns {window: ratio}"""
+    array, was_1d = _as_2d(values)
+    inside = in_band(array, np.asarray(reference_high, dtype=np.float64), lower, upper)
+    counts = np.vstack([np.zeros((1, array.shape[1])), np.cumsum(inside, axis=0, dtype=np.float64)])
+    
+    occupancy = {}
+    for window in windows:
+        out = np.full(array.shape, np.nan)
+        if len(array) >= window:
+            out[window - 1:] = (counts[window:] - counts[:-window]) / window
+        occupancy[window] = _restore(out, was_1d)
+    return occupancy
+
+def running_high_occupancy(values, starts, lower=25, upper=45, min_periods=30):
+    """Share of closes in the decline band below each bar's running high, per bar.
+    
+    For bar t the window is ``values[starts[t]:t + 1]`` and the band is
+    measured from the running maximum up to t, so every row only sees data
+    up to that day. The running high is constant between new highs; each
+    such stretch gets one cumulative sum of ``in_band`` against its level,
+    so the cost is O(bars + highs * window) rather than O(bars * window).
+    Windows shorter than ``min_periods`` are NaN. 1-D only.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.int64)
+    n = len(values)
+    out = np.full(n, np.nan)
+    if not n:
+        return out
+    
+    high = np.fmax.accumulate(values)
+    # First bar of each stretch with the same running high
+    breaks = np.flatnonzero(np.r_[True, high[1:] != high[:-1]])
+    for first, end in zip(breaks, np.r_[breaks[1:], n]):
+        lo = starts[first]
+        inside = in_band(values[lo:end], high[first], lower, upper)
+        counts = np.r_[0, np.cumsum(inside)]
+        bars = np.arange(first, end)
+        lengths = bars + 1 - starts[bars]
+        ratio = (counts[bars + 1 - lo] - counts[starts[bars] - lo]) / lengths
+        out[first:end] = np.where(lengths >= min_periods, ratio, np.nan)
+    return out
+
+def consolidation_start(values, max_range_pct=20.0):
+    """Trailing stretch whose range stays within ``max_range_pct`` of its high.
+    
+    Returns a dict of ``start`` (index of its first bar; the series length if
+    even the last bar alone does not qualify), ``bars``, ``low``, ``high`` and
+    ``tightness`` (its high-low range as a percentage of its high).
+    """
+    array, was_1d = _as_2d(values)
+    n, columns = array.shape
+    
+    # Extremes of every suffix, from the last bar backwards
+    low = np.minimum.accumulate(array[::-1], axis=0)
+    high = np.maximum.accumulate(array[::-1], axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        width = (high - low) / high * 100
+    # width only grows as the suffix lengthens, so the qualifying suffixes
+    # are exactly the first ``bars`` rows
+    bars = np.count_nonzero(width <= max_range_pct, axis=0)
+    
+    last = np.maximum(bars - 1, 0)
+    found = bars > 0
+    columns = np.arange(columns)
+    result = {
+        'start': n - bars,
+        'bars': bars,
+        'low': np.where(found, low[last, columns], np.nan) if n else np.full(columns.shape, np.nan),
+        'high': np.where(found, high[last, columns], np.nan) if n else np.full(columns.shape, np.nan),
+        'tightness': np.where(found, width[last, columns], np.nan) if n else np.full(columns.shape, np.nan)
+    }
+    return {key: value[0] for key, value in result.items()} if was_1d else result
+
+def detect(values, reference_high=None, windows=DEFAULT_WINDOWS, lower=25, upper=45,
+           max_range_pct=20.0, dates=None):
+    """Consolidation summary for the latest bar.
+    
+    For each window: the range low and high, its width as a percentage of the
+    high and the share of closes in the decline band. ``reference_high``
+    defaults to the highest close. A 1-D series gives plain floats (None when
+    the series is shorter than the window) and, with ``dates``, the start of
+    the consolidation as YYYY-MM-DD; a panel gives one array per field.
+    """
+    array, was_1d = _as_2d(values)
+    if reference_high is None:
+        reference_high = np.fmax.reduce(array, axis=0) if len(array) else np.nan
+    reference_high = np.broadcast_to(np.asarray(reference_high, dtype=np.float64), (array.shape[1],))
+    inside = in_band(array, reference_high, lower, upper)
+    
+    summary = {'windows': {}}
+    for window in windows:
+        if len(array) < window:
+            nan = np.full(array.shape[1], np.nan)
+            low, high, occupancy = nan, nan, nan
+        else:
+            low, high = array[-window:].min(axis=0), array[-window:].max(axis=0)
+            occupancy = inside[-window:].mean(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            range_pct = (high - low) / high * 100
+        summary['windows'][window] = {'low': low, 'high': high, 'range_pct': range_pct, 'occupancy': occupancy}
+    summary.update(consolidation_start(array, max_range_pct))
+    
+    if not was_1d:
+        return summary
+    
+    def scalar(value):
+        value = float(np.asarray(value).reshape(-1)[0])
+        return None if np.isnan(value) else value
+    
+    start, bars = int(summary.pop('start')[0]), int(summary.pop('bars')[0])
+    return {
+        'windows': {window: {key: scalar(value) for key, value in fields.items()}
+                    for window, fields in summary['windows'].items()},
+        'start': (dates[start].strftime('%Y-%m-%d') if dates is not None else start) if bars else None,
+        'bars': bars,
+        **{key: scalar(summary[key]) for key in ('low', 'high', 'tightness')}
+    }
+
+# Brute-force references, used only for the parity check
+
+def _reference_extrema(values, window):
+    from indicators import rolling_min, rolling_max
+    return rolling_min(values, window), rolling_max(values, window)
+
+def _reference_occupancy(values, reference_high, window, lower=25, upper=45):
+    out = np.full(len(values), np.nan)
+    for t in range(window - 1, len(values)):
+        declines = [(reference_high - price) / reference_high * 100 for price in values[t - window + 1:t + 1]]
+        out[t] = sum(1 for decline in declines if lower <= decline <= upper) / window
+    return out
+
+def _reference_running_occupancy(values, starts, lower=25, upper=45, min_periods=30):
+    high = np.fmax.accumulate(values)
+    out = np.full(len(values), np.nan)
+    for t in range(len(values)):
+        window = values[starts[t]:t + 1]
+        if len(window) >= min_periods:
+            declines = (high[t] - window) / high[t] * 100
+            out[t] = np.count_nonzero((declines >= lower) & (declines <= upper)) / len(window)
+    return out
+
+def _reference_start(values, max_range_pct=20.0):
+    bars = 0
+    for start in range(len(values) - 1, -1, -1):
+        stretch = values[start:]
+        if (stretch.max() - stretch.min()) / stretch.max() * 100 > max_range_pct:
+            break
+        bars += 1
+    return len(values) - bars
+
+def _synthetic_closes(dates=500, symbols=200, seed=11):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (dates, symbols)), axis=0))
+
+def check_parity(windows=DEFAULT_WINDOWS):
+    """Compare the kernels with brute-force references on 1-D and 2-D inputs"""
+    closes = _synthetic_closes(symbols=5)
+    closes[200, 1] = np.nan
+    panel = rolling_extrema(closes, windows)
+    reference_high = np.fmax.reduce(closes, axis=0)
+    occupancy = band_occupancy(closes, reference_high, windows)
+    starts = consolidation_start(closes)['start']
+    
+    ok = True
+    for column in range(closes.shape[1]):
+        series = closes[:, column]
+        single = rolling_extrema(series, windows)
+        for window in windows:
+            expected = _reference_extrema(series, window)
+            for label, actual in (('1-D', single[window]), ('2-D', tuple(side[:, column] for side in panel[window]))):
+                if not all(np.array_equal(a, e, equal_nan=True) for a, e in zip(actual, expected)):
+                    print(f"❌ rolling extrema ({label}, window {window}, column {column}) differ")
+                    ok = False
+            expected = _reference_occupancy(series, reference_high[column], window)
+            if not np.allclose(occupancy[window][:, column], expected, equal_nan=True):
+                print(f"❌ band occupancy (window {window}, column {column}) differs")
+                ok = False
+        trailing = np.maximum(np.arange(len(series)) - 62, 0)
+        if not np.allclose(running_high_occupancy(series, trailing), _reference_running_occupancy(series, trailing),
+                           equal_nan=True):
+            print(f"❌ running-high occupancy (column {column}) differs")
+            ok = False
+        if starts[column] != _reference_start(series):
+            print(f"❌ consolidation start (column {column}): {starts[column]} != {_reference_start(series)}")
+            ok = False
+    
+    if ok:
+        print(f"✅ Rolling extrema, band occupancy, running-high occupancy and consolidation start "
+              f"match the references "
+              f"for windows {', '.join(map(str, windows))} (1-D and 2-D)")
+    return ok
+
+def benchmark(dates=500, symbols=200, repeat=3, windows=DEFAULT_WINDOWS):
+    """Time the kernels against sliding-window extrema and per-window Python loops"""
+    closes = _synthetic_closes(dates, symbols)
+    reference_high = closes.max(axis=0)
+    
+    def best_of(fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+    
+    def python_occupancy():
+        # What is_hovering_in_range does, once per window, at the latest bar
+        for column in range(symbols):
+            prices = closes[:, column].tolist()
+            for window in windows:
+                declines = [(reference_high[column] - price) / reference_high[column] * 100
+                            for price in prices[-window:]]
+                sum(1 for decline in declines if 25 <= decline <= 45) / window
+    
+    timings = [
+        ('extrema, deque (per symbol)', best_of(lambda: [rolling_extrema(closes[:, i], windows)
+                                                         for i in range(symbols)])),
+        ('extrema, block (2-D)', best_of(lambda: rolling_extrema(closes, windows))),
+        ('extrema, sliding window (2-D)', best_of(lambda: [_reference_extrema(closes, window)
+                                                           for window in windows])),
+        ('occupancy, cumsum (2-D)', best_of(lambda: band_occupancy(closes, reference_high, windows))),
+        ('detect, latest bar (2-D)', best_of(lambda: detect(closes, reference_high, windows))),
+        ('occupancy, Python lists', best_of(python_occupancy))
+    ]
+    
+    print(f"⏱  {dates} dates x {symbols} symbols, windows {', '.join(map(str, windows))}:")
+    for label, seconds in timings:
+        print(f"   {label:<31}{seconds * 1000:8.1f} ms  ({seconds / symbols * 1e6:7.1f} us/symbol)")
+    return timings
+
+if __name__ == "__main__":
+    parity_ok = check_parity()
+    benchmark()
+    raise SystemExit(0 if parity_ok else 1)
@@ -1,19 +1,77 @@
-import yfinance as yf
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from io import StringIO
 import logging
+from stock_record import StockRecord
+from singleflight import SingleFlight
+
+# yfinance, pandas and requests are imported on first use so that importing
+# this module (and starting the app) stays cheap
 
 logger = logging.getLogger(__name__)
 
 class StockDataCollector:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+    # Statements are annual; the next set is expected one year after the
+    # latest period end plus the filing lag
+    STATEMENT_TYPES = ('financials', 'balance_sheet', 'cashflow')
+    REPORTING_INTERVAL_DAYS = 365
+    FILING_LAG_DAYS = 60
+    STATEMENT_RECHECK_DAYS = 7
+    
+    # Seconds a collected StockRecord is served from memory
+    STOCK_DATA_TTL = 900
+    
+    # fundamental metric -> Ticker.info key; only these (and longName) are kept
+    FUNDAMENTAL_FIELDS = {
+        'pe_ratio': 'trailingPE',
+        'pb_ratio': 'priceToBook',
+        'debt_to_equity': 'debtToEquity',
+        'roe': 'returnOnEquity',
+        'roa': 'returnOnAssets',
+        'current_ratio': 'currentRatio',
+        'quick_ratio': 'quickRatio',
+        'gross_margin': 'grossMargins',
+        'operating_margin': 'operatingMargins',
+        'profit_margin': 'profitMargins',
+        'revenue_growth': 'revenueGrowth',
+        'earnings_growth': 'earningsGrowth',
+        'book_value': 'bookValue',
+        'market_cap': 'marketCap',
+        'enterprise_value': 'enterpriseValue',
+        'dividend_yield': 'dividendYield',
+        'payout_ratio': 'payoutRatio',
+        'sector': 'sector'
+    }
+    
+    def __init__(self, sector_stats=None, db=None, price_dtype='float64', flights=None, async_collector=None):
+        # Optional SectorStatistics used by get_sector_pe
+        self.sector_stats = sector_stats
+        # Optional Database used to cache financial statements
+        self.db = db
+        # dtype of the OHLCV arrays held in each StockRecord ('float32' halves them)
+        self.price_dtype = price_dtype
+        
+        # symbol -> (fetched_at, quote); see get_quotes
+        self.quote_cache = {}
+        self.quote_cache_lock = threading.Lock()
+        
+        # symbol -> (fetched_at, StockRecord); see get_stock_data. A None
+        # record is restored from the snapshot and unpickled on first use
+        self.record_cache = {}
+        self.record_cache_lock = threading.Lock()
+        self.cache_generation = 0
+        self.snapshot = None
+        # Expired snapshot entries still served until refreshed in the background
+        self.pending_refresh = set()
+        
+        # Concurrent misses for the same symbol share one upstream fetch
+        self.flights = flights or SingleFlight()
+        # Optional AsyncStockDataCollector used by prefetch_stock_data
+        self.async_collector = async_collector
+        
+        self._session = None
         
         # NSE stock symbols - you can expand this list
         self.nse_stocks = [
@@ -29,88 +87,359 @@ class StockDataCollector:
             'SHREECEM.NS', 'VEDL.NS', 'TATAMOTORS.NS', 'APOLLOHOSP.NS', 'SBILIFE.NS'
         ]
     
+    @property
+    def session(self):
+        """HTTP session, created on first use to keep startup cheap"""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            })
+        return self._session
+    
     def get_nse_stocks(self):
         """Get list of NSE stock symbols"""
         return self.nse_stocks
     
-    def get_stock_data(self, symbol):
-        """Get comprehensive stock data for analysis"""
+    def get_stock_data(self, symbol, max_age=None):
+        """Get comprehensive stock data for analysis, cached for STOCK_DATA_TTL seconds"""
+        # Add .NS suffix if not present for Yahoo Finance
+        if not symbol.endswith('.NS'):
+            symbol = symbol + '.NS'
+        max_age = self.STOCK_DATA_TTL if max_age is None else max_age
+        
+        with self.record_cache_lock:
+            cached = self.record_cache.get(symbol)
+            if cached and cached[1] is None:
+                try:
+                    cached = (cached[0], self.snapshot.get('records', symbol))
+                    self.record_cache[symbol] = cached
+                except Exception as e:
+                    logger.error(f"Error restoring {symbol} from snapshot: {str(e)}")
+                    cached = None
+        
+        if cached and (time.time() - cached[0] <= max_age or symbol in self.pending_refresh):
+            return cached[1]
+        
+        return self.refresh_stock_data(symbol)
+    
+    def refresh_stock_data(self, symbol):
+        """Fetch a symbol's data from upstream and replace the cached record"""
+        record = self.flights.do(('stock_data', symbol), self.fetch_stock_data, symbol)
+        with self.record_cache_lock:
+            if record is not None:
+                self.record_cache[symbol] = (time.time(), record)
+                self.cache_generation += 1
+            self.pending_refresh.discard(symbol)
+        return record
+    
+    def prefetch_stock_data(self, symbols):
+        """Refresh missing or expired records for many symbols in one async batch.
+        
+        Only symbols with cached fundamentals are fetched this way, since the
+        chart endpoint has none; the rest are left to get_stock_data.
+        """
+        if self.async_collector is None or self.db is None:
+            return 0
+        
         try:
-            # Add .NS suffix if not present for Yahoo Finance
-            if not symbol.endswith('.NS'):
-                symbol = symbol + '.NS'
+            now = time.time()
+            with self.record_cache_lock:
+                due = [symbol for symbol in dict.fromkeys(symbols)
+                       if symbol not in self.record_cache
+                       or now - self.record_cache[symbol][0] > self.STOCK_DATA_TTL]
+            if not due:
+                return 0
+            
+            fundamentals = self.db.get_fundamentals(due)
+            due = [symbol for symbol in due if symbol in fundamentals]
+            records = {
+                symbol: self.finish_record(symbol, record, events)
+                for symbol, (record, events) in self.async_collector.collect(due, fundamentals).items()
+            }
             
+            with self.record_cache_lock:
+                for symbol, record in records.items():
+                    self.record_cache[symbol] = (time.time(), record)
+                    self.pending_refresh.discard(symbol)
+                if records:
+                    self.cache_generation += 1
+            
+            logger.info(f"Prefetched {len(records)}/{len(due)} stock records asynchronously")
+            return len(records)
+        
+        except Exception as e:
+            logger.error(f"Error prefetching stock data: {str(e)}")
+            return 0
+    
+    def invalidate_stock_data(self, symbol):
+        """Drop a cached record so the next request refetches it"""
+        with self.record_cache_lock:
+            if self.record_cache.pop(symbol, None) is not None:
+                self.cache_generation += 1
+            self.pending_refresh.discard(symbol)
+    
+    def restore_snapshot(self, reader, records, quotes):
+        """Register snapshot entries; returns how many records are past their TTL"""
+        now = time.time()
+        with self.record_cache_lock:
+            self.snapshot = reader
+            for symbol, fetched_at in records.items():
+                if symbol not in self.record_cache:
+                    self.record_cache[symbol] = (fetched_at, None)
+                    if now - fetched_at > self.STOCK_DATA_TTL:
+                        self.pending_refresh.add(symbol)
+        
+        with self.quote_cache_lock:
+            for symbol, entry in quotes.items():
+                self.quote_cache.setdefault(symbol, entry)
+        
+        return len(self.pending_refresh)
+    
+    def get_pending_refresh(self):
+        """Restored symbols awaiting a background refresh, oldest first"""
+        with self.record_cache_lock:
+            return sorted(self.pending_refresh, key=lambda symbol: self.record_cache[symbol][0])
+    
+    def export_snapshot(self):
+        """Copies of the record and quote caches for SnapshotManager.dump"""
+        with self.record_cache_lock:
+            records = dict(self.record_cache)
+        with self.quote_cache_lock:
+            quotes = dict(self.quote_cache)
+        return records, quotes
+    
+    def fetch_stock_data(self, symbol):
+        """Collect history and fundamentals for a symbol from Yahoo Finance"""
+        try:
+            import yfinance as yf
             ticker = yf.Ticker(symbol)
             
             # Get historical data (2 years)
             end_date = datetime.now()
             start_date = end_date - timedelta(days=730)  # ~2 years
             
-            hist_data = ticker.history(start=start_date, end=end_date)
+            # Unadjusted bars; corporate actions are applied below
+            hist_data = ticker.history(start=start_date, end=end_date, auto_adjust=False)
             if hist_data.empty:
                 logger.warning(f"No historical data found for {symbol}")
                 return None
             
-            # Get stock info
-            info = ticker.info
-            
-            # Get recent data (last 3 months for current trend analysis)
-            recent_start = end_date - timedelta(days=90)
-            recent_data = ticker.history(start=recent_start, end=end_date)
-            
-            # Calculate key metrics
-            current_price = hist_data['Close'].iloc[-1]
-            max_price_2y = hist_data['Close'].max()
-            price_decline = ((max_price_2y - current_price) / max_price_2y) * 100
-            
-            # Get fundamental data
+            # Keep only the info fields that scoring reads
+            info = self.reduce_info(ticker.info)
             fundamental_data = self.get_fundamental_metrics(info)
             
-            return {
-                'symbol': symbol,
-                'name': info.get('longName', symbol),
-                'current_price': current_price,
-                'historical_data': hist_data,
-                'recent_data': recent_data,
-                'price_decline': price_decline,
-                'max_price_2y': max_price_2y,
-                'fundamental_data': fundamental_data,
-                'info': info
-            }
+            # Compact record; recent_data (last 3 months) is a view of the same bars
+            record = StockRecord.from_history(symbol, info.get('longName') or symbol, hist_data,
+                                              fundamental_data, info, recent_days=90,
+                                              dtype=self.price_dtype)
+            return self.finish_record(symbol, record, self.history_events(hist_data))
             
         except Exception as e:
             logger.error(f"Error collecting data for {symbol}: {str(e)}")
             return None
     
+    def history_events(self, hist_data):
+        """(date, type, value) splits and dividends in an auto_adjust=False history frame"""
+        dates = hist_data.index.strftime('%Y-%m-%d')
+        events = []
+        for column, action_type in (('Stock Splits', 'split'), ('Dividends', 'dividend')):
+            if column in hist_data:
+                events.extend((date, action_type, float(value))
+                              for date, value in zip(dates, hist_data[column].to_numpy()) if value > 0)
+        return sorted(events)
+    
+    def finish_record(self, symbol, record, events):
+        """Store a fetched record's raw bars and return it back-adjusted for ``events``.
+        
+        Both fetch paths end here. Yahoo's bars, even unadjusted, are already
+        split-adjusted; the splits after each bar are undone first, so that
+        price_history holds what actually traded and every action is applied
+        exactly once, by adjustment_factors.
+        """
+        splits = [event for event in events if event[1] == 'split']
+        raw = record.adjusted(splits, inverse=True) if splits else record
+        if self.db is not None:
+            self.db.save_price_history(symbol, raw.historical_data)
+        return raw.adjusted(events) if events else raw
+    
+    def get_quotes(self, symbols, max_age=60):
+        """Get latest price and daily change for many symbols.
+        
+        Quotes younger than ``max_age`` seconds are served from memory; all
+        misses are fetched together in a single batched download.
+        """
+        symbols = [symbol if symbol.endswith('.NS') else symbol + '.NS' for symbol in symbols]
+        now = time.time()
+        
+        quotes = {}
+        with self.quote_cache_lock:
+            for symbol in symbols:
+                cached = self.quote_cache.get(symbol)
+                if cached and now - cached[0] <= max_age:
+                    quotes[symbol] = cached[1]
+        
+        misses = [symbol for symbol in dict.fromkeys(symbols) if symbol not in quotes]
+        if misses:
+            fetched = (self.async_collector.collect_quotes(misses) if self.async_collector is not None
+                       else self.fetch_quotes(misses))
+            with self.quote_cache_lock:
+                for symbol, quote in fetched.items():
+                    self.quote_cache[symbol] = (now, quote)
+            quotes.update(fetched)
+        
+        return quotes
+    
+    def fetch_quotes(self, symbols):
+        """Fetch recent daily closes for several symbols in one request"""
+        try:
+            import yfinance as yf
+            import pandas as pd
+            data = yf.download(symbols, period='5d', interval='1d', group_by='ticker',
+                               threads=True, progress=False)
+            if data is None or data.empty:
+                return {}
+            
+            quotes = {}
+            for symbol in symbols:
+                if isinstance(data.columns, pd.MultiIndex):
+                    if symbol not in data.columns.get_level_values(0):
+                        continue
+                    closes = data[symbol]['Close'].dropna()
+                else:
+                    closes = data['Close'].dropna()
+                if closes.empty:
+                    continue
+                
+                price = float(closes.iloc[-1])
+                previous = float(closes.iloc[-2]) if len(closes) > 1 else price
+                quotes[symbol] = {
+                    'price': price,
+                    'previous_close': previous,
+                    'change': price - previous,
+                    'change_percent': (price - previous) / previous * 100 if previous else None,
+                    'as_of': closes.index[-1].strftime('%Y-%m-%d')
+                }
+            
+            return quotes
+        
+        except Exception as e:
+            logger.error(f"Error fetching quotes: {str(e)}")
+            return {}
+    
+    def get_corporate_actions(self, symbol):
+        """Get split/bonus and dividend events for a symbol"""
+        try:
+            import yfinance as yf
+            actions = yf.Ticker(symbol).actions
+            if actions is None or actions.empty:
+                return []
+            
+            events = []
+            for date, row in actions.iterrows():
+                if row.get('Stock Splits'):
+                    events.append({'date': date.strftime('%Y-%m-%d'), 'type': 'split',
+                                   'value': float(row['Stock Splits'])})
+                if row.get('Dividends'):
+                    events.append({'date': date.strftime('%Y-%m-%d'), 'type': 'dividend',
+                                   'value': float(row['Dividends'])})
+            
+            return events
+        
+        except Exception as e:
+            logger.error(f"Error getting corporate actions for {symbol}: {str(e)}")
+            return []
+    
+    def sync_corporate_actions(self, symbol):
+        """Record new corporate actions and back-adjust cached history; returns the events applied"""
+        if self.db is None:
+            return []
+        
+        first_sync = not self.db.corporate_actions_synced(symbol)
+        new_events = self.db.save_corporate_actions(symbol, self.get_corporate_actions(symbol))
+        self.db.mark_corporate_actions_synced(symbol)
+        if not new_events:
+            return []
+        
+        # price_history keeps raw bars, so rebuilding its adjusted columns is always safe
+        self.db.apply_price_adjustments(symbol)
+        
+        # Only events after the first stored bar change anything derived from
+        # the stored history. On the first sync the events up to the last bar
+        # were already in the fetched history, so they are just recorded
+        first_bar, last_bar = self.db.get_price_history_span(symbol)
+        applied = [event for event in new_events
+                   if first_bar and event['date'] > first_bar and not (first_sync and event['date'] <= last_bar)]
+        if not applied:
+            logger.info(f"{symbol}: recorded {len(new_events)} corporate actions, stored history unaffected")
+            return []
+        
+        logger.info(f"{symbol}: {len(applied)} new corporate actions, adjusting cached history")
+        if any(event['date'] <= last_bar for event in applied):
+            # The cached record may predate an event inside its own range
+            self.invalidate_stock_data(symbol)
+        else:
+            self.adjust_stock_data(symbol, applied)
+        # Anything derived from the old prices must be recomputed
+        self.db.invalidate_fingerprints(symbol)
+        self.db.delete_daily_features(symbol)
+        
+        return applied
+    
+    def adjust_stock_data(self, symbol, events):
+        """Back-adjust a cached record for new corporate actions instead of refetching it.
+        
+        Only events after the record's last bar are applied; earlier ones were
+        already in the history it was built from. The adjusted copy replaces
+        the record under the cache lock, keeping its fetch time.
+        """
+        with self.record_cache_lock:
+            cached = self.record_cache.get(symbol)
+        if not cached:
+            return False
+        
+        try:
+            record = cached[1] if cached[1] is not None else self.snapshot.get('records', symbol)
+            last_bar = record.index[-1].strftime('%Y-%m-%d')
+            later = [(event['date'], event['type'], event['value']) for event in events if event['date'] > last_bar]
+            if not later:
+                return False
+            adjusted = record.adjusted(sorted(later))
+        
+        except Exception as e:
+            logger.error(f"Error adjusting cached data for {symbol}: {str(e)}")
+            return False
+        
+        with self.record_cache_lock:
+            # A refresh in the meantime already has the new prices
+            if self.record_cache.get(symbol) is not cached:
+                return False
+            self.record_cache[symbol] = (cached[0], adjusted)
+            self.cache_generation += 1
+        return True
+    
     def get_fundamental_metrics(self, info):
         """Extract fundamental metrics from stock info"""
         try:
-            return {
-                'pe_ratio': info.get('trailingPE'),
-                'pb_ratio': info.get('priceToBook'),
-                'debt_to_equity': info.get('debtToEquity'),
-                'roe': info.get('returnOnEquity'),
-                'roa': info.get('returnOnAssets'),
-                'current_ratio': info.get('currentRatio'),
-                'quick_ratio': info.get('quickRatio'),
-                'gross_margin': info.get('grossMargins'),
-                'operating_margin': info.get('operatingMargins'),
-                'profit_margin': info.get('profitMargins'),
-                'revenue_growth': info.get('revenueGrowth'),
-                'earnings_growth': info.get('earningsGrowth'),
-                'book_value': info.get('bookValue'),
-                'market_cap': info.get('marketCap'),
-                'enterprise_value': info.get('enterpriseValue'),
-                'dividend_yield': info.get('dividendYield'),
-                'payout_ratio': info.get('payoutRatio')
-            }
+            return {metric: info.get(key) for metric, key in self.FUNDAMENTAL_FIELDS.items()}
         except Exception as e:
             logger.error(f"Error extracting fundamental metrics: {str(e)}")
             return {}
     
+    def reduce_info(self, info):
+        """Drop the Ticker.info keys that get_fundamental_metrics does not use"""
+        keys = ('longName',) + tuple(self.FUNDAMENTAL_FIELDS.values())
+        return {key: info[key] for key in keys if info.get(key) is not None}
+    
     def get_sector_pe(self, sector):
-        """Get average P/E ratio for a sector (simplified implementation)"""
-        # This would ideally fetch real sector data
+        """Get median P/E ratio for a sector"""
+        if self.sector_stats is not None:
+            median_pe = self.sector_stats.get(sector, 'pe_ratio')
+            if median_pe:
+                return median_pe
+        
+        # Fallback when no materialized sector stats are available yet
         sector_pe_map = {
             'Technology': 25,
             'Financial Services': 15,
@@ -134,9 +463,29 @@ class StockDataCollector:
             logger.error(f"Error updating stock list: {str(e)}")
             return False
     
-    def get_financial_statements(self, symbol):
-        """Get financial statements data (simplified)"""
+    def get_financial_statements(self, symbol, use_cache=True):
+        """Get financial statements, served from the local cache until the next expected report"""
         try:
+            cached = self.load_cached_financial_statements(symbol) if use_cache else None
+            if cached and cached['next_report_date'] > datetime.now().date():
+                return cached['statements']
+            
+            statements = self.fetch_financial_statements(symbol)
+            if statements is None:
+                # Keep serving stale statements if the upstream fetch fails
+                return cached['statements'] if cached else None
+            
+            self.cache_financial_statements(symbol, statements)
+            return statements
+        
+        except Exception as e:
+            logger.error(f"Error getting financial statements for {symbol}: {str(e)}")
+            return None
+    
+    def fetch_financial_statements(self, symbol):
+        """Fetch financial statements from Yahoo Finance"""
+        try:
+            import yfinance as yf
             ticker = yf.Ticker(symbol)
             
             # Get financial data
@@ -150,5 +499,90 @@ class StockDataCollector:
                 'cashflow': cashflow
             }
         except Exception as e:
-            logger.error(f"Error getting financial statements for {symbol}: {str(e)}")
+            logger.error(f"Error fetching financial statements for {symbol}: {str(e)}")
+            return None
+    
+    def get_next_report_date(self, period_end):
+        """Expected date of the next statements after the given period end"""
+        if period_end is None:
+            return (datetime.now() + timedelta(days=self.STATEMENT_RECHECK_DAYS)).date()
+        
+        expected = period_end + timedelta(days=self.REPORTING_INTERVAL_DAYS + self.FILING_LAG_DAYS)
+        # Report is overdue: check again shortly rather than on every call
+        recheck = datetime.now() + timedelta(days=self.STATEMENT_RECHECK_DAYS)
+        return max(expected, recheck).date()
+    
+    def cache_financial_statements(self, symbol, statements):
+        """Persist statements keyed by symbol and latest reporting period"""
+        if self.db is None:
+            return False
+        
+        import pandas as pd
+        periods = [
+            pd.Timestamp(column).to_pydatetime()
+            for frame in statements.values() if frame is not None and not frame.empty
+            for column in frame.columns
+        ]
+        period_end = max(periods) if periods else None
+        
+        serialized = {
+            name: (frame if frame is not None else pd.DataFrame()).to_json(
+                orient='split', date_format='iso', double_precision=15
+            )
+            for name, frame in statements.items()
+        }
+        return self.db.save_financial_statements(
+            symbol,
+            serialized,
+            period_end.date() if period_end else None,
+            self.get_next_report_date(period_end)
+        )
+    
+    def load_cached_financial_statements(self, symbol):
+        """Load cached statements and their next expected report date"""
+        if self.db is None:
+            return None
+        
+        import pandas as pd
+        rows = self.db.get_financial_statements(symbol)
+        if not all(name in rows for name in self.STATEMENT_TYPES):
+            return None
+        
+        return {
+            'next_report_date': min(
+                datetime.strptime(rows[name]['next_report_date'], '%Y-%m-%d').date()
+                for name in self.STATEMENT_TYPES
+            ),
+            'statements': {
+                name: pd.read_json(StringIO(rows[name]['data']), orient='split')
+                for name in self.STATEMENT_TYPES
+            }
+        }
+    
+    def prefetch_financial_statements(self, symbols=None, max_workers=8):
+        """Bulk-fetch statements for every symbol whose cache is missing or due"""
+        try:
+            symbols = symbols or self.get_nse_stocks()
+            fresh = self.db.get_fresh_financial_statement_symbols(len(self.STATEMENT_TYPES)) if self.db else set()
+            stale = [symbol for symbol in symbols if symbol not in fresh]
+            
+            fetched = 0
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(self.fetch_financial_statements, symbol): symbol for symbol in stale}
+                # Network I/O runs in the pool; cache writes stay on this thread
+                for future in as_completed(futures):
+                    statements = future.result()
+                    if statements is not None:
+                        self.cache_financial_statements(futures[future], statements)
+                        fetched += 1
+            
+            logger.info(f"Prefetched financial statements: {fetched} fetched, {len(symbols) - len(stale)} cached")
+            return {
+                'fetched': fetched,
+                'cached': len(symbols) - len(stale),
+                'failed': len(stale) - fetched
+            }
+        
+        except Exception as e:
+            logger.error(f"Error prefetching financial statements: {str(e)}")
             return None
\ No newline at end of file
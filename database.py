@@ -1,23 +1,90 @@
 import sqlite3
 import json
+import base64
+import hashlib
+import threading
 from datetime import datetime
+from pathlib import Path
 import logging
 
 logger = logging.getLogger(__name__)
 
+def encode_cursor(values):
+    """Encode keyset pagination values as an opaque cursor string"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, length=2):
+    """Decode a cursor produced by encode_cursor; raises ValueError if malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("Invalid cursor")
+    return values
+
 class Database:
+    # Bulk-exportable datasets: name -> (table, date column, keyset columns).
+    # The keyset columns are a unique key in the order of an index on the table
+    EXPORT_TABLES = {
+        'results': ('analysis_results', 'analysis_date', ('symbol', 'analysis_date', 'id')),
+        'prices': ('price_history', 'date', ('symbol', 'date'))
+    }
+    # Largest export page; memory use grows with it
+    MAX_EXPORT_BATCH = 50000
+    
+    # Sort keys accepted by query_results (all indexed on latest_analysis)
+    RESULT_SORT_KEYS = ('overall_score', 'fundamental_score', 'technical_score',
+                        'price_decline', 'current_price', 'analysis_id')
+    
+    # Per-day indicator columns of daily_features (see StockAnalyzer.extract_feature_series)
+    FEATURE_COLUMNS = ('close', 'max_price_2y', 'price_decline', 'hover_ratio', 'rsi',
+                       'macd', 'macd_signal', 'macd_histogram', 'ma20', 'ma50', 'ma200',
+                       'volume', 'volume_ma20', 'support_60', 'volatility', 'atr',
+                       'bollinger_percent_b', 'adx')
+    
     def __init__(self, db_path='stock_analyzer.db'):
         self.db_path = db_path
         self.init_db()
     
     def init_db(self):
-        """Initialize database connection"""
+        """Initialize database connection.
+        
+        A sqlite3 connection must not be used by several threads at once (their
+        transactions interleave), so each thread gets its own on first use of
+        ``conn``. Call again after a fork: connections are not shared across
+        processes either.
+        """
+        self.local = threading.local()
+        self.connections = {}
+        self.connections_lock = threading.Lock()
         try:
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
+            self.conn
         except Exception as e:
             logger.error(f"Error initializing database: {str(e)}")
     
+    @property
+    def conn(self):
+        """This thread's connection, opened on first use"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # check_same_thread=False only so close() can close every thread's connection
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            # Only takes effect on a fresh database file; existing files are
+            # switched over by apply_retention_policy()
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            self.local.conn = conn
+            
+            with self.connections_lock:
+                # Close the connections of threads that have exited, e.g. the
+                # development server's per-request threads
+                alive = {thread.ident for thread in threading.enumerate()}
+                for ident in [ident for ident in self.connections if ident not in alive]:
+                    self.connections.pop(ident).close()
+                self.connections[threading.get_ident()] = conn
+        return conn
+    
     def create_tables(self):
         """Create necessary tables"""
         try:
@@ -54,6 +121,87 @@ class Database:
                 )
             ''')
             
+            # Archived analysis results (rows moved out by the retention policy)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS analysis_results_archive (
+                    id INTEGER PRIMARY KEY,
+                    symbol TEXT NOT NULL,
+                    analysis_date TIMESTAMP,
+                    current_price REAL,
+                    price_decline REAL,
+                    fundamental_score REAL,
+                    technical_score REAL,
+                    overall_score REAL,
+                    recommendation TEXT,
+                    meets_criteria BOOLEAN,
+                    analysis_data TEXT,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_analysis_results_symbol_date
+                ON analysis_results (symbol, analysis_date)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_analysis_results_date
+                ON analysis_results (analysis_date)
+            ''')
+            
+            # Fingerprint of the inputs behind each symbol's last analysis;
+            # analysis_id is NULL when the symbol did not qualify
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS analysis_fingerprints (
+                    symbol TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    analysis_id INTEGER,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self._add_column_if_missing('analysis_results', 'input_fingerprint', 'TEXT')
+            
+            # Latest analysis per symbol, maintained by save_analysis_result
+            # so result queries never have to scan analysis_results
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS latest_analysis (
+                    symbol TEXT PRIMARY KEY,
+                    analysis_id INTEGER NOT NULL,
+                    name TEXT,
+                    sector TEXT,
+                    analysis_date TIMESTAMP,
+                    current_price REAL,
+                    price_decline REAL,
+                    fundamental_score REAL,
+                    technical_score REAL,
+                    overall_score REAL,
+                    recommendation TEXT,
+                    meets_criteria BOOLEAN
+                )
+            ''')
+            for column in self.RESULT_SORT_KEYS:
+                cursor.execute(f'''
+                    CREATE INDEX IF NOT EXISTS idx_latest_analysis_{column}
+                    ON latest_analysis ({column}, symbol)
+                ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_latest_analysis_sector_score
+                ON latest_analysis (sector, overall_score, symbol)
+            ''')
+            cursor.execute('''
+                INSERT OR IGNORE INTO latest_analysis (
+                    symbol, analysis_id, name, sector, analysis_date, current_price,
+                    price_decline, fundamental_score, technical_score, overall_score,
+                    recommendation, meets_criteria
+                )
+                SELECT ar.symbol, ar.id, s.name, s.sector, ar.analysis_date, ar.current_price,
+                       ar.price_decline, ar.fundamental_score, ar.technical_score,
+                       ar.overall_score, ar.recommendation, ar.meets_criteria
+                FROM analysis_results ar
+                LEFT JOIN stocks s ON ar.symbol = s.symbol
+                WHERE ar.id IN (SELECT MAX(id) FROM analysis_results GROUP BY symbol)
+                  AND NOT EXISTS (SELECT 1 FROM latest_analysis)
+            ''')
+            
             # Price history table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS price_history (
@@ -70,6 +218,95 @@ class Database:
                 )
             ''')
             
+            # Back-adjusted prices live next to the raw ones; see
+            # apply_price_adjustments
+            for column in ('adj_open', 'adj_high', 'adj_low', 'adj_close', 'adj_volume'):
+                self._add_column_if_missing('price_history', column, 'REAL')
+            
+            # Corporate actions (splits/bonus issues and dividends)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS corporate_actions (
+                    symbol TEXT NOT NULL,
+                    action_date DATE NOT NULL,
+                    action_type TEXT NOT NULL,  -- 'split' (ratio) or 'dividend' (amount)
+                    value REAL NOT NULL,
+                    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (symbol, action_date, action_type)
+                )
+            ''')
+            
+            # Symbols whose corporate actions have been synced at least once;
+            # see StockDataCollector.sync_corporate_actions
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS corporate_action_syncs (
+                    symbol TEXT PRIMARY KEY,
+                    synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Cached fundamentals (latest per symbol)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fundamentals (
+                    symbol TEXT PRIMARY KEY,
+                    sector TEXT,
+                    pe_ratio REAL,
+                    pb_ratio REAL,
+                    roe REAL,
+                    gross_margin REAL,
+                    operating_margin REAL,
+                    profit_margin REAL,
+                    data TEXT,  -- JSON string of all fundamental metrics
+                    data_hash TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_fundamentals_sector
+                ON fundamentals (sector)
+            ''')
+            
+            # Materialized sector aggregates
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sector_stats (
+                    sector TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    median REAL,
+                    p25 REAL,
+                    p75 REAL,
+                    count INTEGER,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (sector, metric)
+                )
+            ''')
+            
+            # Cached financial statements (one row per symbol and statement)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS financial_statements (
+                    symbol TEXT NOT NULL,
+                    statement TEXT NOT NULL,
+                    period_end DATE,
+                    next_report_date DATE,
+                    data TEXT,  -- JSON (orient='split') of the statement frame
+                    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (symbol, statement)
+                )
+            ''')
+            
+            # Daily feature store: every intermediate indicator per symbol and trading day
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_features (
+                    symbol TEXT NOT NULL,
+                    trade_date DATE NOT NULL,
+                    {},
+                    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (symbol, trade_date)
+                ) WITHOUT ROWID
+            '''.format(',\n'.join(f'{column} REAL' for column in self.FEATURE_COLUMNS)))
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_daily_features_date
+                ON daily_features (trade_date)
+            ''')
+            
             # Watchlist table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS watchlist (
@@ -103,6 +340,309 @@ class Database:
             logger.error(f"Error saving stock {symbol}: {str(e)}")
             return False
     
+    def save_fundamentals(self, symbol, sector, fundamental_data):
+        """Cache fundamentals for a symbol; returns True if they changed"""
+        try:
+            data = json.dumps(fundamental_data, sort_keys=True, default=str)
+            data_hash = hashlib.sha1(data.encode('utf-8')).hexdigest()
+            
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT data_hash, sector FROM fundamentals WHERE symbol = ?', (symbol,))
+            row = cursor.fetchone()
+            if row and row['data_hash'] == data_hash and row['sector'] == sector:
+                return False
+            
+            cursor.execute('''
+                INSERT OR REPLACE INTO fundamentals (
+                    symbol, sector, pe_ratio, pb_ratio, roe, gross_margin,
+                    operating_margin, profit_margin, data, data_hash, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                symbol,
+                sector,
+                fundamental_data.get('pe_ratio'),
+                fundamental_data.get('pb_ratio'),
+                fundamental_data.get('roe'),
+                fundamental_data.get('gross_margin'),
+                fundamental_data.get('operating_margin'),
+                fundamental_data.get('profit_margin'),
+                data,
+                data_hash,
+                datetime.now()
+            ))
+            
+            self.conn.commit()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error saving fundamentals for {symbol}: {str(e)}")
+            return False
+    
+    def get_fundamentals(self, symbols=None):
+        """Cached fundamental_data dicts by symbol, optionally for some symbols only"""
+        try:
+            cursor = self.conn.cursor()
+            query = 'SELECT symbol, data FROM fundamentals WHERE data IS NOT NULL'
+            params = ()
+            if symbols is not None:
+                symbols = list(symbols)
+                if not symbols:
+                    return {}
+                query += ' AND symbol IN ({})'.format(','.join('?' * len(symbols)))
+                params = tuple(symbols)
+            
+            cursor.execute(query, params)
+            return {row['symbol']: json.loads(row['data']) for row in cursor.fetchall()}
+        
+        except Exception as e:
+            logger.error(f"Error getting fundamentals: {str(e)}")
+            return {}
+    
+    def get_sector_fundamentals(self, sectors=None):
+        """Get the cached sector-comparable fundamentals, optionally for some sectors only"""
+        try:
+            cursor = self.conn.cursor()
+            query = '''
+                SELECT symbol, sector, pe_ratio, pb_ratio, roe,
+                       gross_margin, operating_margin, profit_margin
+                FROM fundamentals
+                WHERE sector IS NOT NULL
+            '''
+            params = ()
+            if sectors is not None:
+                sectors = list(sectors)
+                query += ' AND sector IN ({})'.format(','.join('?' * len(sectors)))
+                params = tuple(sectors)
+            
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+        
+        except Exception as e:
+            logger.error(f"Error getting sector fundamentals: {str(e)}")
+            return []
+    
+    def save_sector_stats(self, sectors, rows):
+        """Replace the materialized aggregates for the given sectors"""
+        try:
+            sectors = list(sectors)
+            cursor = self.conn.cursor()
+            cursor.execute(
+                'DELETE FROM sector_stats WHERE sector IN ({})'.format(','.join('?' * len(sectors))),
+                sectors
+            )
+            cursor.executemany('''
+                INSERT INTO sector_stats (sector, metric, median, p25, p75, count, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (r['sector'], r['metric'], r['median'], r['p25'], r['p75'], r['count'], datetime.now())
+                for r in rows
+            ])
+            
+            self.conn.commit()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error saving sector stats: {str(e)}")
+            return False
+    
+    def get_sector_stats(self):
+        """Get all materialized sector aggregates"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT sector, metric, median, p25, p75, count FROM sector_stats')
+            return [dict(row) for row in cursor.fetchall()]
+        
+        except Exception as e:
+            logger.error(f"Error getting sector stats: {str(e)}")
+            return []
+    
+    def get_screen_features(self):
+        """Latest scores and cached fundamentals per symbol, for the screener"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT s.symbol, s.name, COALESCE(f.sector, s.sector) AS sector, f.data,
+                       la.analysis_date, la.current_price, la.price_decline,
+                       la.fundamental_score, la.technical_score, la.overall_score,
+                       la.recommendation, la.meets_criteria
+                FROM stocks s
+                LEFT JOIN fundamentals f ON f.symbol = s.symbol
+                LEFT JOIN latest_analysis la ON la.symbol = s.symbol
+            ''')
+            
+            latest = self.get_latest_features()
+            
+            rows = []
+            for row in cursor.fetchall():
+                features = json.loads(row['data']) if row['data'] else {}
+                features.update({key: row[key] for key in row.keys() if key != 'data'})
+                if features['meets_criteria'] is not None:
+                    features['meets_criteria'] = bool(features['meets_criteria'])
+                
+                # Indicators of the latest stored trading day
+                daily = dict(latest.get(row['symbol'], {}))
+                if daily:
+                    daily['current_price'] = daily.pop('close')
+                    features.update({key: value for key, value in daily.items() if key != 'computed_at'})
+                rows.append(features)
+            
+            return rows
+        
+        except Exception as e:
+            logger.error(f"Error getting screen features: {str(e)}")
+            return []
+    
+    def save_daily_features(self, frames):
+        """Bulk-write feature frames (symbol -> DataFrame from extract_feature_series).
+        
+        Only days from each symbol's latest stored trade date onwards are
+        written, so after the first scan a symbol costs one or two rows; the
+        latest day is rewritten because its bar may have been provisional.
+        """
+        try:
+            if not frames:
+                return 0
+            
+            cursor = self.conn.cursor()
+            symbols = list(frames)
+            cursor.execute('''
+                SELECT symbol, MAX(trade_date) AS trade_date
+                FROM daily_features
+                WHERE symbol IN ({})
+                GROUP BY symbol
+            '''.format(','.join('?' * len(symbols))), symbols)
+            stored = {row['symbol']: row['trade_date'] for row in cursor.fetchall()}
+            
+            columns = ('trade_date',) + self.FEATURE_COLUMNS
+            rows = []
+            for symbol, frame in frames.items():
+                if symbol in stored:
+                    frame = frame[frame['trade_date'] >= stored[symbol]]
+                values = frame[list(columns)].astype(object)
+                values = values.where(values.notna(), None)
+                rows.extend((symbol, *row) for row in values.itertuples(index=False, name=None))
+            
+            cursor.executemany('''
+                INSERT OR REPLACE INTO daily_features (symbol, {})
+                VALUES ({})
+            '''.format(', '.join(columns), ', '.join('?' * (len(columns) + 1))), rows)
+            
+            self.conn.commit()
+            return len(rows)
+        
+        except Exception as e:
+            logger.error(f"Error saving daily features: {str(e)}")
+            return 0
+    
+    def get_latest_features(self, symbols=None):
+        """Latest stored feature row per symbol"""
+        try:
+            cursor = self.conn.cursor()
+            query = '''
+                SELECT df.*
+                FROM daily_features df
+                JOIN (
+                    SELECT symbol, MAX(trade_date) AS trade_date
+                    FROM daily_features
+                    GROUP BY symbol
+                ) latest ON latest.symbol = df.symbol AND latest.trade_date = df.trade_date
+            '''
+            params = ()
+            if symbols is not None:
+                symbols = list(symbols)
+                query += ' WHERE df.symbol IN ({})'.format(','.join('?' * len(symbols)))
+                params = tuple(symbols)
+            
+            cursor.execute(query, params)
+            return {row['symbol']: dict(row) for row in cursor.fetchall()}
+        
+        except Exception as e:
+            logger.error(f"Error getting latest features: {str(e)}")
+            return {}
+    
+    def get_feature_history(self, symbol, days=365, columns=None):
+        """Stored daily features for a symbol, oldest first"""
+        try:
+            columns = [column for column in (columns or self.FEATURE_COLUMNS) if column in self.FEATURE_COLUMNS]
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT trade_date, {}
+                FROM daily_features
+                WHERE symbol = ? AND trade_date >= date('now', '-' || ? || ' days')
+                ORDER BY trade_date
+            '''.format(', '.join(columns)), (symbol, int(days)))
+            
+            return [dict(row) for row in cursor.fetchall()]
+        
+        except Exception as e:
+            logger.error(f"Error getting feature history for {symbol}: {str(e)}")
+            return []
+    
+    def delete_daily_features(self, symbol):
+        """Drop stored features for a symbol, e.g. after its prices were re-adjusted"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('DELETE FROM daily_features WHERE symbol = ?', (symbol,))
+            self.conn.commit()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error deleting daily features for {symbol}: {str(e)}")
+            return False
+    
+    def save_financial_statements(self, symbol, statements, period_end, next_report_date):
+        """Cache serialized financial statements for a symbol"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.executemany('''
+                INSERT OR REPLACE INTO financial_statements
+                (symbol, statement, period_end, next_report_date, data, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (symbol, statement, period_end, next_report_date, data, datetime.now())
+                for statement, data in statements.items()
+            ])
+            
+            self.conn.commit()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error saving financial statements for {symbol}: {str(e)}")
+            return False
+    
+    def get_financial_statements(self, symbol):
+        """Get cached financial statements for a symbol, keyed by statement"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT statement, period_end, next_report_date, data
+                FROM financial_statements
+                WHERE symbol = ?
+            ''', (symbol,))
+            
+            return {row['statement']: dict(row) for row in cursor.fetchall()}
+        
+        except Exception as e:
+            logger.error(f"Error getting financial statements for {symbol}: {str(e)}")
+            return {}
+    
+    def get_fresh_financial_statement_symbols(self, statement_count=3):
+        """Get symbols whose cached statements are complete and not yet due for a new report"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT symbol
+                FROM financial_statements
+                GROUP BY symbol
+                HAVING COUNT(*) >= ? AND MIN(next_report_date) > date('now')
+            ''', (statement_count,))
+            
+            return {row['symbol'] for row in cursor.fetchall()}
+        
+        except Exception as e:
+            logger.error(f"Error getting fresh financial statements: {str(e)}")
+            return set()
+    
     def save_analysis_result(self, analysis_result):
         """Save analysis result to database"""
         try:
@@ -112,8 +652,8 @@ class Database:
                 INSERT INTO analysis_results (
                     symbol, current_price, price_decline, fundamental_score,
                     technical_score, overall_score, recommendation,
-                    meets_criteria, analysis_data
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    meets_criteria, analysis_data, input_fingerprint
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 analysis_result['symbol'],
                 analysis_result['current_price'],
@@ -123,8 +663,28 @@ class Database:
                 analysis_result['overall_score'],
                 analysis_result['recommendation'],
                 analysis_result['meets_criteria'],
-                json.dumps(analysis_result.get('detailed_data', {}))
+                json.dumps(analysis_result.get('detailed_data', {})),
+                analysis_result.get('input_fingerprint')
             ))
+            analysis_id = cursor.lastrowid
+            
+            if analysis_result.get('input_fingerprint'):
+                self._save_fingerprint(cursor, analysis_result['symbol'],
+                                       analysis_result['input_fingerprint'], analysis_id)
+            
+            cursor.execute('''
+                INSERT OR REPLACE INTO latest_analysis (
+                    symbol, analysis_id, name, sector, analysis_date, current_price,
+                    price_decline, fundamental_score, technical_score, overall_score,
+                    recommendation, meets_criteria
+                )
+                SELECT ar.symbol, ar.id, s.name, s.sector, ar.analysis_date, ar.current_price,
+                       ar.price_decline, ar.fundamental_score, ar.technical_score,
+                       ar.overall_score, ar.recommendation, ar.meets_criteria
+                FROM analysis_results ar
+                LEFT JOIN stocks s ON ar.symbol = s.symbol
+                WHERE ar.id = ?
+            ''', (analysis_id,))
             
             self.conn.commit()
             return True
@@ -159,6 +719,113 @@ class Database:
             logger.error(f"Error getting analysis results: {str(e)}")
             return []
     
+    def save_analysis_fingerprint(self, symbol, fingerprint, analysis_id=None):
+        """Record the input fingerprint of an analysis that produced no result"""
+        try:
+            self._save_fingerprint(self.conn.cursor(), symbol, fingerprint, analysis_id)
+            self.conn.commit()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error saving fingerprint for {symbol}: {str(e)}")
+            return False
+    
+    def _save_fingerprint(self, cursor, symbol, fingerprint, analysis_id):
+        cursor.execute('''
+            INSERT OR REPLACE INTO analysis_fingerprints (symbol, fingerprint, analysis_id, updated_at)
+            VALUES (?, ?, ?, ?)
+        ''', (symbol, fingerprint, analysis_id, datetime.now()))
+    
+    def get_analysis_fingerprints(self):
+        """Get the last input fingerprint per symbol with its latest result, if any"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT f.symbol, f.fingerprint, f.analysis_id, la.name, la.current_price,
+                       la.price_decline, la.fundamental_score, la.technical_score,
+                       la.overall_score, la.recommendation, la.meets_criteria
+                FROM analysis_fingerprints f
+                LEFT JOIN latest_analysis la
+                    ON f.symbol = la.symbol AND f.analysis_id = la.analysis_id
+            ''')
+            
+            return {row['symbol']: dict(row) for row in cursor.fetchall()}
+        
+        except Exception as e:
+            logger.error(f"Error getting analysis fingerprints: {str(e)}")
+            return {}
+    
+    def invalidate_fingerprints(self, symbol):
+        """Force the next scan to re-analyze a symbol"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('DELETE FROM analysis_fingerprints WHERE symbol = ?', (symbol,))
+            self.conn.commit()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error invalidating fingerprints for {symbol}: {str(e)}")
+            return False
+    
+    def query_results(self, min_overall=None, min_fundamental=None, min_technical=None,
+                      sector=None, min_decline=None, max_decline=None, meets_criteria=None,
+                      sort='overall_score', descending=True, cursor=None, limit=50):
+        """Filter and sort the latest result per symbol with keyset pagination.
+        
+        Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last
+        page and only valid with the same ``sort`` and order. Each page is a single range scan on a (sort key, symbol) index,
+        so paging cost does not grow with the page number.
+        """
+        if sort not in self.RESULT_SORT_KEYS:
+            raise ValueError(f"Unsupported sort key: {sort}")
+        
+        conditions = [f'{sort} IS NOT NULL']
+        params = []
+        for clause, value in (
+            ('overall_score >= ?', min_overall),
+            ('fundamental_score >= ?', min_fundamental),
+            ('technical_score >= ?', min_technical),
+            ('sector = ?', sector),
+            ('price_decline >= ?', min_decline),
+            ('price_decline <= ?', max_decline),
+            ('meets_criteria = ?', None if meets_criteria is None else int(meets_criteria))
+        ):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        
+        comparison, direction = ('<', 'DESC') if descending else ('>', 'ASC')
+        if cursor:
+            # The cursor is a position in one ordering; it means nothing in another
+            cursor_sort, cursor_direction, last_value, last_symbol = decode_cursor(cursor, length=4)
+            if (cursor_sort, cursor_direction) != (sort, direction.lower()):
+                raise ValueError(f"Cursor was issued for sort={cursor_sort}&order={cursor_direction}, "
+                                 f"not sort={sort}&order={direction.lower()}")
+            conditions.append(f'({sort}, symbol) {comparison} (?, ?)')
+            params.extend([last_value, last_symbol])
+        
+        try:
+            db_cursor = self.conn.cursor()
+            db_cursor.execute(f'''
+                SELECT *
+                FROM latest_analysis
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {sort} {direction}, symbol {direction}
+                LIMIT ?
+            ''', params + [limit + 1])
+            
+            rows = [dict(row) for row in db_cursor.fetchall()]
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor([sort, direction.lower(), rows[-1][sort], rows[-1]['symbol']])
+            
+            return rows, next_cursor
+        
+        except Exception as e:
+            logger.error(f"Error querying results: {str(e)}")
+            return [], None
+    
     def get_stock_analysis_history(self, symbol, days=30):
         """Get analysis history for a specific stock"""
         try:
@@ -184,26 +851,40 @@ class Database:
             return []
     
     def save_price_history(self, symbol, price_data):
-        """Save historical price data"""
+        """Save historical price data (unadjusted bars; see apply_price_adjustments)"""
         try:
             cursor = self.conn.cursor()
             
-            for date, row in price_data.iterrows():
-                cursor.execute('''
-                    INSERT OR REPLACE INTO price_history 
-                    (symbol, date, open_price, high_price, low_price, close_price, volume)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
+            # Adjusted columns start out equal to the raw prices
+            cursor.executemany('''
+                INSERT OR REPLACE INTO price_history 
+                (symbol, date, open_price, high_price, low_price, close_price, volume,
+                 adj_open, adj_high, adj_low, adj_close, adj_volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (
                     symbol,
                     date.strftime('%Y-%m-%d'),
-                    row['Open'],
-                    row['High'],
-                    row['Low'],
-                    row['Close'],
-                    row['Volume']
-                ))
+                    float(row['Open']),
+                    float(row['High']),
+                    float(row['Low']),
+                    float(row['Close']),
+                    int(row['Volume']),
+                    float(row['Open']),
+                    float(row['High']),
+                    float(row['Low']),
+                    float(row['Close']),
+                    float(row['Volume'])
+                )
+                for date, row in price_data.iterrows()
+            ])
             
             self.conn.commit()
+            
+            # Re-apply any known corporate actions to the rewritten bars
+            if self.has_corporate_actions(symbol):
+                self.apply_price_adjustments(symbol)
+            
             return True
             
         except Exception as e:
@@ -227,14 +908,206 @@ class Database:
             logger.error(f"Error getting price history: {str(e)}")
             return []
     
+    def get_export_columns(self, dataset):
+        """(name, declared type) of every column of an exportable dataset"""
+        table = self.EXPORT_TABLES[dataset][0]
+        cursor = self.conn.cursor()
+        cursor.execute(f'PRAGMA table_info({table})')
+        return [(row['name'], row['type']) for row in cursor.fetchall()]
+    
+    def iter_export(self, dataset, columns, symbols=None, start=None, end=None, batch_size=5000):
+        """Yield lists of up to ``batch_size`` row tuples of a dataset, in key order.
+        
+        Rows are read through a dedicated read-only connection, one keyset
+        page per statement, so memory stays at one page whatever the table
+        size. No lock is held between pages, and the shared connection stays
+        free for other requests. ``start`` and ``end`` are inclusive dates.
+        """
+        table, date_column, keys = self.EXPORT_TABLES[dataset]
+        if not 1 <= batch_size <= self.MAX_EXPORT_BATCH:
+            raise ValueError(f"batch_size must be between 1 and {self.MAX_EXPORT_BATCH}")
+        conditions = []
+        params = []
+        if symbols:
+            conditions.append('symbol IN ({})'.format(','.join('?' * len(symbols))))
+            params.extend(symbols)
+        if start:
+            conditions.append(f'{date_column} >= ?')
+            params.append(start)
+        if end:
+            conditions.append(f"{date_column} < date(?, '+1 day')")
+            params.append(end)
+        
+        select = ', '.join(keys + tuple(columns))
+        order = ', '.join(keys)
+        
+        conn = sqlite3.connect(f'{Path(self.db_path).resolve().as_uri()}?mode=ro', uri=True,
+                               check_same_thread=False)
+        try:
+            last_key = None
+            while True:
+                page_conditions = list(conditions)
+                page_params = list(params)
+                if last_key is not None:
+                    page_conditions.append(f'({order}) > ({", ".join("?" * len(keys))})')
+                    page_params.extend(last_key)
+                
+                rows = conn.execute(f'''
+                    SELECT {select}
+                    FROM {table}
+                    {'WHERE ' + ' AND '.join(page_conditions) if page_conditions else ''}
+                    ORDER BY {order}
+                    LIMIT ?
+                ''', page_params + [batch_size]).fetchall()
+                if not rows:
+                    return
+                
+                last_key = rows[-1][:len(keys)]
+                yield [row[len(keys):] for row in rows]
+                if len(rows) < batch_size:
+                    return
+        
+        except Exception as e:
+            logger.error(f"Error exporting {dataset}: {str(e)}")
+            raise
+        finally:
+            conn.close()
+    
+    def save_corporate_actions(self, symbol, events):
+        """Store corporate action events; returns the ones not seen before"""
+        try:
+            cursor = self.conn.cursor()
+            
+            new_events = []
+            for event in events:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO corporate_actions (symbol, action_date, action_type, value)
+                    VALUES (?, ?, ?, ?)
+                ''', (symbol, event['date'], event['type'], event['value']))
+                if cursor.rowcount:
+                    new_events.append(event)
+            
+            self.conn.commit()
+            return new_events
+        
+        except Exception as e:
+            logger.error(f"Error saving corporate actions for {symbol}: {str(e)}")
+            return []
+    
+    def corporate_actions_synced(self, symbol):
+        """Whether a symbol's corporate actions have been synced before"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT 1 FROM corporate_action_syncs WHERE symbol = ?', (symbol,))
+            return cursor.fetchone() is not None
+        
+        except Exception as e:
+            logger.error(f"Error checking corporate action sync for {symbol}: {str(e)}")
+            return False
+    
+    def mark_corporate_actions_synced(self, symbol):
+        """Record a completed corporate action sync for a symbol"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO corporate_action_syncs (symbol, synced_at)
+                VALUES (?, CURRENT_TIMESTAMP)
+            ''', (symbol,))
+            self.conn.commit()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error marking corporate action sync for {symbol}: {str(e)}")
+            return False
+    
+    def get_price_history_span(self, symbol):
+        """(first, last) stored bar date for a symbol; (None, None) without bars"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT MIN(date), MAX(date) FROM price_history WHERE symbol = ?', (symbol,))
+            first, last = cursor.fetchone()
+            return first, last
+        
+        except Exception as e:
+            logger.error(f"Error getting price history span for {symbol}: {str(e)}")
+            return None, None
+    
+    def has_corporate_actions(self, symbol):
+        """Whether any corporate action is stored for a symbol"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT 1 FROM corporate_actions WHERE symbol = ? LIMIT 1', (symbol,))
+            return cursor.fetchone() is not None
+        
+        except Exception as e:
+            logger.error(f"Error checking corporate actions for {symbol}: {str(e)}")
+            return False
+    
+    def apply_price_adjustments(self, symbol):
+        """Recompute adjusted prices for a symbol from raw bars and all known actions.
+        
+        The adjusted columns are always rebuilt from the raw ones (see
+        stock_record.adjustment_factors), so re-running this never compounds
+        an adjustment, and nothing has to be refetched.
+        """
+        import numpy as np
+        from stock_record import adjustment_factors
+        
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT id, date, open_price, high_price, low_price, close_price, volume
+                FROM price_history
+                WHERE symbol = ?
+                ORDER BY date ASC
+            ''', (symbol,))
+            rows = cursor.fetchall()
+            if not rows:
+                return 0
+            
+            cursor.execute('''
+                SELECT action_date, action_type, value
+                FROM corporate_actions
+                WHERE symbol = ?
+                ORDER BY action_date ASC
+            ''', (symbol,))
+            events = [(row['action_date'], row['action_type'], row['value']) for row in cursor.fetchall()]
+            
+            ids = np.array([row['id'] for row in rows])
+            dates = np.array([row['date'] for row in rows])
+            prices = np.array([
+                [row['open_price'], row['high_price'], row['low_price'], row['close_price']]
+                for row in rows
+            ], dtype=np.float64)
+            volume = np.array([row['volume'] or 0 for row in rows], dtype=np.float64)
+            
+            price_factor, volume_factor = adjustment_factors(dates, prices[:, 3], events)
+            adjusted = prices * price_factor[:, None]
+            adjusted_volume = volume * volume_factor
+            
+            cursor.executemany('''
+                UPDATE price_history
+                SET adj_open = ?, adj_high = ?, adj_low = ?, adj_close = ?, adj_volume = ?
+                WHERE id = ?
+            ''', zip(*adjusted.T.tolist(), adjusted_volume.tolist(), ids.tolist()))
+            
+            self.conn.commit()
+            return len(rows)
+        
+        except Exception as e:
+            logger.error(f"Error applying price adjustments for {symbol}: {str(e)}")
+            return 0
+    
     def add_to_watchlist(self, symbol, notes=""):
         """Add stock to watchlist"""
         try:
             cursor = self.conn.cursor()
+            # watchlist.symbol has no UNIQUE constraint, so skip duplicates here
             cursor.execute('''
-                INSERT OR IGNORE INTO watchlist (symbol, notes)
-                VALUES (?, ?)
-            ''', (symbol, notes))
+                INSERT INTO watchlist (symbol, notes)
+                SELECT ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM watchlist WHERE symbol = ?)
+            ''', (symbol, notes, symbol))
             
             self.conn.commit()
             return True
@@ -248,15 +1121,11 @@ class Database:
         try:
             cursor = self.conn.cursor()
             cursor.execute('''
-                SELECT w.*, s.name, 
-                       ar.overall_score, ar.recommendation, ar.current_price
+                SELECT w.*, s.name,
+                       la.overall_score, la.recommendation, la.current_price
                 FROM watchlist w
-                JOIN stocks s ON w.symbol = s.symbol
-                LEFT JOIN (
-                    SELECT symbol, overall_score, recommendation, current_price,
-                           ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY analysis_date DESC) as rn
-                    FROM analysis_results
-                ) ar ON w.symbol = ar.symbol AND ar.rn = 1
+                LEFT JOIN stocks s ON w.symbol = s.symbol
+                LEFT JOIN latest_analysis la ON w.symbol = la.symbol
                 ORDER BY w.added_at DESC
             ''')
             
@@ -266,6 +1135,27 @@ class Database:
             logger.error(f"Error getting watchlist: {str(e)}")
             return []
     
+    def get_latest_scores(self, symbols):
+        """Get the latest stored scores for several symbols in one query"""
+        try:
+            symbols = list(symbols)
+            if not symbols:
+                return {}
+            
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT symbol, name, analysis_date, fundamental_score,
+                       technical_score, overall_score, recommendation
+                FROM latest_analysis
+                WHERE symbol IN ({})
+            '''.format(','.join('?' * len(symbols))), symbols)
+            
+            return {row['symbol']: dict(row) for row in cursor.fetchall()}
+        
+        except Exception as e:
+            logger.error(f"Error getting latest scores: {str(e)}")
+            return {}
+    
     def remove_from_watchlist(self, symbol):
         """Remove stock from watchlist"""
         try:
@@ -307,10 +1197,176 @@ class Database:
             logger.error(f"Error getting statistics: {str(e)}")
             return {}
     
+    def get_table_stats(self, tables=('analysis_results', 'analysis_results_archive')):
+        """Get row counts per table and the database file size"""
+        try:
+            cursor = self.conn.cursor()
+            
+            stats = {'rows': {}}
+            for table in tables:
+                cursor.execute(f'SELECT COUNT(*) as count FROM {table}')
+                stats['rows'][table] = cursor.fetchone()['count']
+            
+            page_size = cursor.execute('PRAGMA page_size').fetchone()[0]
+            page_count = cursor.execute('PRAGMA page_count').fetchone()[0]
+            freelist_count = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+            stats['size_bytes'] = page_size * page_count
+            stats['free_bytes'] = page_size * freelist_count
+            
+            return stats
+        
+        except Exception as e:
+            logger.error(f"Error getting table stats: {str(e)}")
+            return {}
+    
+    def apply_retention_policy(self, full_days=7, downsample='day', archive_days=365,
+                               batch_size=500, vacuum_pages=1000, enable_incremental_vacuum=False):
+        """Downsample and archive old analysis results.
+        
+        Rows newer than ``full_days`` are kept as-is. Older rows are reduced
+        to the latest row per symbol per ``downsample`` bucket ('day' or
+        'week'), and rows older than ``archive_days`` are moved to
+        ``analysis_results_archive``. Deletes run in batches of
+        ``batch_size`` with a commit after each so the write lock is only
+        held briefly; freed pages are then reclaimed with an incremental
+        vacuum.
+        
+        Databases created before incremental auto-vacuum was the default
+        need a one-time full VACUUM to switch over. That rewrites the whole
+        file under an exclusive lock, so it only runs when
+        ``enable_incremental_vacuum`` is set; otherwise freed pages are
+        reused but the file does not shrink.
+        """
+        # Bucket key per row; weeks run Monday-Sunday and are keyed by their
+        # Monday, so a week spanning New Year stays one bucket
+        bucket_keys = {
+            'day': "date(analysis_date)",
+            'week': "date(analysis_date, 'weekday 0', '-6 days')"
+        }
+        if downsample not in bucket_keys:
+            raise ValueError(f"Unsupported downsample bucket: {downsample}")
+        
+        try:
+            before = self.get_table_stats()
+            if enable_incremental_vacuum:
+                self._ensure_incremental_vacuum()
+            elif self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                logger.info("Incremental auto-vacuum not enabled; skipping the full VACUUM needed to switch")
+            cursor = self.conn.cursor()
+            
+            full_cutoff = f'-{int(full_days)} days'
+            archive_cutoff = f'-{int(archive_days)} days'
+            
+            # Archive: copy then delete, one batch per transaction
+            archived = 0
+            while True:
+                cursor.execute('''
+                    SELECT id FROM analysis_results
+                    WHERE analysis_date < datetime('now', ?)
+                    LIMIT ?
+                ''', (archive_cutoff, batch_size))
+                ids = [row['id'] for row in cursor.fetchall()]
+                if not ids:
+                    break
+                
+                placeholders = ','.join('?' * len(ids))
+                cursor.execute(f'''
+                    INSERT OR REPLACE INTO analysis_results_archive (
+                        id, symbol, analysis_date, current_price, price_decline,
+                        fundamental_score, technical_score, overall_score,
+                        recommendation, meets_criteria, analysis_data
+                    )
+                    SELECT id, symbol, analysis_date, current_price, price_decline,
+                           fundamental_score, technical_score, overall_score,
+                           recommendation, meets_criteria, analysis_data
+                    FROM analysis_results WHERE id IN ({placeholders})
+                ''', ids)
+                cursor.execute(f'DELETE FROM analysis_results WHERE id IN ({placeholders})', ids)
+                self.conn.commit()
+                archived += len(ids)
+            
+            # Downsample: keep only the latest row per symbol per bucket. The
+            # rows to drop are found in one pass into a temp table (private
+            # to this connection), then deleted in id order one batch at a
+            # time, instead of re-running the grouping for every batch
+            cursor.execute('DROP TABLE IF EXISTS temp.retention_drop')
+            cursor.execute(f'''
+                CREATE TEMP TABLE retention_drop AS
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY symbol, {bucket_keys[downsample]} ORDER BY id DESC
+                    ) AS newest
+                    FROM analysis_results
+                    WHERE analysis_date < datetime('now', ?)
+                )
+                WHERE newest > 1
+                ORDER BY id
+            ''', (full_cutoff,))
+            self.conn.commit()
+            
+            downsampled = 0
+            last_id = -1
+            while True:
+                cursor.execute('''
+                    SELECT id FROM temp.retention_drop WHERE id > ? ORDER BY id LIMIT ?
+                ''', (last_id, batch_size))
+                ids = [row['id'] for row in cursor.fetchall()]
+                if not ids:
+                    break
+                
+                placeholders = ','.join('?' * len(ids))
+                cursor.execute(f'DELETE FROM analysis_results WHERE id IN ({placeholders})', ids)
+                self.conn.commit()
+                downsampled += cursor.rowcount
+                last_id = ids[-1]
+            cursor.execute('DROP TABLE temp.retention_drop')
+            
+            # executescript steps the pragma to completion; execute() would
+            # only free a single page. A no-op unless auto_vacuum is INCREMENTAL
+            incremental = cursor.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+            if incremental:
+                self.conn.executescript(f'PRAGMA incremental_vacuum({int(vacuum_pages)});')
+            
+            after = self.get_table_stats()
+            logger.info(f"Retention policy applied: {archived} archived, {downsampled} downsampled")
+            
+            return {
+                'archived': archived,
+                'downsampled': downsampled,
+                'incremental_vacuum': incremental,
+                'before': before,
+                'after': after
+            }
+        
+        except Exception as e:
+            logger.error(f"Error applying retention policy: {str(e)}")
+            return None
+    
+    def _add_column_if_missing(self, table, column, definition):
+        """Add a column to an existing table (lightweight schema migration)"""
+        cursor = self.conn.cursor()
+        columns = [row['name'] for row in cursor.execute(f'PRAGMA table_info({table})')]
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    
+    def _ensure_incremental_vacuum(self):
+        """Switch an existing database file to incremental auto-vacuum (full VACUUM, exclusive lock)"""
+        cursor = self.conn.cursor()
+        mode = cursor.execute('PRAGMA auto_vacuum').fetchone()[0]
+        if mode != 2:  # 2 = INCREMENTAL
+            # Changing the mode of a populated file needs one full VACUUM
+            logger.info("Enabling incremental auto-vacuum (one-time VACUUM)")
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            self.conn.commit()
+            cursor.execute('VACUUM')
+    
     def close(self):
-        """Close database connection"""
-        if hasattr(self, 'conn'):
-            self.conn.close()
+        """Close every thread's database connection"""
+        with self.connections_lock:
+            for conn in self.connections.values():
+                conn.close()
+            self.connections = {}
+        self.local = threading.local()
 
 class Stock:
     """Stock model class"""
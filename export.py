@@ -0,0 +1,102 @@
+import io
+import csv
+import importlib.util
+import logging
+
+# pyarrow and pandas are imported on first use; pyarrow is only needed for
+# Parquet exports
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+def parquet_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+def stream_csv(columns, chunks):
+    """Yield CSV text: the header, then one piece per chunk of row tuples"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain"""
+    
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+def _arrow_type(declared):
+    import pyarrow as pa
+    declared = (declared or '').upper()
+    if declared == 'INTEGER':
+        return pa.int64()
+    if declared == 'REAL':
+        return pa.float64()
+    if declared == 'BOOLEAN':
+        return pa.bool_()
+    if declared == 'DATE':
+        return pa.date32()
+    if declared == 'TIMESTAMP':
+        return pa.timestamp('us')
+    return pa.string()
+
+def _arrow_array(values, arrow_type):
+    import pyarrow as pa
+    if pa.types.is_boolean(arrow_type):
+        return pa.array([None if value is None else bool(value) for value in values], type=arrow_type)
+    if pa.types.is_date32(arrow_type) or pa.types.is_timestamp(arrow_type):
+        # Stored as text; values that do not parse become null
+        import pandas as pd
+        parsed = pd.to_datetime(pd.Series(values, dtype='object'), errors='coerce', format='ISO8601')
+        return pa.Array.from_pandas(parsed).cast(arrow_type)
+    return pa.array(values, type=arrow_type)
+
+def stream_parquet(columns, declared_types, chunks):
+    """Yield a Parquet file in pieces, writing one row group per chunk of row tuples"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = pa.schema([(name, _arrow_type(declared)) for name, declared in zip(columns, declared_types)])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for rows in chunks:
+            values = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [_arrow_array(column, field.type) for column, field in zip(values, schema)],
+                schema=schema
+            ))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        # Writes the footer; without it the file is unreadable
+        writer.close()
+    yield sink.drain()
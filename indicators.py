@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Vectorized indicator kernels for the Stock Recovery Analyzer
+
+Every function takes contiguous float64 NumPy arrays, either 1-D (one
+series) or 2-D with dates on axis 0 and symbols on axis 1, and returns
+arrays of the same shape with NaN where an indicator is still warming up.
+Columns of a 2-D panel must share the same dates; a NaN inside a column
+propagates through the recursive indicators.
+
+Run ``python indicators.py`` to check parity against reference pandas
+implementations and to print micro-benchmarks.
+"""
+
+import time
+import numpy as np
+
+def _as_2d(values):
+    """View input as a (dates, symbols) float64 array; also return whether it was 1-D"""
+    array = np.ascontiguousarray(values, dtype=np.float64)
+    if array.ndim == 1:
+        return array[:, None], True
+    if array.ndim != 2:
+        raise ValueError("Indicator inputs must be 1-D or 2-D arrays")
+    return array, False
+
+def _restore(array, was_1d):
+    return array[:, 0] if was_1d else array
+
+def sma(values, window):
+    """Simple moving average over ``window`` bars"""
+    array, was_1d = _as_2d(values)
+    out = np.full(array.shape, np.nan)
+    if len(array) >= window:
+        cumsum = np.cumsum(np.vstack([np.zeros((1, array.shape[1])), array]), axis=0)
+        out[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return _restore(out, was_1d)
+
+def ema(values, span=None, alpha=None, adjust=True):
+    """Exponential moving average, matching ``pandas.Series.ewm(...).mean()``"""
+    array, was_1d = _as_2d(values)
+    if alpha is None:
+        alpha = 2.0 / (span + 1.0)
+    decay = 1.0 - alpha
+    
+    out = np.empty(array.shape)
+    if not len(array):
+        return _restore(out, was_1d)
+    
+    if adjust:
+        # Weighted average with weights (1 - alpha)^i, kept as a running
+        # numerator/denominator so each step is O(symbols)
+        numerator = array[0].copy()
+        denominator = np.ones(array.shape[1])
+        out[0] = numerator
+        for t in range(1, len(array)):
+            numerator = array[t] + decay * numerator
+            denominator = 1.0 + decay * denominator
+            out[t] = numerator / denominator
+    else:
+        out[0] = array[0]
+        for t in range(1, len(array)):
+            out[t] = decay * out[t - 1] + alpha * array[t]
+    
+    return _restore(out, was_1d)
+
+def wilder_smooth(values, period, offset=0):
+    """Wilder's smoothing: SMA seed over the first ``period`` valid bars, then alpha = 1/period"""
+    array, was_1d = _as_2d(values)
+    out = np.full(array.shape, np.nan)
+    seed = offset + period - 1
+    if len(array) <= seed:
+        return _restore(out, was_1d)
+    
+    out[seed] = array[offset:seed + 1].mean(axis=0)
+    for t in range(seed + 1, len(array)):
+        out[t] = out[t - 1] + (array[t] - out[t - 1]) / period
+    
+    return _restore(out, was_1d)
+
+def wilder_rsi(close, period=14):
+    """Relative Strength Index with Wilder smoothing"""
+    array, was_1d = _as_2d(close)
+    delta = np.full(array.shape, np.nan)
+    delta[1:] = np.diff(array, axis=0)
+    
+    avg_gain = wilder_smooth(np.where(delta > 0, delta, 0.0), period, offset=1)
+    avg_loss = wilder_smooth(np.where(delta < 0, -delta, 0.0), period, offset=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    rsi = np.where((avg_loss == 0) & (avg_gain > 0), 100.0, rsi)
+    
+    return _restore(rsi, was_1d)
+
+def macd(close, fast=12, slow=26, signal=9):
+    """MACD line, signal line and histogram (pandas ``ewm(span=...)`` semantics)"""
+    macd_line = ema(close, span=fast) - ema(close, span=slow)
+    signal_line = ema(macd_line, span=signal)
+    return macd_line, signal_line, macd_line - signal_line
+
+def true_range(high, low, close):
+    """True range; the first bar uses high - low"""
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    
+    tr = high - low
+    previous_close = close[:-1]
+    tr[1:] = np.maximum.reduce([
+        tr[1:],
+        np.abs(high[1:] - previous_close),
+        np.abs(low[1:] - previous_close)
+    ])
+    return _restore(tr, was_1d)
+
+def atr(high, low, close, period=14):
+    """Average True Range with Wilder smoothing"""
+    return wilder_smooth(true_range(high, low, close), period)
+
+def bollinger_percent_b(close, window=20, num_std=2.0):
+    """Position of the close within the Bollinger Bands (0 = lower, 1 = upper)"""
+    array, was_1d = _as_2d(close)
+    mean = sma(array, window)
+    # Sample standard deviation (ddof=1), as pandas' rolling().std(); taken
+    # over window views rather than sum-of-squares to avoid cancellation
+    std = _rolling_reduce(array, window, lambda windows, axis: windows.std(axis=axis, ddof=1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percent_b = (array - (mean - num_std * std)) / (2.0 * num_std * std)
+    
+    return _restore(percent_b, was_1d)
+
+def adx(high, low, close, period=14):
+    """Average Directional Index (trend strength, 0-100)"""
+    high, was_1d = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    
+    up = np.full(high.shape, np.nan)
+    down = np.full(high.shape, np.nan)
+    up[1:] = high[1:] - high[:-1]
+    down[1:] = low[:-1] - low[1:]
+    plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+    minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+    
+    tr = true_range(high, low, close)
+    smoothed_tr = wilder_smooth(tr, period, offset=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        plus_di = 100.0 * wilder_smooth(plus_dm, period, offset=1) / smoothed_tr
+        minus_di = 100.0 * wilder_smooth(minus_dm, period, offset=1) / smoothed_tr
+        dx = 100.0 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+    
+    return _restore(wilder_smooth(dx, period, offset=period), was_1d)
+
+def rolling_min(values, window):
+    """Rolling minimum over ``window`` bars"""
+    return _rolling_reduce(values, window, np.min)
+
+def rolling_max(values, window):
+    """Rolling maximum over ``window`` bars"""
+    return _rolling_reduce(values, window, np.max)
+
+def _rolling_reduce(values, window, reducer):
+    array, was_1d = _as_2d(values)
+    out = np.full(array.shape, np.nan)
+    if len(array) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(array, window, axis=0)
+        out[window - 1:] = reducer(windows, axis=-1)
+    return _restore(out, was_1d)
+
+# Reference pandas implementations, used only for the parity check
+
+def _reference_wilder(series, period, offset=0):
+    import pandas as pd
+    seeded = pd.Series(np.nan, index=series.index)
+    seed = offset + period - 1
+    seeded.iloc[seed] = series.iloc[offset:seed + 1].mean()
+    seeded.iloc[seed + 1:] = series.iloc[seed + 1:]
+    return seeded.ewm(alpha=1.0 / period, adjust=False).mean()
+
+def _reference_indicators(frame):
+    import pandas as pd
+    close, high, low = frame['Close'], frame['High'], frame['Low']
+    
+    delta = close.diff()
+    avg_gain = _reference_wilder(delta.clip(lower=0), 14, offset=1)
+    avg_loss = _reference_wilder(-delta.clip(upper=0), 14, offset=1)
+    rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    
+    macd_line = close.ewm(span=12).mean() - close.ewm(span=26).mean()
+    signal_line = macd_line.ewm(span=9).mean()
+    
+    tr = pd.concat([high - low, (high - close.shift()).abs(), (low - close.shift()).abs()], axis=1).max(axis=1)
+    
+    mean, std = close.rolling(20).mean(), close.rolling(20).std()
+    percent_b = (close - (mean - 2 * std)) / (4 * std)
+    
+    up, down = high.diff(), -low.diff()
+    plus_dm = up.where((up > down) & (up > 0), 0.0)
+    minus_dm = down.where((down > up) & (down > 0), 0.0)
+    smoothed_tr = _reference_wilder(tr, 14, offset=1)
+    plus_di = 100 * _reference_wilder(plus_dm, 14, offset=1) / smoothed_tr
+    minus_di = 100 * _reference_wilder(minus_dm, 14, offset=1) / smoothed_tr
+    dx = 100 * (plus_di - minus_di).abs() / (plus_di + minus_di)
+    
+    return {
+        'sma': close.rolling(20).mean(),
+        'ema': close.ewm(span=12).mean(),
+        'rsi': rsi,
+        'macd': macd_line,
+        'macd_signal': signal_line,
+        'atr': _reference_wilder(tr, 14),
+        'percent_b': percent_b,
+        'adx': _reference_wilder(dx, 14, offset=14),
+        'rolling_min': close.rolling(60).min(),
+        'rolling_max': close.rolling(60).max()
+    }
+
+def _kernel_indicators(high, low, close):
+    macd_line, signal_line, _ = macd(close)
+    return {
+        'sma': sma(close, 20),
+        'ema': ema(close, span=12),
+        'rsi': wilder_rsi(close),
+        'macd': macd_line,
+        'macd_signal': signal_line,
+        'atr': atr(high, low, close),
+        'percent_b': bollinger_percent_b(close),
+        'adx': adx(high, low, close),
+        'rolling_min': rolling_min(close, 60),
+        'rolling_max': rolling_max(close, 60)
+    }
+
+def _synthetic_panel(dates=500, symbols=200, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (dates, symbols)), axis=0))
+    spread = np.abs(rng.normal(0, 0.01, (dates, symbols))) * close
+    return close + spread, close - spread, close
+
+def check_parity(tolerance=1e-8):
+    """Compare every kernel with its pandas reference on 1-D and 2-D inputs"""
+    import pandas as pd
+    
+    high, low, close = _synthetic_panel(symbols=5)
+    panel = _kernel_indicators(high, low, close)
+    
+    ok = True
+    for column in range(close.shape[1]):
+        frame = pd.DataFrame({'High': high[:, column], 'Low': low[:, column], 'Close': close[:, column]})
+        reference = _reference_indicators(frame)
+        single = _kernel_indicators(high[:, column], low[:, column], close[:, column])
+        for name, expected in reference.items():
+            expected = expected.to_numpy()
+            for label, actual in (('1-D', single[name]), ('2-D', panel[name][:, column])):
+                if not np.allclose(actual, expected, atol=tolerance, rtol=tolerance, equal_nan=True):
+                    diff = np.nanmax(np.abs(actual - expected))
+                    print(f"❌ {name} ({label}, column {column}) differs by up to {diff:.3g}")
+                    ok = False
+    
+    if ok:
+        print(f"✅ All {len(reference)} kernels match the pandas reference (1-D and 2-D)")
+    return ok
+
+def benchmark(dates=500, symbols=200, repeat=3):
+    """Time kernels on a (dates x symbols) panel against per-symbol pandas calls"""
+    import pandas as pd
+    
+    high, low, close = _synthetic_panel(dates, symbols)
+    frames = [
+        pd.DataFrame({'High': high[:, i], 'Low': low[:, i], 'Close': close[:, i]})
+        for i in range(symbols)
+    ]
+    
+    def best_of(fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+    
+    kernel_time = best_of(lambda: _kernel_indicators(high, low, close))
+    pandas_time = best_of(lambda: [_reference_indicators(frame) for frame in frames])
+    
+    print(f"⏱  {dates} dates x {symbols} symbols, all indicators:")
+    print(f"   kernels (2-D):       {kernel_time * 1000:8.1f} ms  ({kernel_time / symbols * 1e6:7.1f} us/symbol)")
+    print(f"   pandas (per symbol): {pandas_time * 1000:8.1f} ms  ({pandas_time / symbols * 1e6:7.1f} us/symbol)")
+    print(f"   speed-up:            {pandas_time / kernel_time:8.1f}x")
+    return kernel_time, pandas_time
+
+if __name__ == "__main__":
+    parity_ok = check_parity()
+    benchmark()
+    raise SystemExit(0 if parity_ok else 1)
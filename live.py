@@ -0,0 +1,410 @@
+import heapq
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+import logging
+
+# numpy is imported on first use so that importing this module stays cheap
+
+logger = logging.getLogger(__name__)
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+def is_market_open(now=None):
+    """NSE regular session: 09:15-15:30 IST, Monday to Friday"""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    if now.weekday() >= 5:
+        return False
+    minutes = now.hour * 60 + now.minute
+    return 9 * 60 + 15 <= minutes <= 15 * 60 + 30
+
+class Leaderboard:
+    """Bounded top-K ranking maintained with two heaps and lazy deletion.
+    
+    ``top`` is a min-heap over the K members and ``rest`` a max-heap over
+    everything else. An update pushes one entry and swaps at most a few
+    entries across the boundary, so re-ranking after a tick costs
+    O(changed * log n) rather than a full sort. Superseded heap entries are
+    skipped when they surface and the heaps are rebuilt once stale entries
+    dominate.
+    """
+    
+    def __init__(self, k=20):
+        self.k = k
+        self.scores = {}
+        self.members = set()
+        self.top = []
+        self.rest = []
+    
+    def update(self, symbol, score):
+        """Set a symbol's score; None removes it from the ranking"""
+        if score is None:
+            self.scores.pop(symbol, None)
+            self.members.discard(symbol)
+        else:
+            self.scores[symbol] = score
+            if symbol in self.members:
+                heapq.heappush(self.top, (score, symbol))
+            else:
+                heapq.heappush(self.rest, (-score, symbol))
+        
+        self._rebalance()
+        self._compact()
+    
+    def ranked(self):
+        """Members ordered best first as (symbol, score) pairs"""
+        return sorted(((symbol, self.scores[symbol]) for symbol in self.members),
+                      key=lambda item: item[1], reverse=True)
+    
+    def _valid_top(self):
+        while self.top:
+            score, symbol = self.top[0]
+            if symbol in self.members and self.scores.get(symbol) == score:
+                return True
+            heapq.heappop(self.top)
+        return False
+    
+    def _valid_rest(self):
+        while self.rest:
+            score, symbol = self.rest[0]
+            if symbol not in self.members and self.scores.get(symbol) == -score:
+                return True
+            heapq.heappop(self.rest)
+        return False
+    
+    def _rebalance(self):
+        while self._valid_rest():
+            if len(self.members) < self.k:
+                score, symbol = heapq.heappop(self.rest)
+                self.members.add(symbol)
+                heapq.heappush(self.top, (-score, symbol))
+                continue
+            
+            # Swap while the best outsider beats the worst member
+            if not self._valid_top() or -self.rest[0][0] <= self.top[0][0]:
+                break
+            
+            score, symbol = heapq.heappop(self.rest)
+            worst_score, worst_symbol = heapq.heappop(self.top)
+            self.members.discard(worst_symbol)
+            self.members.add(symbol)
+            heapq.heappush(self.top, (-score, symbol))
+            heapq.heappush(self.rest, (-worst_score, worst_symbol))
+    
+    def _compact(self):
+        if len(self.top) > 2 * len(self.members) + 16:
+            self.top = [(self.scores[symbol], symbol) for symbol in self.members]
+            heapq.heapify(self.top)
+        outsiders = len(self.scores) - len(self.members)
+        if len(self.rest) > 2 * outsiders + 16:
+            self.rest = [(-score, symbol) for symbol, score in self.scores.items()
+                         if symbol not in self.members]
+            heapq.heapify(self.rest)
+
+class LiveSymbolState:
+    """Price-sensitive scoring state for one symbol.
+    
+    The last bar of the scanned history is treated as provisional and is
+    replaced by each live price; components that do not depend on the latest
+    price (fundamentals, MACD, volume, support/resistance) are frozen at seed
+    time. Running sums over completed bars make each tick O(1); they are
+    rebuilt only when a new trading day rolls the provisional bar over.
+    """
+    
+    MA_WINDOWS = (20, 50, 200)
+    RSI_PERIOD = 14
+    
+    __slots__ = ('symbol', 'name', 'wilder', 'fundamental_score', 'frozen_score', 'completed',
+                 'completed_max', 'bar_date', 'price', 'recent_bars', 'ma_sums', 'rsi_sums',
+                 'wilder_avgs', 'hover_max', 'hover_count')
+    
+    def __init__(self, stock_data, analyzer):
+        import numpy as np
+        
+        hist_data = stock_data['historical_data']
+        close = hist_data['Close']
+        closes = close.to_numpy(dtype=np.float64)
+        
+        self.symbol = stock_data['symbol']
+        self.name = stock_data.get('name', self.symbol)
+        self.wilder = analyzer.use_kernels
+        self.fundamental_score = analyzer.analyze_fundamentals(stock_data['fundamental_data'])
+        self.frozen_score = (
+            analyzer.analyze_macd(close)
+            + analyzer.analyze_volume_trend(hist_data)
+            + analyzer.analyze_support_resistance(close)
+        )
+        
+        self.completed = deque(closes[:-1].tolist(), maxlen=max(self.MA_WINDOWS))
+        self.completed_max = float(np.nanmax(closes[:-1])) if len(closes) > 1 else float('-inf')
+        self.bar_date = hist_data.index[-1].strftime('%Y-%m-%d')
+        self.price = float(closes[-1])
+        self.recent_bars = len(stock_data['recent_data'])
+        
+        self.wilder_avgs = None
+        if self.wilder:
+            import indicators
+            delta = np.diff(closes[:-1])
+            avg_gain = indicators.wilder_smooth(np.where(delta > 0, delta, 0.0), self.RSI_PERIOD)
+            avg_loss = indicators.wilder_smooth(np.where(delta < 0, -delta, 0.0), self.RSI_PERIOD)
+            if len(delta) >= self.RSI_PERIOD:
+                self.wilder_avgs = (float(avg_gain[-1]), float(avg_loss[-1]))
+        
+        self._rebuild()
+    
+    def update(self, price, as_of=None):
+        """Apply a live price; a quote dated after the provisional bar starts a new bar"""
+        if as_of and as_of > self.bar_date:
+            self._roll(as_of)
+        self.price = float(price)
+    
+    def _roll(self, as_of):
+        previous = self.completed[-1] if self.completed else None
+        self.completed.append(self.price)
+        self.completed_max = max(self.completed_max, self.price)
+        self.bar_date = as_of
+        
+        if self.wilder_avgs is not None and previous is not None:
+            delta = self.price - previous
+            avg_gain, avg_loss = self.wilder_avgs
+            period = self.RSI_PERIOD
+            self.wilder_avgs = (avg_gain + (max(delta, 0.0) - avg_gain) / period,
+                                avg_loss + (max(-delta, 0.0) - avg_loss) / period)
+        
+        self._rebuild()
+    
+    def _rebuild(self):
+        """Recompute sums over completed bars (once per trading day)"""
+        completed = list(self.completed)
+        self.ma_sums = {
+            window: sum(completed[-(window - 1):]) if len(completed) >= window - 1 else None
+            for window in self.MA_WINDOWS
+        }
+        
+        period = self.RSI_PERIOD
+        tail = completed[-period:]
+        diffs = [b - a for a, b in zip(tail, tail[1:])]
+        self.rsi_sums = (
+            (sum(d for d in diffs if d > 0), sum(-d for d in diffs if d < 0))
+            if len(tail) == period else None
+        )
+        self.hover_max = None
+    
+    def _hover_base(self, max_price):
+        """Count completed bars of the recent window in the hover band"""
+        if self.hover_max != max_price:
+            window = list(self.completed)[-(self.recent_bars - 1):] if self.recent_bars > 1 else []
+            self.hover_count = sum(1 for price in window if self._in_band(max_price, price))
+            self.hover_max = max_price
+        return self.hover_count
+    
+    @staticmethod
+    def _in_band(max_price, price):
+        return 25 <= (max_price - price) / max_price * 100 <= 45
+    
+    def rsi(self):
+        """Last RSI value with the live price as the latest close"""
+        if not self.completed:
+            return None
+        delta = self.price - self.completed[-1]
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        
+        if self.wilder:
+            if self.wilder_avgs is None:
+                return None
+            period = self.RSI_PERIOD
+            avg_gain = self.wilder_avgs[0] + (gain - self.wilder_avgs[0]) / period
+            avg_loss = self.wilder_avgs[1] + (loss - self.wilder_avgs[1]) / period
+        else:
+            if self.rsi_sums is None:
+                return None
+            avg_gain = self.rsi_sums[0] + gain
+            avg_loss = self.rsi_sums[1] + loss
+        
+        if avg_loss == 0:
+            return 100.0 if avg_gain > 0 else float('nan')
+        return 100 - 100 / (1 + avg_gain / avg_loss)
+    
+    def moving_average_score(self):
+        """analyze_moving_averages with the live price as the latest close"""
+        ma = {
+            window: (total + self.price) / window if total is not None else None
+            for window, total in self.ma_sums.items()
+        }
+        
+        score = 0
+        if ma[20] is not None and self.price > ma[20]:
+            score += 0.5
+        if ma[20] is not None and ma[50] is not None and ma[20] > ma[50]:
+            score += 1
+        if ma[200] is not None and abs(self.price - ma[200]) / ma[200] <= 0.05:
+            score += 0.5
+        return min(score, 2)
+    
+    def score(self):
+        """Scores at the live price, or None when the symbol fails the scan gates"""
+        max_price = max(self.completed_max, self.price)
+        price_decline = (max_price - self.price) / max_price * 100
+        if not (30 <= price_decline <= 40):
+            return None
+        
+        if self.recent_bars < 30:
+            return None
+        in_range = self._hover_base(max_price) + self._in_band(max_price, self.price)
+        if in_range / self.recent_bars < 0.7:
+            return None
+        
+        technical_score = self.frozen_score + self.moving_average_score()
+        rsi = self.rsi()
+        if rsi and 30 <= rsi <= 50:
+            technical_score += 2.5
+        elif rsi and 50 <= rsi <= 70:
+            technical_score += 1.5
+        technical_score = min(technical_score, 10)
+        
+        overall_score = (self.fundamental_score * 0.6) + (technical_score * 0.4)
+        return {
+            'symbol': self.symbol,
+            'name': self.name,
+            'current_price': self.price,
+            'price_decline': price_decline,
+            'rsi': None if rsi is None or rsi != rsi else round(rsi, 2),
+            'fundamental_score': round(self.fundamental_score, 2),
+            'technical_score': round(technical_score, 2),
+            'overall_score': round(overall_score, 2),
+            'meets_criteria': (self.fundamental_score >= 6.0 and technical_score >= 5.5
+                               and overall_score >= 6.0),
+            'as_of': self.bar_date
+        }
+
+class LiveRanker:
+    """Poll live quotes in batches and keep a top-K leaderboard current"""
+    
+    def __init__(self, collector, analyzer, k=20, interval=60, batch_size=100):
+        self.collector = collector
+        self.analyzer = analyzer
+        self.interval = interval
+        self.batch_size = batch_size
+        
+        self.states = {}
+        self.results = {}
+        self.leaderboard = Leaderboard(k)
+        self.lock = threading.Lock()
+        
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.ticks = 0
+        self.last_tick = None
+    
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+    
+    def seed(self, stock_data):
+        """(Re)build a symbol's live state from freshly collected scan data"""
+        try:
+            state = LiveSymbolState(stock_data, self.analyzer)
+            with self.lock:
+                self.states[state.symbol] = state
+                self._rescore(state)
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error seeding live state for {stock_data.get('symbol')}: {str(e)}")
+            return False
+    
+    def tick(self):
+        """Fetch quotes for all tracked symbols; returns the number of symbols re-ranked"""
+        with self.lock:
+            symbols = list(self.states)
+        
+        changed = 0
+        for start in range(0, len(symbols), self.batch_size):
+            quotes = self.collector.get_quotes(symbols[start:start + self.batch_size], max_age=0)
+            with self.lock:
+                for symbol, quote in quotes.items():
+                    state = self.states.get(symbol)
+                    if state is None or (quote['price'] == state.price and quote['as_of'] <= state.bar_date):
+                        continue
+                    state.update(quote['price'], quote['as_of'])
+                    self._rescore(state)
+                    changed += 1
+        
+        self.ticks += 1
+        self.last_tick = datetime.now().isoformat()
+        return changed
+    
+    def _rescore(self, state):
+        result = state.score()
+        if result is None:
+            self.results.pop(state.symbol, None)
+        else:
+            self.results[state.symbol] = result
+        self.leaderboard.update(state.symbol, None if result is None else result['overall_score'])
+    
+    def start(self, symbols=None, k=None, interval=None, market_hours_only=True):
+        """Start the polling thread, seeding any untracked symbols first"""
+        if self.running:
+            return False
+        
+        if interval:
+            self.interval = interval
+        if k and k != self.leaderboard.k:
+            with self.lock:
+                self.leaderboard = Leaderboard(k)
+                for symbol, result in self.results.items():
+                    self.leaderboard.update(symbol, result['overall_score'])
+        
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, args=(symbols, market_hours_only),
+                                       name='live-ranker', daemon=True)
+        self.thread.start()
+        return True
+    
+    def stop(self):
+        """Signal the polling thread to stop after the current tick; returns whether it has exited.
+        
+        A thread still busy after the timeout is kept, so ``running`` stays
+        true and start() refuses to launch a second one until it exits.
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.interval)
+            if self.thread.is_alive():
+                logger.warning("Live ranker thread still finishing its tick")
+                return False
+        self.thread = None
+        return True
+    
+    def _run(self, symbols, market_hours_only):
+        for symbol in symbols or self.collector.get_nse_stocks():
+            symbol = symbol if symbol.endswith('.NS') else symbol + '.NS'
+            if self.stop_event.is_set():
+                return
+            if symbol not in self.states:
+                stock_data = self.collector.get_stock_data(symbol)
+                if stock_data:
+                    self.seed(stock_data)
+        
+        logger.info(f"Live ranking started for {len(self.states)} symbols")
+        while not self.stop_event.is_set():
+            if not market_hours_only or is_market_open():
+                try:
+                    changed = self.tick()
+                    logger.info(f"Live tick: {changed} symbols re-ranked")
+                except Exception as e:
+                    logger.error(f"Error in live tick: {str(e)}")
+            self.stop_event.wait(self.interval)
+    
+    def snapshot(self, limit=None):
+        """Current leaderboard with live scores"""
+        with self.lock:
+            ranked = self.leaderboard.ranked()[:limit]
+            return {
+                'running': self.running,
+                'tracked': len(self.states),
+                'ticks': self.ticks,
+                'last_tick': self.last_tick,
+                'k': self.leaderboard.k,
+                'leaderboard': [self.results[symbol] for symbol, _ in ranked]
+            }
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Load generator for the Indian Stock Recovery Analyzer API
+
+Starts the app in-process on a threaded werkzeug server with an offline stub
+in place of Yahoo Finance, drives a weighted mix of endpoints at a fixed
+concurrency and reports throughput and latency percentiles per endpoint.
+Results are written as JSON so runs can be compared across changes:
+
+    python loadtest.py --mix scan=1,stock=20,update=1 --concurrency 16 --duration 60
+    python loadtest.py --label after --compare loadtest-results/before.json
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import logging
+
+# numpy, pandas, requests and the app itself are imported on first use so
+# that --help and --compare work without them
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = {
+    'scan': '/api/scan',
+    'stock': '/api/stock/{symbol}',
+    'update': '/api/update'
+}
+DEFAULT_MIX = 'scan=1,stock=20,update=1'
+
+def parse_mix(spec):
+    """Parse 'scan=1,stock=20' into {endpoint: weight}"""
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight for {name}: '{weight}'")
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("mix needs at least one positive weight")
+    return mix
+
+class StubUpstream:
+    """Offline stand-in for Yahoo Finance.
+    
+    Every upstream call sleeps for ``latency`` seconds and returns synthetic,
+    per-symbol deterministic data, so runs are repeatable and the app's own
+    caching and coalescing decide how many upstream calls are made.
+    """
+    
+    def __init__(self, latency=0.05, bars=500):
+        self.latency = latency
+        self.bars = bars
+        self.calls = {}
+        self.lock = threading.Lock()
+    
+    def install(self, collector):
+        """Replace the collector's network calls with the stub"""
+        self.collector = collector
+        collector.fetch_stock_data = self.fetch_stock_data
+        collector.fetch_quotes = self.fetch_quotes
+        collector.fetch_financial_statements = self.fetch_financial_statements
+        collector.get_corporate_actions = self.get_corporate_actions
+    
+    def _call(self, kind):
+        with self.lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+    
+    def history(self, symbol):
+        """Two years of daily bars: a rally to a peak followed by a decline"""
+        import numpy as np
+        import pandas as pd
+        rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+        peak = int(self.bars * rng.uniform(0.3, 0.8))
+        drift = np.where(np.arange(self.bars) < peak, rng.uniform(0.0005, 0.002),
+                         -rng.uniform(0.0005, 0.003))
+        close = rng.uniform(50, 3000) * np.exp(np.cumsum(drift + rng.normal(0, 0.015, self.bars)))
+        spread = close * rng.uniform(0.002, 0.02, self.bars)
+        return pd.DataFrame({
+            'Open': close + rng.normal(0, 0.5, self.bars) * spread,
+            'High': close + spread,
+            'Low': close - spread,
+            'Close': close,
+            'Volume': rng.integers(100_000, 5_000_000, self.bars).astype(float)
+        }, index=pd.bdate_range(end=datetime.now().date(), periods=self.bars))
+    
+    def info(self, symbol):
+        """Ticker.info subset that fundamental scoring reads"""
+        rng = random.Random(zlib.crc32(symbol.encode()))
+        return {
+            'longName': symbol.replace('.NS', '').title(),
+            'trailingPE': rng.uniform(4, 60),
+            'priceToBook': rng.uniform(0.5, 8),
+            'debtToEquity': rng.uniform(0, 2),
+            'returnOnEquity': rng.uniform(-0.05, 0.35),
+            'currentRatio': rng.uniform(0.6, 3),
+            'profitMargins': rng.uniform(-0.05, 0.3),
+            'revenueGrowth': rng.uniform(-0.1, 0.4),
+            'dividendYield': rng.uniform(0, 0.05),
+            'marketCap': rng.uniform(1e9, 2e12),
+            'sector': rng.choice(['Technology', 'Financial Services', 'Energy', 'Healthcare', 'Consumer Defensive'])
+        }
+    
+    def fetch_stock_data(self, symbol):
+        from stock_record import StockRecord
+        self._call('stock_data')
+        info = self.info(symbol)
+        return StockRecord.from_history(symbol, info['longName'], self.history(symbol),
+                                        self.collector.get_fundamental_metrics(info), info,
+                                        recent_days=90, dtype=self.collector.price_dtype)
+    
+    def fetch_quotes(self, symbols):
+        self._call('quotes')
+        quotes = {}
+        for symbol in symbols:
+            closes = self.history(symbol)['Close']
+            price, previous = float(closes.iloc[-1]), float(closes.iloc[-2])
+            quotes[symbol] = {
+                'price': price,
+                'previous_close': previous,
+                'change': price - previous,
+                'change_percent': (price - previous) / previous * 100,
+                'as_of': closes.index[-1].strftime('%Y-%m-%d')
+            }
+        return quotes
+    
+    def fetch_financial_statements(self, symbol):
+        import pandas as pd
+        self._call('financial_statements')
+        return {name: pd.DataFrame() for name in self.collector.STATEMENT_TYPES}
+    
+    def get_corporate_actions(self, symbol):
+        self._call('corporate_actions')
+        return []
+
+def start_server(app, host='127.0.0.1', port=0):
+    """Serve the app on a threaded werkzeug server in a background thread"""
+    from werkzeug.serving import make_server
+    server = make_server(host, port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_port}'
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+class LoadRunner:
+    """Closed-loop load: each worker sends its next request when the last returns"""
+    
+    def __init__(self, base_url, mix, symbols, concurrency=8, duration=30, warmup=5,
+                 timeout=300, seed=0):
+        self.base_url = base_url.rstrip('/')
+        self.mix = mix
+        self.symbols = symbols
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.timeout = timeout
+        self.seed = seed
+        
+        # (endpoint, started, seconds, ok, status, during_scan)
+        self.samples = []
+        self.scans_in_flight = 0
+        self.lock = threading.Lock()
+    
+    def run(self):
+        """Drive load for warmup + duration seconds; returns the measured window in seconds"""
+        self.started = time.perf_counter()
+        self.measure_from = self.started + self.warmup
+        self.deadline = self.measure_from + self.duration
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for future in [executor.submit(self._worker, index) for index in range(self.concurrency)]:
+                future.result()
+        
+        # Requests started before the deadline are allowed to finish
+        last_finish = max((start + seconds for _, start, seconds, *_ in self.samples), default=self.deadline)
+        return max(last_finish, self.deadline) - self.measure_from
+    
+    def _worker(self, index):
+        import requests
+        session = requests.Session()
+        rng = random.Random(self.seed * 1000 + index)
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        
+        while time.perf_counter() < self.deadline:
+            endpoint = rng.choices(names, weights)[0]
+            path = ENDPOINTS[endpoint].format(symbol=rng.choice(self.symbols))
+            
+            with self.lock:
+                during_scan = self.scans_in_flight > 0
+                if endpoint == 'scan':
+                    self.scans_in_flight += 1
+            
+            start = time.perf_counter()
+            try:
+                response = session.get(self.base_url + path, timeout=self.timeout)
+                ok, status = response.status_code < 400, response.status_code
+            except requests.RequestException as e:
+                logger.warning(f"{endpoint} request failed: {str(e)}")
+                ok, status = False, None
+            finally:
+                seconds = time.perf_counter() - start
+                if endpoint == 'scan':
+                    with self.lock:
+                        self.scans_in_flight -= 1
+            
+            if start >= self.measure_from:
+                with self.lock:
+                    self.samples.append((endpoint, start, seconds, ok, status, during_scan))
+    
+    def summarize(self, window):
+        """Throughput and latency percentiles per endpoint.
+        
+        Requests other than scans are also split by whether a scan was in
+        flight when they were sent, e.g. 'stock (during scan)' and
+        'stock (no scan)'.
+        """
+        groups = {'all': self.samples}
+        for endpoint in self.mix:
+            groups[endpoint] = [sample for sample in self.samples if sample[0] == endpoint]
+            during = [sample for sample in groups[endpoint] if sample[5]]
+            if endpoint != 'scan' and 0 < len(during) < len(groups[endpoint]):
+                groups[f'{endpoint} (during scan)'] = during
+                groups[f'{endpoint} (no scan)'] = [sample for sample in groups[endpoint] if not sample[5]]
+        
+        summary = {}
+        for name, samples in groups.items():
+            latencies = sorted(sample[2] * 1000 for sample in samples)
+            statuses = {}
+            for sample in samples:
+                statuses[str(sample[4])] = statuses.get(str(sample[4]), 0) + 1
+            summary[name] = {
+                'requests': len(samples),
+                'errors': sum(1 for sample in samples if not sample[3]),
+                'throughput_rps': round(len(samples) / window, 3) if window > 0 else None,
+                'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'max_ms': latencies[-1] if latencies else None,
+                'status_codes': statuses
+            }
+            for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms'):
+                if summary[name][key] is not None:
+                    summary[name][key] = round(summary[name][key], 2)
+        return summary
+
+def print_summary(summary, window):
+    print(f"\n📊 Measured window: {window:.1f}s")
+    print(f"{'endpoint':<24}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    fmt = lambda value: f"{value:.1f}" if value is not None else '-'
+    for name, stats in summary.items():
+        print(f"{name:<24}{stats['requests']:>9}{stats['errors']:>8}{fmt(stats['throughput_rps']):>9}"
+              f"{fmt(stats['p50_ms']):>10}{fmt(stats['p95_ms']):>10}{fmt(stats['p99_ms']):>10}{fmt(stats['max_ms']):>10}")
+
+def print_comparison(summary, baseline_path):
+    """Print throughput and p95/p99 changes against a saved run"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n🔁 Compared with {baseline_path} ({baseline.get('label') or baseline.get('started_at')})")
+    print(f"{'endpoint':<24}{'req/s':>16}{'p95 ms':>20}{'p99 ms':>20}")
+    
+    def change(new, old):
+        if new is None or old is None:
+            return '-'
+        delta = f"{(new - old) / old * 100:+.0f}%" if old else 'n/a'
+        return f"{new:.1f} ({delta})"
+    
+    for name, stats in summary.items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        print(f"{name:<24}{change(stats['throughput_rps'], old['throughput_rps']):>16}"
+              f"{change(stats['p95_ms'], old['p95_ms']):>20}{change(stats['p99_ms'], old['p99_ms']):>20}")
+
+def get_git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=Path(__file__).parent)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Load-test the Indian Stock Recovery Analyzer API')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'endpoint weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds before measuring')
+    parser.add_argument('--timeout', type=float, default=300, help='per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the request sequence')
+    parser.add_argument('--symbols', help='comma-separated symbols for /api/stock (default: the scan universe)')
+    parser.add_argument('--url', help='load an already running server instead of starting one (no stub)')
+    parser.add_argument('--upstream-latency', type=float, default=0.05,
+                        help='seconds each stubbed Yahoo Finance call takes')
+    parser.add_argument('--stock-data-ttl', type=float,
+                        help='override the collector cache TTL in seconds (0 refetches every request)')
+    parser.add_argument('--workdir', help='directory for the database and snapshot (default: a new temp dir)')
+    parser.add_argument('--label', help='name for this run in the results file')
+    parser.add_argument('--output', help='results file (default: loadtest-results/<label or timestamp>.json)')
+    parser.add_argument('--compare', help='results file of an earlier run to compare against')
+    parser.add_argument('--log-level', default='WARNING', help='log level while the test runs')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    root = Path(__file__).parent.resolve()
+    # Resolved before the working directory changes
+    output = Path(args.output).resolve() if args.output else (
+        root / 'loadtest-results' / f"{args.label or datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    compare = Path(args.compare).resolve() if args.compare else None
+    stub = None
+    app_module = None
+    
+    if args.url:
+        base_url = args.url
+        from data_collector import StockDataCollector
+        universe = StockDataCollector().get_nse_stocks()
+    else:
+        # The app opens its database and snapshot relative to the working directory
+        workdir = Path(args.workdir or tempfile.mkdtemp(prefix='loadtest-')).resolve()
+        workdir.mkdir(parents=True, exist_ok=True)
+        sys.path.insert(0, str(root))
+        os.chdir(workdir)
+        print(f"🗂  Working directory: {workdir}")
+        
+        import app as app_module
+        stub = StubUpstream(latency=args.upstream_latency)
+        stub.install(app_module.collector)
+        if args.stock_data_ttl is not None:
+            app_module.collector.STOCK_DATA_TTL = args.stock_data_ttl
+        
+        server, base_url = start_server(app_module.app)
+        universe = app_module.collector.get_nse_stocks()
+    
+    logging.getLogger().setLevel(args.log_level.upper())
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    
+    symbols = [symbol.strip() for symbol in args.symbols.split(',')] if args.symbols else universe
+    mix_text = ', '.join(f'{name}={weight:g}' for name, weight in args.mix.items())
+    print(f"🚀 {base_url}: {args.concurrency} clients, mix {mix_text}, "
+          f"{args.warmup:g}s warmup + {args.duration:g}s")
+    
+    runner = LoadRunner(base_url, args.mix, symbols, concurrency=args.concurrency,
+                        duration=args.duration, warmup=args.warmup, timeout=args.timeout, seed=args.seed)
+    started_at = datetime.now().isoformat()
+    window = runner.run()
+    summary = runner.summarize(window)
+    print_summary(summary, window)
+    
+    results = {
+        'label': args.label,
+        'started_at': started_at,
+        'git_revision': get_git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'url': args.url,
+            'mix': args.mix,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'symbols': len(symbols),
+            'upstream_latency': None if args.url else args.upstream_latency,
+            'stock_data_ttl': args.stock_data_ttl
+        },
+        'window_seconds': round(window, 3),
+        'results': summary
+    }
+    if stub is not None:
+        results['upstream_calls'] = dict(stub.calls)
+        results['single_flight'] = app_module.flights.get_stats()
+        print(f"\n🌐 Stubbed upstream calls: {results['upstream_calls']}")
+        server.shutdown()
+    
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved to {output}")
+    
+    if compare:
+        print_comparison(summary, compare)
+
+if __name__ == "__main__":
+    main()
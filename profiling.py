@@ -0,0 +1,113 @@
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Only one cProfile profiler can be active per process
+_profile_lock = threading.Lock()
+
+def profiling_requested(flag=None):
+    """True if PROFILE_REQUESTS=1 or the request asked for it (?profile=1)"""
+    if flag is not None and str(flag).lower() in ('1', 'true'):
+        return True
+    return os.environ.get('PROFILE_REQUESTS') == '1'
+
+def profile_call(name, fn, *args, **kwargs):
+    """Run ``fn`` under cProfile and dump stats to PROFILE_DIR.
+    
+    Returns ``(result, path)``; path is None if another profile was already
+    running, in which case ``fn`` runs unprofiled.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        logger.warning(f"Profiler busy, running {name} without profiling")
+        return fn(*args, **kwargs), None
+    
+    try:
+        import cProfile
+        directory = os.environ.get('PROFILE_DIR', 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+        path = os.path.join(directory, f"{safe_name}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.prof")
+        
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            logger.info(f"Wrote profile {path} (inspect with: python -m pstats {path})")
+        return result, path
+    finally:
+        _profile_lock.release()
+
+class StageTimer:
+    """Wall-clock timings of the named stages of one symbol's processing.
+    
+    Call ``lap(name)`` after each stage; the time since the previous lap (or
+    the start) is added to that stage.
+    """
+    
+    __slots__ = ('symbol', 'context', 'started', 'last', 'stages', 'error')
+    
+    def __init__(self, symbol, context):
+        self.symbol = symbol
+        self.context = context
+        self.started = self.last = time.perf_counter()
+        self.stages = {}
+        self.error = None
+    
+    def lap(self, name):
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + now - self.last
+        self.last = now
+    
+    def resume(self):
+        """Drop the time since the last lap, e.g. while other symbols were processed"""
+        now = time.perf_counter()
+        self.started += now - self.last
+        self.last = now
+    
+    def total(self):
+        return time.perf_counter() - self.started
+
+class SlowLog:
+    """Bounded ring buffer of symbols whose processing exceeded a threshold"""
+    
+    def __init__(self, threshold=2.0, capacity=200):
+        self.threshold = threshold
+        self.entries = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.recorded = 0
+    
+    def record(self, timer):
+        """Keep the timer's breakdown if it ran longer than the threshold"""
+        total = timer.total()
+        if total < self.threshold:
+            return False
+        
+        entry = {
+            'symbol': timer.symbol,
+            'context': timer.context,
+            'total': round(total, 4),
+            'stages': {name: round(seconds, 4) for name, seconds in timer.stages.items()},
+            'slowest_stage': max(timer.stages, key=timer.stages.get) if timer.stages else None,
+            'error': timer.error,
+            'at': datetime.now().isoformat()
+        }
+        with self.lock:
+            self.entries.append(entry)
+            self.recorded += 1
+        logger.warning(f"Slow {timer.context} for {timer.symbol}: {total:.2f}s ({entry['stages']})")
+        return True
+    
+    def get_entries(self, limit=None, context=None):
+        """Most recent entries first"""
+        with self.lock:
+            entries = [entry for entry in reversed(self.entries)
+                       if context is None or entry['context'] == context]
+        return entries[:limit] if limit else entries
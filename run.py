@@ -5,6 +5,9 @@ Run script for Indian Stock Recovery Analyzer
 
 import os
 import sys
+import argparse
+import importlib.util
+import subprocess
 import logging
 from pathlib import Path
 
@@ -23,17 +26,21 @@ def setup_logging():
     )
 
 def check_dependencies():
-    """Check if all required dependencies are installed"""
-    required_packages = [
-        'flask', 'yfinance', 'pandas', 'numpy', 
-        'requests', 'beautifulsoup4', 'sqlalchemy'
-    ]
+    """Check if all required dependencies are installed (without importing them)"""
+    # Distribution name -> importable module name
+    required_packages = {
+        'flask': 'flask',
+        'yfinance': 'yfinance',
+        'pandas': 'pandas',
+        'numpy': 'numpy',
+        'requests': 'requests',
+        'beautifulsoup4': 'bs4',
+        'sqlalchemy': 'sqlalchemy'
+    }
     
     missing_packages = []
-    for package in required_packages:
-        try:
-            __import__(package)
-        except ImportError:
+    for package, module in required_packages.items():
+        if importlib.util.find_spec(module) is None:
             missing_packages.append(package)
     
     if missing_packages:
@@ -45,6 +52,38 @@ def check_dependencies():
     
     return True
 
+def print_import_report(module='app', top=15):
+    """Print the slowest imports of a module, as measured by -X importtime"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=Path(__file__).parent
+    )
+    
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            timings.append((int(cumulative_us), int(self_us), name.rstrip()))
+        except ValueError:
+            continue
+    
+    if not timings:
+        print(f"❌ Could not measure import time for {module}")
+        print(result.stderr.strip())
+        return False
+    
+    # Top-level entries (no leading indent) sum to the total
+    total_us = sum(c for c, _, name in timings if not name.startswith('  '))
+    print(f"⏱  Import time for '{module}': {total_us / 1000:.1f} ms")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative_us, self_us, name in sorted(timings, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {name}")
+    
+    return True
+
 def check_files():
     """Check if all required files exist"""
     required_files = [
@@ -82,8 +121,92 @@ def print_startup_banner():
     print("   Always consult financial professionals before investing")
     print()
 
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Run the Indian Stock Recovery Analyzer')
+    parser.add_argument('--import-report', action='store_true',
+                        help='print an import-time report for the app and exit')
+    parser.add_argument('--production', action='store_true',
+                        help='serve with gunicorn (one worker process, many threads) instead of the dev server')
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 16)),
+                        help='request threads in production mode')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('WEB_TIMEOUT', 300)),
+                        help='worker timeout in seconds (scans are slow)')
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30)),
+                        help='seconds to let in-flight requests finish on shutdown')
+    return parser.parse_args()
+
+def run_production(args, logger):
+    """Serve the app with gunicorn: preloaded, warmed up, then forked into one worker.
+    
+    The app keeps its state in process memory: the stock record cache and
+    its snapshot refresher/dumper, the single-flight layer, the live
+    leaderboard and the dashboard's feature table versions. With several
+    workers each would hold its own copy, refetch the same data and answer
+    polls inconsistently, so concurrency comes from threads instead.
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("❌ Production mode requires gunicorn")
+        print("   Please run: pip install gunicorn")
+        sys.exit(1)
+    
+    import app as app_module
+    
+    # Warm up in the master so every forked worker inherits loaded
+    # libraries and caches instead of paying for them on first request
+    app_module.warm_caches()
+    
+    def post_fork(server, worker):
+        # SQLite connections must not be shared across processes
+        app_module.db.init_db()
+        # Threads do not survive fork, so the worker starts them
+        app_module.start_background_tasks()
+    
+    def worker_exit(server, worker):
+        app_module.snapshots.stop()
+        app_module.db.close()
+    
+    class ProductionServer(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+        
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            return self.application
+    
+    options = {
+        'bind': f'{args.host}:{args.port}',
+        'workers': 1,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'preload_app': True,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+        'accesslog': '-'
+    }
+    
+    logger.info(f"Starting production server with 1 worker x {args.threads} threads")
+    # gunicorn handles SIGTERM/SIGINT by letting workers finish in-flight
+    # requests for up to graceful_timeout seconds
+    ProductionServer(app_module.app, options).run()
+
 def main():
     """Main function to start the application"""
+    args = parse_args()
+    if args.import_report:
+        sys.exit(0 if print_import_report() else 1)
+    
     print_startup_banner()
     
     # Setup logging
@@ -104,22 +227,28 @@ def main():
         print("✅ All required files found")
         
         # Set environment variables
-        os.environ.setdefault('FLASK_ENV', 'development')
+        os.environ.setdefault('FLASK_ENV', 'production' if args.production else 'development')
         
         # Import and run the app
         print("🌐 Starting Flask application...")
-        print("   URL: http://localhost:5000")
+        print(f"   URL: http://localhost:{args.port}")
         print("   Press Ctrl+C to stop")
         print()
         
+        if args.production:
+            print(f"🏭 Production mode: 1 worker x {args.threads} threads")
+            run_production(args, logger)
+            return
+        
         # Import here to avoid circular imports
-        from app import app
+        from app import app, start_background_tasks
+        start_background_tasks()
         
         # Run the application
         app.run(
             debug=True,
-            host='0.0.0.0',
-            port=5000,
+            host=args.host,
+            port=args.port,
             use_reloader=False  # Disable reloader to avoid issues
         )
         
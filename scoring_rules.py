@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Table-driven fundamental scoring for the Stock Recovery Analyzer
+
+Each metric has an ordered list of point bands, evaluated like an if/elif
+chain: the first band whose inclusive ``min``/``max`` bounds contain the value
+awards its points. P/E and P/B also have ``relative`` bands over the value as
+a multiple of the sector median; when a sector median is available these
+replace the absolute bands. ``requires`` reproduces the guards of the
+original code: ``truthy`` (``if value and ...``, so 0 and missing values score
+nothing) or ``present`` (``if value is not None``).
+
+The rules can be overridden from a JSON config (see load_scoring_config).
+``FundamentalRules.score_many`` scores a whole universe at once with
+``np.select`` over a fundamentals matrix. Run ``python scoring_rules.py`` to
+check parity with the if/elif form of the default rules and time both.
+"""
+
+import json
+import math
+import copy
+import logging
+
+# numpy is imported on first use so that importing this module stays cheap
+
+logger = logging.getLogger(__name__)
+
+MAX_FUNDAMENTAL_SCORE = 10
+
+# Most specific band first. The original if/elif chains checked P/E 5-25
+# before P/E <= 15 (which also paid full points for negative P/E and P/E
+# below 5) and P/B <= 3 before P/B <= 1.5, so those bands could never fire;
+# StockAnalyzer.analyze_fundamentals_reference is the corrected chain
+DEFAULT_FUNDAMENTAL_RULES = {
+    'pe_ratio': {
+        'requires': 'truthy',
+        'relative': [{'max': 0.8, 'points': 2}, {'max': 1.1, 'points': 1.5}],
+        'bands': [{'min': 5, 'max': 15, 'points': 2}, {'min': 5, 'max': 25, 'points': 1.5}]
+    },
+    'pb_ratio': {
+        'requires': 'truthy',
+        'relative': [{'max': 0.75, 'points': 1.5}, {'max': 1.0, 'points': 1}],
+        'bands': [{'max': 1.5, 'points': 1.5}, {'max': 3, 'points': 1}]
+    },
+    'roe': {
+        'requires': 'truthy',
+        'bands': [{'min': 0.15, 'points': 2}, {'min': 0.10, 'points': 1.5}]
+    },
+    'debt_to_equity': {
+        'requires': 'present',
+        'bands': [{'max': 0.5, 'points': 1.5}, {'max': 1.0, 'points': 1}]
+    },
+    'current_ratio': {
+        'requires': 'truthy',
+        'bands': [{'min': 1.5, 'points': 1}, {'min': 1.2, 'points': 0.5}]
+    },
+    'profit_margin': {
+        'requires': 'truthy',
+        'bands': [{'min': 0.10, 'points': 1.5}, {'min': 0.05, 'points': 1}]
+    },
+    'revenue_growth': {
+        'requires': 'truthy',
+        'bands': [{'min': 0.10, 'points': 1.5}, {'min': 0.05, 'points': 1}]
+    },
+    'dividend_yield': {
+        'requires': 'truthy',
+        'bands': [{'min': 0.02, 'points': 0.5}]
+    }
+}
+
+def load_scoring_config(path):
+    """Read scoring overrides from JSON.
+    
+    Recognised keys: ``fundamental_weights`` and ``fundamental_rules``, the
+    latter with ``max_score`` and per-metric ``metrics`` entries that replace
+    the defaults for those metrics.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    unknown = set(config) - {'fundamental_weights', 'fundamental_rules'}
+    if unknown:
+        raise ValueError(f"Unknown scoring config keys: {', '.join(sorted(unknown))}")
+    return config
+
+class FundamentalRules:
+    def __init__(self, rules=None, max_score=MAX_FUNDAMENTAL_SCORE):
+        self.rules = copy.deepcopy(DEFAULT_FUNDAMENTAL_RULES if rules is None else rules)
+        self.max_score = max_score
+        self.validate()
+        self.compiled = self._compile()
+        self.relative_metrics = [metric for metric, rule in self.rules.items() if 'relative' in rule]
+    
+    @classmethod
+    def from_config(cls, config):
+        """Defaults with a config's ``fundamental_rules`` overrides applied"""
+        overrides = (config or {}).get('fundamental_rules') or {}
+        rules = copy.deepcopy(DEFAULT_FUNDAMENTAL_RULES)
+        rules.update(overrides.get('metrics', {}))
+        instance = cls(rules, overrides.get('max_score', MAX_FUNDAMENTAL_SCORE))
+        for metric, section, index, by in instance.shadowed_bands():
+            logger.warning(f"Scoring rule {metric} {section}[{index}] can never fire: "
+                           f"{section}[{by}] already matches all of its values")
+        return instance
+    
+    def validate(self):
+        for metric, rule in self.rules.items():
+            if rule.get('requires', 'truthy') not in ('truthy', 'present'):
+                raise ValueError(f"{metric}: requires must be 'truthy' or 'present'")
+            for section in ('relative', 'bands'):
+                for band in rule.get(section, []):
+                    if not isinstance(band.get('points'), (int, float)):
+                        raise ValueError(f"{metric}: every band needs numeric points")
+                    if set(band) - {'min', 'max', 'points'}:
+                        raise ValueError(f"{metric}: bands only take min, max and points")
+    
+    def to_dict(self):
+        """Rules and cap, e.g. for hashing into the analysis parameter version"""
+        return {'max_score': self.max_score, 'metrics': self.rules}
+    
+    def shadowed_bands(self):
+        """(metric, section, index, by) for each band an earlier band fully covers"""
+        shadowed = []
+        for metric, rule in self.rules.items():
+            for section in ('relative', 'bands'):
+                bands = rule.get(section, [])
+                for index, band in enumerate(bands):
+                    low, high = band.get('min', -math.inf), band.get('max', math.inf)
+                    for by, earlier in enumerate(bands[:index]):
+                        if earlier.get('min', -math.inf) <= low and earlier.get('max', math.inf) >= high:
+                            shadowed.append((metric, section, index, by))
+                            break
+        return shadowed
+    
+    def _compile(self):
+        """Rules as flat tuples for score(): (metric, truthy, bands, relative bands or None).
+        
+        Each band is (low, high, points) with open ends as -inf/inf, so the
+        per-symbol loop is a chained comparison instead of dict lookups.
+        """
+        def flatten(bands):
+            return tuple((band.get('min', -math.inf), band.get('max', math.inf), band['points']) for band in bands)
+        
+        return tuple(
+            (metric, rule.get('requires', 'truthy') == 'truthy', flatten(rule.get('bands', [])),
+             flatten(rule['relative']) if 'relative' in rule else None)
+            for metric, rule in self.rules.items()
+        )
+    
+    def score(self, fundamental_data, relatives=None):
+        """Score one symbol; ``relatives`` maps metric -> value / sector median or None"""
+        score = 0
+        for metric, truthy, bands, relative_bands in self.compiled:
+            if relative_bands is not None and relatives:
+                relative = relatives.get(metric)
+                if relative is not None:
+                    for low, high, points in relative_bands:
+                        if low <= relative <= high:
+                            score += points
+                            break
+                    continue
+            
+            value = fundamental_data.get(metric)
+            if value is None or (truthy and not value):
+                continue
+            for low, high, points in bands:
+                if low <= value <= high:
+                    score += points
+                    break
+        return min(score, self.max_score)
+    
+    def _select(self, bands, values):
+        import numpy as np
+        if not bands:
+            return np.zeros(len(values))
+        conditions = []
+        for band in bands:
+            condition = np.ones(len(values), dtype=bool)
+            if 'min' in band:
+                condition &= values >= band['min']
+            if 'max' in band:
+                condition &= values <= band['max']
+            conditions.append(condition)
+        # np.select takes the first matching condition, like an if/elif chain
+        return np.select(conditions, [float(band['points']) for band in bands], default=0.0)
+    
+    def score_many(self, values, relatives=None):
+        """Score every row at once.
+        
+        ``values`` maps metric -> float array (NaN for missing), and
+        ``relatives`` maps metric -> array of value / sector median (NaN
+        where no median applies). Returns a float array of scores.
+        """
+        import numpy as np
+        relatives = relatives or {}
+        rows = len(next(iter(values.values()))) if values else 0
+        total = np.zeros(rows)
+        for metric, rule in self.rules.items():
+            metric_values = np.asarray(values.get(metric, np.full(rows, np.nan)), dtype=np.float64)
+            present = ~np.isnan(metric_values)
+            if rule.get('requires', 'truthy') == 'truthy':
+                present &= metric_values != 0
+            points = np.where(present, self._select(rule.get('bands', []), metric_values), 0.0)
+            
+            if 'relative' in rule and metric in relatives:
+                relative = np.asarray(relatives[metric], dtype=np.float64)
+                points = np.where(~np.isnan(relative), self._select(rule['relative'], relative), points)
+            total += points
+        return np.minimum(total, self.max_score)
+
+def _random_fundamentals(count, seed=5):
+    """Fundamentals with the edge cases the guards care about: None, 0, negatives, boundaries"""
+    import random
+    rng = random.Random(seed)
+    edges = {
+        'pe_ratio': [None, 0, -8.0, 4.99, 5, 15, 25, 25.01, 60.0],
+        'pb_ratio': [None, 0, -1.0, 0.5, 1.5, 3, 3.01, 9.0],
+        'roe': [None, 0, -0.2, 0.1, 0.15, 0.3],
+        'debt_to_equity': [None, 0, -0.5, 0.5, 1.0, 1.01, 3.0],
+        'current_ratio': [None, 0, 1.2, 1.5, 0.9],
+        'profit_margin': [None, 0, 0.05, 0.1, -0.1],
+        'revenue_growth': [None, 0, 0.05, 0.1, -0.3],
+        'dividend_yield': [None, 0, 0.02, 0.019]
+    }
+    sectors = ['Technology', 'Energy', 'Healthcare', None]
+    rows = []
+    for _ in range(count):
+        row = {metric: rng.choice(values) if rng.random() < 0.4 else rng.uniform(-1, 2) * max(v for v in values if v)
+               for metric, values in edges.items()}
+        row['sector'] = rng.choice(sectors)
+        rows.append(row)
+    return rows
+
+def benchmark(symbols=2000):
+    """Check table-driven scoring against the if/elif reference and time both"""
+    import time
+    from analyzer import StockAnalyzer
+    from sector_stats import SectorStatistics
+    
+    sector_stats = SectorStatistics(db=None)
+    sector_stats.stats = {
+        (sector, metric): {'median': median, 'p25': None, 'p75': None, 'count': 10}
+        for sector, medians in {'Technology': (28.0, 6.0), 'Energy': (9.0, 1.2)}.items()
+        for metric, median in zip(('pe_ratio', 'pb_ratio'), medians)
+    }
+    analyzer = StockAnalyzer(sector_stats=sector_stats)
+    rows = _random_fundamentals(symbols)
+    # Keep the one-off numpy import out of the timings
+    analyzer.score_fundamentals(rows[:1])
+    
+    def timed(run, repeats=5):
+        """Result and best wall time of several runs"""
+        best = math.inf
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = run()
+            best = min(best, time.perf_counter() - started)
+        return result, best
+    
+    expected, reference_seconds = timed(lambda: [analyzer.analyze_fundamentals_reference(row) for row in rows])
+    scalar, scalar_seconds = timed(lambda: [analyzer.analyze_fundamentals(row) for row in rows])
+    vectorized, vector_seconds = timed(lambda: analyzer.score_fundamentals(rows))
+    
+    mismatches = sum(1 for a, b, c in zip(expected, scalar, vectorized) if not (a == b and abs(a - c) < 1e-9))
+    print(f"🧮 {symbols} symbols, {mismatches} mismatches against the if/elif reference")
+    for label, seconds in (('if/elif reference', reference_seconds), ('rule table, per symbol', scalar_seconds),
+                           ('rule table, np.select', vector_seconds)):
+        print(f"   {label:<24}{seconds / symbols * 1e6:8.2f} µs/symbol")
+    for metric, section, index, by in analyzer.fundamental_rules.shadowed_bands():
+        print(f"⚠️  {metric} {section}[{index}] can never fire: {section}[{by}] covers it")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,502 @@
+import re
+import uuid
+import threading
+from functools import lru_cache
+import logging
+
+# numpy and pandas are imported on first use so that importing this module
+# stays cheap
+
+logger = logging.getLogger(__name__)
+
+class ScreenerError(ValueError):
+    """Raised for malformed screen expressions or unknown fields"""
+
+TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)
+      | (?P<string>'[^']*'|"[^"]*")
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op><=|>=|!=|==|<|>|=|\+|-|\*|/|\(|\)|,)
+    )''', re.VERBOSE)
+
+KEYWORDS = {'and', 'or', 'not', 'between', 'in', 'is', 'null', 'true', 'false'}
+COMPARISONS = {'<', '<=', '>', '>=', '=', '==', '!='}
+FUNCTIONS = {'abs': 1, 'min': 2, 'max': 2}
+
+def describe(value):
+    return 'end of expression' if value is None else repr(value)
+
+def tokenize(text):
+    """Split an expression into (kind, value, position) tokens"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if not match or match.end() == position:
+            position += len(text[position:]) - len(text[position:].lstrip())
+            raise ScreenerError(f"Unexpected character at position {position}: {text[position]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        start = match.start(kind)
+        if kind == 'name' and value.lower() in KEYWORDS:
+            kind, value = 'keyword', value.lower()
+        tokens.append((kind, value, start))
+        position = match.end()
+    tokens.append(('end', None, len(text)))
+    return tokens
+
+class Parser:
+    """Recursive-descent parser producing a small tuple-based AST.
+    
+    Grammar (lowest precedence first)::
+        
+        expr       := and_expr ('or' and_expr)*
+        and_expr   := not_expr ('and' not_expr)*
+        not_expr   := 'not' not_expr | comparison
+        comparison := sum ( op sum | 'between' sum 'and' sum
+                          | ['not'] 'in' '(' literal (',' literal)* ')'
+                          | 'is' ['not'] 'null' )?
+        sum        := product (('+' | '-') product)*
+        product    := unary (('*' | '/') unary)*
+        unary      := '-' unary | atom
+        atom       := number | string | true | false | field
+                    | function '(' expr (',' expr)* ')' | '(' expr ')'
+    """
+    
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.index = 0
+    
+    def parse(self):
+        node = self.expr()
+        kind, value, position = self.peek()
+        if kind != 'end':
+            raise ScreenerError(f"Unexpected {describe(value)} at position {position}")
+        return node
+    
+    def peek(self):
+        return self.tokens[self.index]
+    
+    def next(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+    
+    def accept(self, kind, value=None):
+        token_kind, token_value, _ = self.peek()
+        if token_kind == kind and (value is None or token_value == value):
+            return self.next()
+        return None
+    
+    def expect(self, kind, value=None):
+        token = self.accept(kind, value)
+        if token is None:
+            _, found, position = self.peek()
+            raise ScreenerError(f"Expected {value or kind} at position {position}, found {describe(found)}")
+        return token
+    
+    def expr(self):
+        node = self.and_expr()
+        while self.accept('keyword', 'or'):
+            node = ('or', node, self.and_expr())
+        return node
+    
+    def and_expr(self):
+        node = self.not_expr()
+        while self.accept('keyword', 'and'):
+            node = ('and', node, self.not_expr())
+        return node
+    
+    def not_expr(self):
+        if self.accept('keyword', 'not'):
+            return ('not', self.not_expr())
+        return self.comparison()
+    
+    def comparison(self):
+        left = self.sum()
+        kind, value, _ = self.peek()
+        
+        if kind == 'op' and value in COMPARISONS:
+            self.next()
+            return ('compare', '==' if value == '=' else value, left, self.sum())
+        
+        if self.accept('keyword', 'between'):
+            low = self.sum()
+            self.expect('keyword', 'and')
+            return ('between', left, low, self.sum())
+        
+        negate = False
+        if kind == 'keyword' and value == 'not' and self.tokens[self.index + 1][1] == 'in':
+            self.next()
+            negate = True
+        if self.accept('keyword', 'in'):
+            self.expect('op', '(')
+            values = [self.literal()]
+            while self.accept('op', ','):
+                values.append(self.literal())
+            self.expect('op', ')')
+            node = ('in', left, tuple(values))
+            return ('not', node) if negate else node
+        
+        if self.accept('keyword', 'is'):
+            negate = bool(self.accept('keyword', 'not'))
+            self.expect('keyword', 'null')
+            node = ('isnull', left)
+            return ('not', node) if negate else node
+        
+        return left
+    
+    def sum(self):
+        node = self.product()
+        while True:
+            token = self.accept('op', '+') or self.accept('op', '-')
+            if not token:
+                return node
+            node = ('arith', token[1], node, self.product())
+    
+    def product(self):
+        node = self.unary()
+        while True:
+            token = self.accept('op', '*') or self.accept('op', '/')
+            if not token:
+                return node
+            node = ('arith', token[1], node, self.unary())
+    
+    def unary(self):
+        if self.accept('op', '-'):
+            return ('neg', self.unary())
+        return self.atom()
+    
+    def literal(self):
+        negative = bool(self.accept('op', '-'))
+        kind, value, position = self.next()
+        if kind == 'number':
+            return -float(value) if negative else float(value)
+        if kind == 'string' and not negative:
+            return value[1:-1]
+        raise ScreenerError(f"Expected a literal at position {position}, found {describe(value)}")
+    
+    def atom(self):
+        kind, value, position = self.next()
+        if kind == 'number':
+            return ('const', float(value))
+        if kind == 'string':
+            return ('const', value[1:-1])
+        if kind == 'keyword' and value in ('true', 'false'):
+            return ('const', value == 'true')
+        if kind == 'op' and value == '(':
+            node = self.expr()
+            self.expect('op', ')')
+            return node
+        if kind == 'name':
+            if self.accept('op', '('):
+                name = value.lower()
+                if name not in FUNCTIONS:
+                    raise ScreenerError(f"Unknown function {value!r} at position {position}")
+                args = [self.expr()]
+                while self.accept('op', ','):
+                    args.append(self.expr())
+                self.expect('op', ')')
+                if len(args) != FUNCTIONS[name]:
+                    raise ScreenerError(f"{name}() takes {FUNCTIONS[name]} argument(s)")
+                return ('call', name, tuple(args))
+            return ('field', value)
+        raise ScreenerError(f"Unexpected {describe(value)} at position {position}")
+
+def fields(node):
+    """Names of all feature columns an AST reads"""
+    kind = node[0]
+    if kind == 'field':
+        return {node[1]}
+    if kind == 'const':
+        return set()
+    if kind == 'call':
+        children = node[2]
+    elif kind == 'in':
+        children = node[1:2]
+    elif kind in ('compare', 'arith'):
+        children = node[2:]
+    else:
+        children = node[1:]
+    return set().union(*(fields(child) for child in children))
+
+def label(node):
+    """Short description of an operand for error messages"""
+    if node[0] == 'field':
+        return node[1]
+    if node[0] == 'const':
+        return repr(node[1]).lower() if isinstance(node[1], bool) else repr(node[1])
+    return 'expression'
+
+def literal_type(value):
+    if isinstance(value, str):
+        return 'text'
+    return 'bool' if isinstance(value, bool) else 'number'
+
+def check_types(node, types):
+    """Type of an AST node ('number', 'bool', 'text' or None if unknown).
+    
+    ``types`` maps field names to their type; fields missing from it are
+    unknown and match anything. Raises ScreenerError for operands that could
+    never be evaluated together, e.g. ``rsi < 'abc'`` or ``sector + 1``.
+    """
+    kind = node[0]
+    if kind == 'const':
+        return literal_type(node[1])
+    if kind == 'field':
+        return types.get(node[1])
+    
+    if kind in ('neg', 'arith', 'call'):
+        operands = node[1:2] if kind == 'neg' else node[2] if kind == 'call' else node[2:]
+        for operand in operands:
+            if check_types(operand, types) in ('text', 'bool'):
+                what = f"{node[1]}()" if kind == 'call' else 'arithmetic'
+                raise ScreenerError(f"{label(operand)} is not a number and cannot be used in {what}")
+        return 'number'
+    
+    if kind in ('compare', 'between', 'in'):
+        if kind == 'in':
+            operands = [node[1]] + [('const', value) for value in node[2]]
+        else:
+            operands = node[2:] if kind == 'compare' else node[1:]
+        typed = [(operand, check_types(operand, types)) for operand in operands]
+        typed = [(operand, operand_type) for operand, operand_type in typed if operand_type is not None]
+        for operand, operand_type in typed[1:]:
+            if (operand_type == 'text') != (typed[0][1] == 'text'):
+                raise ScreenerError(f"Cannot compare {label(typed[0][0])} with {label(operand)}: "
+                                    f"one is text and the other is not")
+        return 'bool'
+    
+    for child in node[1:]:
+        child_type = check_types(child, types)
+        if kind != 'isnull' and child_type == 'text':
+            raise ScreenerError(f"{label(child)} is text and cannot be used as a condition")
+    return 'bool'
+
+class Expression:
+    """A parsed screen expression that evaluates to a vectorized column"""
+    
+    def __init__(self, text):
+        self.text = text
+        self.tree = Parser(text).parse()
+        self.fields = fields(self.tree)
+        # Literal-only mismatches fail now; field types are checked per frame
+        check_types(self.tree, {})
+    
+    def field_types(self, frame):
+        """Types of the fields this expression reads, from the frame's dtypes"""
+        from pandas.api.types import is_bool_dtype, is_numeric_dtype
+        types = {}
+        for name in self.fields:
+            dtype = frame[name].dtype
+            types[name] = 'bool' if is_bool_dtype(dtype) else 'number' if is_numeric_dtype(dtype) else 'text'
+        return types
+    
+    def evaluate(self, frame):
+        """Evaluate over a feature frame; returns a Series aligned with its index"""
+        import pandas as pd
+        
+        missing = self.fields - set(frame.columns)
+        if missing:
+            raise ScreenerError(f"Unknown field(s): {', '.join(sorted(missing))}")
+        check_types(self.tree, self.field_types(frame))
+        
+        result = self._eval(self.tree, frame)
+        if not isinstance(result, pd.Series):
+            result = pd.Series(result, index=frame.index)
+        return result
+    
+    def mask(self, frame):
+        """Boolean mask; rows where the expression is null count as False"""
+        result = self.evaluate(frame)
+        if result.dtype != bool:
+            result = result.fillna(False).astype(bool)
+        return result
+    
+    def _eval(self, node, frame):
+        import numpy as np
+        import pandas as pd
+        
+        kind = node[0]
+        if kind == 'const':
+            return node[1]
+        if kind == 'field':
+            return frame[node[1]]
+        if kind == 'neg':
+            return -self._eval(node[1], frame)
+        if kind == 'arith':
+            left, right = self._eval(node[2], frame), self._eval(node[3], frame)
+            if node[1] == '+':
+                return left + right
+            if node[1] == '-':
+                return left - right
+            if node[1] == '*':
+                return left * right
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result = left / right
+            # Division by zero yields null rather than +/-inf
+            return result.replace([np.inf, -np.inf], np.nan) if isinstance(result, pd.Series) else result
+        if kind == 'call':
+            args = [self._eval(arg, frame) for arg in node[2]]
+            if node[1] == 'abs':
+                return abs(args[0])
+            combine = np.fmin if node[1] == 'min' else np.fmax
+            return combine(*args)
+        if kind == 'compare':
+            left, right = self._eval(node[2], frame), self._eval(node[3], frame)
+            ops = {
+                '<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+                '>': lambda a, b: a > b, '>=': lambda a, b: a >= b,
+                '==': lambda a, b: a == b, '!=': lambda a, b: a != b
+            }
+            return self._as_mask(ops[node[1]](left, right), frame)
+        if kind == 'between':
+            value = self._eval(node[1], frame)
+            low, high = self._eval(node[2], frame), self._eval(node[3], frame)
+            return self._as_mask((value >= low) & (value <= high), frame)
+        if kind == 'in':
+            value = self._eval(node[1], frame)
+            if not isinstance(value, pd.Series):
+                value = pd.Series(value, index=frame.index)
+            return self._as_mask(value.isin(list(node[2])), frame)
+        if kind == 'isnull':
+            return self._as_mask(pd.isna(self._eval(node[1], frame)), frame)
+        if kind == 'not':
+            return ~self._truthy(self._eval(node[1], frame), frame)
+        if kind == 'and':
+            return self._truthy(self._eval(node[1], frame), frame) & self._truthy(self._eval(node[2], frame), frame)
+        if kind == 'or':
+            return self._truthy(self._eval(node[1], frame), frame) | self._truthy(self._eval(node[2], frame), frame)
+        raise ScreenerError(f"Unsupported expression node {kind!r}")
+    
+    @staticmethod
+    def _as_mask(value, frame):
+        import pandas as pd
+        if not isinstance(value, pd.Series):
+            return pd.Series(bool(value), index=frame.index)
+        return value.fillna(False).astype(bool)
+    
+    def _truthy(self, value, frame):
+        """Coerce a column to bool; null and zero are False"""
+        import pandas as pd
+        if isinstance(value, pd.Series) and value.dtype == bool:
+            return value
+        if not isinstance(value, pd.Series):
+            return pd.Series(bool(value), index=frame.index)
+        return value.fillna(0).astype(bool)
+
+@lru_cache(maxsize=256)
+def compile_expression(text):
+    """Parse an expression once; repeated screens reuse the cached AST"""
+    return Expression(text)
+
+class FeatureTable:
+    """Per-symbol feature rows with a lazily built DataFrame for screening.
+    
+    Every change bumps ``version`` and stamps the row with it, so clients can
+    ask for the rows changed since the version they hold. ``epoch`` is new for
+    each process (and each load); versions from another epoch mean a full reload.
+    The table lives in process memory, which is why production mode serves the
+    app from a single worker process (see run.py).
+    """
+    
+    def __init__(self):
+        self.rows = {}
+        self.frame = None
+        self.lock = threading.Lock()
+        
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.row_versions = {}
+    
+    def load(self, rows):
+        """Replace all rows, e.g. from the database at startup"""
+        with self.lock:
+            self.rows = {row['symbol']: dict(row) for row in rows}
+            self.frame = None
+            self.epoch = uuid.uuid4().hex[:12]
+            self.version += 1
+            self.row_versions = dict.fromkeys(self.rows, self.version)
+        logger.info(f"Loaded screening features for {len(self.rows)} symbols")
+    
+    def update(self, symbol, features):
+        """Merge new feature values for one symbol"""
+        with self.lock:
+            row = self.rows.setdefault(symbol, {'symbol': symbol})
+            if symbol in self.row_versions and all(row.get(key) == value for key, value in features.items()):
+                return
+            row.update(features)
+            self.frame = None
+            self.version += 1
+            self.row_versions[symbol] = self.version
+    
+    def get(self, symbol):
+        """Copy of one symbol's row, or None"""
+        with self.lock:
+            row = self.rows.get(symbol)
+            return dict(row) if row is not None else None
+    
+    def changes_since(self, epoch=None, since=None, columns=None, where=None):
+        """Rows changed after version ``since`` of ``epoch``; all rows if that is not this epoch.
+        
+        Returns (epoch, version, full, rows); ``where`` filters rows and
+        ``columns`` picks their fields (each row also gets its ``version``).
+        """
+        with self.lock:
+            full = epoch != self.epoch or since is None or since > self.version
+            changed = [
+                (symbol, row_version) for symbol, row_version in self.row_versions.items()
+                if full or row_version > since
+            ]
+            rows = []
+            for symbol, row_version in changed:
+                row = self.rows[symbol]
+                if where is not None and not where(row):
+                    continue
+                rows.append({
+                    **({key: row.get(key) for key in columns} if columns else dict(row)),
+                    'symbol': symbol,
+                    'version': row_version
+                })
+            return self.epoch, self.version, full, rows
+    
+    def get_frame(self):
+        """DataFrame indexed by symbol, rebuilt only after rows change"""
+        import pandas as pd
+        with self.lock:
+            if self.frame is None:
+                frame = pd.DataFrame.from_records(list(self.rows.values()))
+                if not frame.empty:
+                    frame = frame.set_index('symbol', drop=False)
+                    for column in frame.columns:
+                        if frame[column].dtype == object and column not in ('symbol', 'name', 'sector', 'recommendation'):
+                            converted = pd.to_numeric(frame[column], errors='coerce')
+                            if converted.notna().sum() == frame[column].notna().sum():
+                                frame[column] = converted
+                self.frame = frame
+            return self.frame
+    
+    def columns(self):
+        frame = self.get_frame()
+        return sorted(column for column in frame.columns if column != 'symbol')
+    
+    def screen(self, where, score=None, descending=True, limit=50):
+        """Rows matching ``where``, ranked by ``score`` (default: overall_score)"""
+        import numpy as np
+        
+        frame = self.get_frame()
+        if frame.empty:
+            return 0, []
+        if not score and 'overall_score' in frame.columns:
+            score = 'overall_score'
+        
+        matched = frame[compile_expression(where).mask(frame)] if where else frame
+        if score:
+            ranking = compile_expression(score).evaluate(matched).astype(float)
+            matched = matched.assign(score=ranking).sort_values('score', ascending=not descending,
+                                                                na_position='last')
+        
+        rows = matched.head(limit).replace({np.nan: None}).to_dict(orient='records')
+        return len(matched), rows
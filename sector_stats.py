@@ -0,0 +1,138 @@
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SectorStatistics:
+    """In-memory sector aggregates backed by the sector_stats table.
+    
+    Aggregates are computed from the cached ``fundamentals`` table in one
+    group-by pass and kept in a dict keyed by (sector, metric), so lookups
+    during scoring cost no network or SQL round trip.
+    """
+    
+    METRICS = ['pe_ratio', 'pb_ratio', 'roe', 'gross_margin', 'operating_margin', 'profit_margin']
+    
+    # Ratios that are meaningless when non-positive (e.g. loss-making PE)
+    POSITIVE_ONLY = {'pe_ratio', 'pb_ratio'}
+    
+    # Minimum constituents before a sector median is used for scoring
+    MIN_COUNT = 3
+    
+    def __init__(self, db):
+        self.db = db
+        self.stats = {}
+        self.dirty_sectors = set()
+        self.lock = threading.Lock()
+    
+    def load(self):
+        """Load materialized aggregates from the database into memory"""
+        try:
+            stats = {}
+            for row in self.db.get_sector_stats():
+                stats[(row['sector'], row['metric'])] = {
+                    'median': row['median'],
+                    'p25': row['p25'],
+                    'p75': row['p75'],
+                    'count': row['count']
+                }
+            
+            with self.lock:
+                self.stats = stats
+            
+            logger.info(f"Loaded sector stats for {len({s for s, _ in stats})} sectors")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error loading sector stats: {str(e)}")
+            return False
+    
+    def mark_dirty(self, sector):
+        """Flag a sector whose constituents' fundamentals changed"""
+        if sector:
+            with self.lock:
+                self.dirty_sectors.add(sector)
+    
+    def refresh(self, full=False):
+        """Recompute aggregates for dirty sectors (or all sectors if full)"""
+        try:
+            with self.lock:
+                sectors = None if full else set(self.dirty_sectors)
+                self.dirty_sectors.clear()
+            
+            if sectors is not None and not sectors:
+                return 0
+            
+            rows = self.db.get_sector_fundamentals(sectors)
+            if not rows:
+                return 0
+            
+            import pandas as pd
+            frame = pd.DataFrame(rows)
+            computed = self.compute(frame)
+            refreshed = set(frame['sector'].unique()) | (sectors or set())
+            self.db.save_sector_stats(refreshed, computed)
+            
+            with self.lock:
+                self.stats = {k: v for k, v in self.stats.items() if k[0] not in refreshed}
+                for row in computed:
+                    self.stats[(row['sector'], row['metric'])] = {
+                        'median': row['median'],
+                        'p25': row['p25'],
+                        'p75': row['p75'],
+                        'count': row['count']
+                    }
+            
+            logger.info(f"Refreshed sector stats for {len(refreshed)} sectors")
+            return len(refreshed)
+        
+        except Exception as e:
+            logger.error(f"Error refreshing sector stats: {str(e)}")
+            return 0
+    
+    def compute(self, frame):
+        """Compute per-sector median/quartiles for all metrics in one group-by pass"""
+        import pandas as pd
+        long = frame.melt(id_vars=['sector'], value_vars=self.METRICS,
+                          var_name='metric', value_name='value')
+        long['value'] = pd.to_numeric(long['value'], errors='coerce')
+        long = long.dropna(subset=['value'])
+        positive = long['metric'].isin(self.POSITIVE_ONLY)
+        long = long[~positive | (long['value'] > 0)]
+        
+        grouped = long.groupby(['sector', 'metric'])['value']
+        summary = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+        summary['count'] = grouped.size()
+        
+        return [
+            {
+                'sector': sector,
+                'metric': metric,
+                'median': float(row[0.5]),
+                'p25': float(row[0.25]),
+                'p75': float(row[0.75]),
+                'count': int(row['count'])
+            }
+            for (sector, metric), row in summary.iterrows()
+        ]
+    
+    def get(self, sector, metric, stat='median'):
+        """O(1) lookup of a sector aggregate; None if unavailable"""
+        entry = self.stats.get((sector, metric))
+        if not entry:
+            return None
+        return entry.get(stat)
+    
+    def scoring_median(self, sector, metric):
+        """Sector median if it has enough constituents to score against, else None"""
+        entry = self.stats.get((sector, metric))
+        if not entry or not entry['median'] or entry['count'] < self.MIN_COUNT:
+            return None
+        return entry['median']
+    
+    def relative(self, sector, metric, value):
+        """Value as a multiple of the sector median; None if not comparable"""
+        median = self.scoring_median(sector, metric)
+        if value is None or median is None:
+            return None
+        return value / median
@@ -0,0 +1,72 @@
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution.
+    
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait and receive the same result (or exception). Keys are
+    tuples whose first element names the data type, e.g.
+    ``('stock_data', 'RELIANCE.NS')``; counters are kept per data type.
+    Results are shared, so callers must treat them as read-only.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.stats = {}
+    
+    def do(self, key, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` once per concurrent ``key`` and share the result"""
+        kind = key[0] if isinstance(key, tuple) else key
+        with self.lock:
+            stats = self.stats.setdefault(kind, {'calls': 0, 'executions': 0, 'coalesced': 0, 'errors': 0})
+            stats['calls'] += 1
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                stats['executions'] += 1
+            else:
+                call.waiters += 1
+                stats['coalesced'] += 1
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            with self.lock:
+                stats['errors'] += 1
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+            if call.waiters:
+                logger.debug(f"Coalesced {call.waiters} calls for {key}")
+    
+    def get_stats(self):
+        """Per data type call, execution, coalesced and error counts"""
+        with self.lock:
+            return {
+                'in_flight': len(self.calls),
+                'by_type': {kind: dict(stats) for kind, stats in self.stats.items()}
+            }
@@ -0,0 +1,224 @@
+import os
+import mmap
+import pickle
+import struct
+import tempfile
+import threading
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# File layout: header | pickled index | entry blobs. The index maps
+# section -> key -> (timestamp, offset, length) so entries are unpickled
+# one at a time, straight from the memory-mapped file, when first used.
+MAGIC = b'SRASNAP\x00'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIQ')  # magic, format version, index length
+
+class SnapshotReader:
+    """Read-only, memory-mapped view of a snapshot file"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, index_length = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported snapshot format {magic!r} v{version}")
+            
+            index_end = HEADER.size + index_length
+            index = pickle.loads(self.map[HEADER.size:index_end])
+            self.meta = index['meta']
+            self.sections = index['sections']
+            self.data_start = index_end
+        except Exception:
+            self.close()
+            raise
+    
+    @classmethod
+    def open(cls, path):
+        """Open a snapshot, or return None if it is missing or unreadable"""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except Exception as e:
+            logger.warning(f"Ignoring snapshot {path}: {str(e)}")
+            return None
+    
+    def keys(self, section):
+        return list(self.sections.get(section, {}))
+    
+    def timestamp(self, section, key):
+        return self.sections[section][key][0]
+    
+    def get_raw(self, section, key):
+        """Pickled bytes of one entry"""
+        _, offset, length = self.sections[section][key]
+        start = self.data_start + offset
+        return self.map[start:start + length]
+    
+    def get(self, section, key):
+        """Unpickle one entry"""
+        return pickle.loads(self.get_raw(section, key))
+    
+    def close(self):
+        if getattr(self, 'map', None) is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+def write_snapshot(path, sections, meta):
+    """Atomically write sections of {key: (timestamp, pickled bytes)}"""
+    index = {'meta': meta, 'sections': {}}
+    blobs = []
+    offset = 0
+    for section, entries in sections.items():
+        index['sections'][section] = {}
+        for key, (timestamp, payload) in entries.items():
+            index['sections'][section][key] = (timestamp, offset, len(payload))
+            blobs.append(payload)
+            offset += len(payload)
+    
+    encoded_index = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+    # A temp file of its own in the same directory, so that processes dumping
+    # at once (e.g. gunicorn workers) never write into each other's file and
+    # the final rename stays atomic; the last complete snapshot wins
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                     dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(encoded_index)))
+            f.write(encoded_index)
+            for payload in blobs:
+                f.write(payload)
+        
+        # Readers keep their mapping of the replaced file until they close it
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return offset + len(encoded_index) + HEADER.size
+
+class SnapshotManager:
+    """Periodic and shutdown snapshots of the collector's in-memory state.
+    
+    On load, cached stock records are registered without being unpickled and
+    quotes are restored eagerly. Records older than the collector's TTL are
+    still served while a background thread refreshes them, oldest first.
+    """
+    
+    def __init__(self, collector, path='stock_analyzer.snapshot', interval=300):
+        self.collector = collector
+        self.path = path
+        self.interval = interval
+        
+        self.reader = None
+        self.dumped_generation = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+    
+    def get_layout_version(self):
+        """Identifies the pickled record layout; a mismatch discards records"""
+        from stock_record import StockRecord
+        return ','.join(StockRecord.__slots__ + StockRecord.COLUMNS + (self.collector.price_dtype,))
+    
+    def load(self):
+        """Restore state from the snapshot file, if one exists"""
+        try:
+            reader = SnapshotReader.open(self.path)
+            if reader is None:
+                return False
+            
+            if reader.meta.get('layout') != self.get_layout_version():
+                logger.info("Snapshot record layout changed; ignoring cached records")
+                records = {}
+            else:
+                records = {symbol: reader.timestamp('records', symbol) for symbol in reader.keys('records')}
+            quotes = {symbol: reader.get('quotes', symbol) for symbol in reader.keys('quotes')}
+            
+            self.reader = reader
+            restored = self.collector.restore_snapshot(reader, records, quotes)
+            self.dumped_generation = self.collector.cache_generation
+            
+            logger.info(f"Loaded snapshot from {reader.meta.get('created_at')}: "
+                        f"{len(records)} records ({restored} due for refresh), {len(quotes)} quotes")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error loading snapshot: {str(e)}")
+            return False
+    
+    def dump(self, force=False):
+        """Write the current state if it changed since the last dump"""
+        try:
+            with self.lock:
+                if not force and self.collector.cache_generation == self.dumped_generation:
+                    return False
+                
+                generation = self.collector.cache_generation
+                records, quotes = self.collector.export_snapshot()
+                dumps = lambda value: pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                sections = {
+                    # Records never unpickled since load are copied as raw bytes
+                    'records': {
+                        symbol: (fetched_at, dumps(record) if record is not None
+                                 else self.reader.get_raw('records', symbol))
+                        for symbol, (fetched_at, record) in records.items()
+                    },
+                    'quotes': {symbol: (fetched_at, dumps((fetched_at, quote)))
+                               for symbol, (fetched_at, quote) in quotes.items()}
+                }
+                meta = {
+                    'created_at': datetime.now().isoformat(),
+                    'layout': self.get_layout_version()
+                }
+                size = write_snapshot(self.path, sections, meta)
+                self.dumped_generation = generation
+            
+            logger.info(f"Wrote snapshot: {len(records)} records, {size / 1e6:.1f} MB")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing snapshot: {str(e)}")
+            return False
+    
+    def start(self):
+        """Start background refresh of expired entries and periodic dumps"""
+        if self.thread is not None and self.thread.is_alive():
+            return False
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='snapshot', daemon=True)
+        self.thread.start()
+        return True
+    
+    def stop(self):
+        """Stop the background thread and write a final snapshot"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=30)
+            self.thread = None
+        self.dump()
+    
+    def _run(self):
+        for symbol in self.collector.get_pending_refresh():
+            if self.stop_event.is_set():
+                return
+            self.collector.refresh_stock_data(symbol)
+        
+        while not self.stop_event.wait(self.interval):
+            self.dump()
+    
+    def status(self):
+        return {
+            'path': self.path,
+            'loaded_from': self.reader.meta.get('created_at') if self.reader else None,
+            'pending_refresh': len(self.collector.pending_refresh),
+            'cached_records': len(self.collector.record_cache),
+            'last_dump_generation': self.dumped_generation,
+            'generation': self.collector.cache_generation
+        }
@@ -1,9 +1,320 @@
 // Stock Recovery Analyzer - Frontend JavaScript
 
+// Numeric result columns, kept in typed arrays (DASHBOARD_COLUMNS in app.py)
+const RESULT_COLUMNS = ['current_price', 'price_decline', 'fundamental_score', 'technical_score', 'overall_score'];
+
+const RECOMMENDATION_RANK = {
+    'Avoid': 1,
+    'Hold': 2,
+    'Moderate Buy': 3,
+    'Buy': 4,
+    'Strong Buy': 5
+};
+
+// Decode a little-endian base64 typed array payload (chart_series.encode_array)
+function decodeArray(encoded) {
+    const types = {
+        float64: Float64Array,
+        float32: Float32Array,
+        uint32: Uint32Array,
+        uint8: Uint8Array
+    };
+    const bytes = Uint8Array.from(atob(encoded.data), c => c.charCodeAt(0));
+    return new types[encoded.dtype](bytes.buffer, 0, encoded.length);
+}
+
+// Scored stocks in column-oriented typed arrays, patched in place by deltas
+class ResultSet {
+    constructor() {
+        this.reset();
+    }
+
+    reset(capacity = 1024) {
+        this.epoch = null;
+        this.version = null;
+        this.length = 0;
+        this.capacity = capacity;
+        this.columns = {};
+        RESULT_COLUMNS.forEach(key => this.columns[key] = new Float64Array(capacity));
+        this.meets = new Uint8Array(capacity);
+        this.ranks = new Uint8Array(capacity);
+        this.versions = new Uint32Array(capacity);
+        this.symbols = [];
+        this.names = [];
+        this.recommendations = [];
+        this.searchText = [];
+        this.rowBySymbol = new Map();
+    }
+
+    grow(needed) {
+        if (needed <= this.capacity) return;
+        
+        let capacity = this.capacity;
+        while (capacity < needed) capacity *= 2;
+        const resize = (array) => {
+            const resized = new array.constructor(capacity);
+            resized.set(array.subarray(0, this.length));
+            return resized;
+        };
+        
+        RESULT_COLUMNS.forEach(key => this.columns[key] = resize(this.columns[key]));
+        this.meets = resize(this.meets);
+        this.ranks = resize(this.ranks);
+        this.versions = resize(this.versions);
+        this.capacity = capacity;
+    }
+
+    // Apply a /api/results/delta payload; returns the number of rows it touched
+    applyDelta(delta) {
+        if (delta.full) {
+            this.reset(Math.max(1024, delta.count));
+        }
+        this.grow(this.length + delta.count);
+        
+        const columns = {};
+        RESULT_COLUMNS.forEach(key => columns[key] = decodeArray(delta.columns[key]));
+        const meets = decodeArray(delta.meets_criteria);
+        const versions = decodeArray(delta.versions);
+        
+        for (let i = 0; i < delta.count; i++) {
+            const symbol = delta.symbols[i];
+            let row = this.rowBySymbol.get(symbol);
+            if (row === undefined) {
+                row = this.length++;
+                this.rowBySymbol.set(symbol, row);
+                this.symbols[row] = symbol;
+            }
+            
+            RESULT_COLUMNS.forEach(key => this.columns[key][row] = columns[key][i]);
+            this.meets[row] = meets[i];
+            this.versions[row] = versions[i];
+            this.names[row] = delta.names[i];
+            this.recommendations[row] = delta.recommendations[i];
+            this.ranks[row] = RECOMMENDATION_RANK[delta.recommendations[i]] || 0;
+            this.searchText[row] = `${symbol} ${delta.names[i]}`.toUpperCase();
+        }
+        
+        this.epoch = delta.epoch;
+        this.version = delta.version;
+        return delta.count;
+    }
+
+    // Cache key for a symbol's detail payload; changes whenever its row does
+    detailVersion(symbol) {
+        const row = this.rowBySymbol.get(symbol);
+        return row === undefined ? null : `${this.epoch}:${this.versions[row]}`;
+    }
+
+    get(row) {
+        const stock = {
+            symbol: this.symbols[row],
+            name: this.names[row],
+            recommendation: this.recommendations[row],
+            meets_criteria: this.meets[row] === 1
+        };
+        RESULT_COLUMNS.forEach(key => stock[key] = this.columns[key][row]);
+        return stock;
+    }
+
+    count(predicate) {
+        let count = 0;
+        for (let row = 0; row < this.length; row++) {
+            if (predicate(row)) count++;
+        }
+        return count;
+    }
+
+    // Row indices passing the filters, in sort order
+    select(filters, sort) {
+        const query = (filters.query || '').trim().toUpperCase();
+        const overall = this.columns.overall_score;
+        const order = new Uint32Array(this.length);
+        let count = 0;
+        
+        for (let row = 0; row < this.length; row++) {
+            if (filters.meetsOnly && !this.meets[row]) continue;
+            if (filters.minScore && !(overall[row] >= filters.minScore)) continue;
+            if (query && !this.searchText[row].includes(query)) continue;
+            order[count++] = row;
+        }
+        
+        const selected = order.subarray(0, count);
+        const direction = sort.descending ? -1 : 1;
+        
+        if (sort.key === 'symbol') {
+            selected.sort((a, b) => direction * this.symbols[a].localeCompare(this.symbols[b]));
+        } else {
+            const values = sort.key === 'recommendation' ? this.ranks : this.columns[sort.key];
+            // Missing values (NaN) sort last in either direction
+            selected.sort((a, b) => {
+                const x = values[a];
+                const y = values[b];
+                if (x !== x) return y !== y ? 0 : 1;
+                if (y !== y) return -1;
+                return direction * (x - y) || a - b;
+            });
+        }
+        
+        return selected;
+    }
+}
+
+// Renders only the rows in view, with spacer rows standing in for the rest
+class VirtualTable {
+    constructor(viewport, tbody, renderRow, rowHeight = 64, overscan = 10) {
+        this.viewport = viewport;
+        this.tbody = tbody;
+        this.renderRow = renderRow;
+        this.rowHeight = rowHeight;
+        this.overscan = overscan;
+        this.rows = new Uint32Array(0);
+        this.range = null;
+        this.measured = false;
+        this.pending = false;
+        
+        viewport.addEventListener('scroll', () => this.schedule(), { passive: true });
+        window.addEventListener('resize', () => this.refresh());
+    }
+
+    setRows(rows) {
+        this.rows = rows;
+        this.refresh();
+    }
+
+    // Re-render even if the visible range is unchanged
+    refresh() {
+        this.range = null;
+        this.schedule();
+    }
+
+    schedule() {
+        if (this.pending) return;
+        this.pending = true;
+        requestAnimationFrame(() => {
+            this.pending = false;
+            this.render();
+        });
+    }
+
+    render() {
+        const total = this.rows.length;
+        if (total === 0) {
+            this.tbody.innerHTML = `
+                <tr>
+                    <td colspan="8" class="text-center text-muted py-4">
+                        <i class="fas fa-search fa-2x mb-2"></i><br>
+                        No stocks found meeting the criteria
+                    </td>
+                </tr>
+            `;
+            return;
+        }
+        
+        const top = this.viewport.scrollTop;
+        const height = this.viewport.clientHeight || window.innerHeight;
+        const first = Math.max(0, Math.floor(top / this.rowHeight) - this.overscan);
+        const last = Math.min(total, Math.ceil((top + height) / this.rowHeight) + this.overscan);
+        
+        if (this.range && this.range[0] === first && this.range[1] === last) return;
+        this.range = [first, last];
+        
+        const fragment = document.createDocumentFragment();
+        fragment.appendChild(this.spacer(first * this.rowHeight));
+        for (let i = first; i < last; i++) {
+            fragment.appendChild(this.renderRow(this.rows[i]));
+        }
+        fragment.appendChild(this.spacer((total - last) * this.rowHeight));
+        this.tbody.replaceChildren(fragment);
+        
+        // Spacer heights assume a fixed row height; take it from a real row once
+        if (!this.measured && last > first) {
+            const measured = this.tbody.children[1].offsetHeight;
+            this.measured = true;
+            if (measured && measured !== this.rowHeight) {
+                this.rowHeight = measured;
+                this.refresh();
+            }
+        }
+    }
+
+    spacer(height) {
+        const row = document.createElement('tr');
+        row.className = 'virtual-spacer';
+        row.innerHTML = `<td colspan="8" style="height: ${height}px"></td>`;
+        return row;
+    }
+}
+
+// Detail payloads in IndexedDB, valid while the symbol's result row is unchanged
+class DetailCache {
+    constructor(name = 'stock-analyzer', maxAge = 15 * 60 * 1000) {
+        this.maxAge = maxAge;
+        this.memory = new Map();
+        this.db = this.open(name).catch(error => {
+            console.warn('IndexedDB unavailable, caching details in memory:', error);
+            return null;
+        });
+    }
+
+    open(name) {
+        return new Promise((resolve, reject) => {
+            if (!window.indexedDB) {
+                reject(new Error('IndexedDB is not supported'));
+                return;
+            }
+            const request = indexedDB.open(name, 1);
+            request.onupgradeneeded = () => request.result.createObjectStore('details', { keyPath: 'symbol' });
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    async request(mode, operation) {
+        const db = await this.db;
+        return new Promise((resolve) => {
+            const request = operation(db.transaction('details', mode).objectStore('details'));
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => resolve(undefined);
+        });
+    }
+
+    async get(symbol, version) {
+        const entry = (await this.db)
+            ? await this.request('readonly', store => store.get(symbol))
+            : this.memory.get(symbol);
+        
+        if (!entry || entry.version !== version || Date.now() - entry.savedAt > this.maxAge) {
+            return null;
+        }
+        return entry.payload;
+    }
+
+    async put(symbol, version, payload) {
+        const entry = { symbol, version, savedAt: Date.now(), payload };
+        if (await this.db) {
+            await this.request('readwrite', store => store.put(entry));
+        } else {
+            this.memory.set(symbol, entry);
+        }
+    }
+
+    // Versions from another server epoch can never match again
+    async clear() {
+        this.memory.clear();
+        if (await this.db) {
+            await this.request('readwrite', store => store.clear());
+        }
+    }
+}
+
 class StockAnalyzer {
     constructor() {
         this.isScanning = false;
-        this.currentData = [];
+        this.results = new ResultSet();
+        this.detailCache = new DetailCache();
+        this.filters = { query: '', minScore: 0, meetsOnly: true };
+        this.sort = { key: 'overall_score', descending: true };
+        this.pollInterval = 60000;
         this.init();
     }
 
@@ -11,23 +322,59 @@ class StockAnalyzer {
         // Add fade-in animation to main content
         document.querySelector('.container').classList.add('fade-in');
         
-        // Load initial statistics
-        this.loadStatistics();
+        this.table = new VirtualTable(
+            document.getElementById('results-viewport'),
+            document.getElementById('results-tbody'),
+            row => this.createStockRow(this.results.get(row))
+        );
         
         // Set up event listeners
         this.setupEventListeners();
         
+        // Show stored results, then keep them current with deltas
+        this.refreshResults();
+        setInterval(() => {
+            if (!document.hidden && !this.isScanning) {
+                this.refreshResults();
+            }
+        }, this.pollInterval);
+        
         console.log('Stock Analyzer initialized');
     }
 
     setupEventListeners() {
         // Add event listener for stock details modal
         document.addEventListener('click', (e) => {
-            if (e.target.classList.contains('btn-details')) {
-                const symbol = e.target.getAttribute('data-symbol');
+            const button = e.target.closest('.btn-details');
+            if (button) {
+                const symbol = button.getAttribute('data-symbol');
                 this.showStockDetails(symbol);
             }
         });
+        
+        // Client-side filtering and sorting over the loaded result set
+        document.getElementById('results-search').addEventListener('input', (e) => {
+            this.filters.query = e.target.value;
+            this.renderResults();
+        });
+        document.getElementById('results-min-score').addEventListener('change', (e) => {
+            this.filters.minScore = parseFloat(e.target.value) || 0;
+            this.renderResults();
+        });
+        document.getElementById('results-meets-only').addEventListener('change', (e) => {
+            this.filters.meetsOnly = e.target.checked;
+            this.renderResults();
+        });
+        document.querySelectorAll('#results-table th[data-sort]').forEach(header => {
+            header.addEventListener('click', () => {
+                const key = header.getAttribute('data-sort');
+                this.sort = {
+                    key,
+                    descending: this.sort.key === key ? !this.sort.descending : key !== 'symbol'
+                };
+                this.renderResults();
+            });
+        });
 
         // Add to watchlist functionality
         document.getElementById('addToWatchlist').addEventListener('click', () => {
@@ -36,17 +383,35 @@ class StockAnalyzer {
         });
     }
 
-    async loadStatistics() {
+    // Fetch rows changed since the version we hold and patch them in
+    async refreshResults() {
         try {
-            // For now, show placeholder data
-            // In a real implementation, you'd fetch this from an API endpoint
-            document.getElementById('total-stocks').textContent = '50';
-            document.getElementById('meeting-criteria').textContent = '-';
-            document.getElementById('strong-buys').textContent = '-';
-            document.getElementById('last-updated').textContent = 'Never';
+            const params = new URLSearchParams();
+            if (this.results.epoch) {
+                params.set('epoch', this.results.epoch);
+                params.set('since', this.results.version);
+            }
+            
+            const response = await fetch(`/api/results/delta?${params}`);
+            const delta = await response.json();
+            if (!delta.success) {
+                throw new Error(delta.error || 'Request failed');
+            }
+            
+            // Versions live in the server process (production runs a single
+            // worker, see run.py), so a new epoch means it restarted and
+            // cached details can no longer be matched to row versions
+            if (delta.full && this.results.epoch && delta.epoch !== this.results.epoch) {
+                this.detailCache.clear();
+            }
+            if (this.results.applyDelta(delta) || delta.full) {
+                this.renderResults();
+                this.updateStatistics();
+                document.getElementById('last-updated').textContent = new Date().toLocaleString();
+            }
             
         } catch (error) {
-            console.error('Error loading statistics:', error);
+            console.error('Error loading results:', error);
         }
     }
 
@@ -89,9 +454,8 @@ class StockAnalyzer {
             this.updateProgress(90, 'Processing results...');
             
             if (data.success) {
-                this.currentData = data.stocks;
-                this.displayResults(data.stocks);
-                this.updateStatistics(data);
+                await this.refreshResults();
+                document.getElementById('results-section').scrollIntoView({ behavior: 'smooth' });
                 this.showMessage(`Scan completed successfully! Found ${data.stocks.length} stocks meeting criteria.`, 'success');
                 
                 // Update last updated time
@@ -124,32 +488,23 @@ class StockAnalyzer {
         progressText.textContent = text;
     }
 
-    displayResults(stocks) {
+    renderResults() {
         const resultsSection = document.getElementById('results-section');
-        const tbody = document.getElementById('results-tbody');
         
-        // Clear existing results
-        tbody.innerHTML = '';
-        
-        if (stocks.length === 0) {
-            tbody.innerHTML = `
-                <tr>
-                    <td colspan="8" class="text-center text-muted py-4">
-                        <i class="fas fa-search fa-2x mb-2"></i><br>
-                        No stocks found meeting the criteria
-                    </td>
-                </tr>
-            `;
-        } else {
-            stocks.forEach(stock => {
-                const row = this.createStockRow(stock);
-                tbody.appendChild(row);
-            });
+        if (this.results.length === 0) {
+            return;
         }
-        
-        // Show results section
         resultsSection.style.display = 'block';
-        resultsSection.scrollIntoView({ behavior: 'smooth' });
+        
+        const rows = this.results.select(this.filters, this.sort);
+        document.getElementById('results-count').textContent = `${rows.length} of ${this.results.length}`;
+        document.querySelectorAll('#results-table th[data-sort]').forEach(header => {
+            const active = header.getAttribute('data-sort') === this.sort.key;
+            header.classList.toggle('sorted', active);
+            header.setAttribute('data-direction', active && this.sort.descending ? 'desc' : 'asc');
+        });
+        
+        this.table.setRows(rows);
     }
 
     createStockRow(stock) {
@@ -165,8 +520,8 @@ class StockAnalyzer {
                 <div class="stock-symbol">${stock.symbol.replace('.NS', '')}</div>
                 <div class="stock-name">${stock.name}</div>
             </td>
-            <td class="price">₹${stock.current_price.toFixed(2)}</td>
-            <td class="price-decline">${stock.price_decline.toFixed(1)}%</td>
+            <td class="price">₹${this.formatNumber(stock.current_price)}</td>
+            <td class="price-decline">${this.formatNumber(stock.price_decline, 1)}%</td>
             <td>
                 <span class="score ${fundamentalScoreClass}">${stock.fundamental_score}/10</span>
             </td>
@@ -224,17 +579,27 @@ class StockAnalyzer {
             
             modal.show();
             
-            // Fetch stock details
-            const response = await fetch(`/api/stock/${symbol}`);
-            const data = await response.json();
+            // Reuse the cached payload while the symbol's result row is unchanged
+            const version = this.results.detailVersion(symbol);
+            let stock = version ? await this.detailCache.get(symbol, version) : null;
             
-            if (data.success) {
-                this.renderStockDetails(data.stock, symbol);
-                document.getElementById('addToWatchlist').setAttribute('data-symbol', symbol);
-            } else {
-                modalBody.innerHTML = `<div class="alert alert-danger">Error loading stock details: ${data.error}</div>`;
+            if (!stock) {
+                const response = await fetch(`/api/stock/${symbol}`);
+                const data = await response.json();
+                
+                if (!data.success) {
+                    modalBody.innerHTML = `<div class="alert alert-danger">Error loading stock details: ${data.error}</div>`;
+                    return;
+                }
+                stock = data.stock;
+                if (version) {
+                    this.detailCache.put(symbol, version, stock);
+                }
             }
             
+            this.renderStockDetails(stock, symbol);
+            document.getElementById('addToWatchlist').setAttribute('data-symbol', symbol);
+            
         } catch (error) {
             console.error('Error loading stock details:', error);
             document.getElementById('stockModalBody').innerHTML = 
@@ -331,9 +696,18 @@ class StockAnalyzer {
 
     async addToWatchlist(symbol) {
         try {
+            const response = await fetch('/api/watchlist', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ symbol })
+            });
+            const data = await response.json();
+            
+            if (!data.success) {
+                throw new Error(data.error || 'Request failed');
+            }
+            
             this.showMessage(`Added ${symbol.replace('.NS', '')} to watchlist`, 'success');
-            // In a real implementation, you'd make an API call here
-            // const response = await fetch('/api/watchlist', { method: 'POST', body: JSON.stringify({ symbol }) });
         } catch (error) {
             this.showMessage(`Error adding to watchlist: ${error.message}`, 'danger');
         }
@@ -356,10 +730,12 @@ class StockAnalyzer {
         }
     }
 
-    updateStatistics(data) {
-        const meetingCriteria = data.stocks.length;
-        const strongBuys = data.stocks.filter(s => s.recommendation === 'Strong Buy').length;
+    updateStatistics() {
+        const results = this.results;
+        const meetingCriteria = results.count(row => results.meets[row] === 1);
+        const strongBuys = results.count(row => results.ranks[row] === RECOMMENDATION_RANK['Strong Buy']);
         
+        document.getElementById('total-stocks').textContent = results.length;
         document.getElementById('meeting-criteria').textContent = meetingCriteria;
         document.getElementById('strong-buys').textContent = strongBuys;
     }
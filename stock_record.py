@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Compact per-symbol market data for the Stock Recovery Analyzer
+
+A ``StockRecord`` keeps OHLCV bars in one (5 x bars) NumPy array, optionally
+float32, together with the reduced ``info`` fields that fundamental scoring
+reads. ``historical_data`` and ``recent_data`` are DataFrames built over that
+array without copying, and ``recent_data`` is a row slice of the same block.
+Records also support ``record['key']`` and ``record.get('key')``, so code
+written against the old dict layout keeps working.
+
+Run ``python stock_record.py`` to print memory per symbol for the old dict
+layout and for compact records.
+"""
+
+import logging
+
+# numpy and pandas are imported on first use so that importing this module
+# stays cheap
+
+logger = logging.getLogger(__name__)
+
+def adjustment_factors(dates, close, events):
+    """Per-bar back-adjustment factors for corporate actions.
+    
+    ``dates`` are the bars' sorted 'YYYY-MM-DD' strings, ``close`` their
+    unadjusted closes and ``events`` (date, type, value) tuples. A split of
+    ratio r on date d divides every earlier price by r (and multiplies volume
+    by r); a dividend D scales earlier prices by 1 - D / previous close.
+    Yahoo reports dividends already adjusted for later splits, so D is first
+    multiplied back by the ratios of the splits in ``events`` after it.
+    Returns (price_factor, volume_factor), each built with one reverse
+    cumulative product over the event multipliers.
+    """
+    import numpy as np
+    
+    dates = np.asarray(dates)
+    splits = [(date, value) for date, action_type, value in events if action_type == 'split' and value > 0]
+    # Factor applied to bars before each event position
+    price_multiplier = np.ones(len(dates) + 1)
+    volume_multiplier = np.ones(len(dates) + 1)
+    for date, action_type, value in events:
+        position = int(np.searchsorted(dates, date, side='left'))
+        if position == 0:
+            continue  # no bars before the event
+        if action_type == 'split' and value > 0:
+            price_multiplier[position] /= value
+            volume_multiplier[position] *= value
+        elif action_type == 'dividend':
+            amount = value * np.prod([ratio for split_date, ratio in splits if split_date > date])
+            previous_close = close[position - 1]
+            if previous_close > amount > 0:
+                price_multiplier[position] *= 1 - amount / previous_close
+    
+    # factor[i] = product of multipliers for all events after bar i
+    price_factor = np.cumprod(price_multiplier[::-1])[::-1][1:]
+    volume_factor = np.cumprod(volume_multiplier[::-1])[::-1][1:]
+    return price_factor, volume_factor
+
+class StockRecord:
+    COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+    
+    # Keys of the legacy stock_data dict that are served by attributes
+    KEYS = ('symbol', 'name', 'current_price', 'historical_data', 'recent_data',
+            'price_decline', 'max_price_2y', 'fundamental_data', 'info')
+    
+    __slots__ = ('symbol', 'name', 'index', 'values', 'recent_start', 'current_price',
+                 'max_price_2y', 'price_decline', 'fundamental_data', 'info')
+    
+    def __init__(self, symbol, name, index, values, recent_start, fundamental_data, info):
+        import numpy as np
+        
+        self.symbol = symbol
+        self.name = name
+        self.index = index
+        self.values = values
+        self.recent_start = recent_start
+        self.fundamental_data = fundamental_data
+        self.info = info
+        
+        close = values[3]
+        self.current_price = float(close[-1])
+        self.max_price_2y = float(np.nanmax(close))
+        self.price_decline = (self.max_price_2y - self.current_price) / self.max_price_2y * 100
+    
+    @classmethod
+    def from_history(cls, symbol, name, hist_data, fundamental_data, info, recent_days=90, dtype='float64'):
+        """Build a record from a yfinance history frame, dropping unused columns"""
+        import numpy as np
+        
+        values = np.empty((len(cls.COLUMNS), len(hist_data)), dtype=dtype)
+        for row, column in enumerate(cls.COLUMNS):
+            values[row] = hist_data[column].to_numpy(dtype=dtype)
+        
+        return cls.from_arrays(symbol, name, hist_data.index, values, fundamental_data, info, recent_days)
+    
+    @classmethod
+    def from_arrays(cls, symbol, name, index, values, fundamental_data, info, recent_days=90):
+        """Build a record from a DatetimeIndex and a (5 x bars) array in COLUMNS order"""
+        import pandas as pd
+        
+        recent_start = int(index.searchsorted(index[-1] - pd.Timedelta(days=recent_days)))
+        return cls(symbol, name, index, values, recent_start, fundamental_data, info)
+    
+    def adjusted(self, events, inverse=False):
+        """Copy of the record with (date, type, value) corporate actions back-adjusted into its bars.
+        
+        ``inverse`` divides by the factors instead, undoing an adjustment.
+        """
+        import numpy as np
+        
+        dates = np.asarray(self.index.strftime('%Y-%m-%d'))
+        price_factor, volume_factor = adjustment_factors(dates, self.values[3].astype(np.float64), events)
+        if inverse:
+            price_factor, volume_factor = 1 / price_factor, 1 / volume_factor
+        values = self.values.copy()
+        values[:4] = values[:4] * price_factor
+        values[4] = values[4] * volume_factor
+        return StockRecord(self.symbol, self.name, self.index, values, self.recent_start,
+                           self.fundamental_data, self.info)
+    
+    @property
+    def historical_data(self):
+        """OHLCV DataFrame over the record's array (no copy)"""
+        import pandas as pd
+        return pd.DataFrame(self.values.T, index=self.index, columns=list(self.COLUMNS), copy=False)
+    
+    @property
+    def recent_data(self):
+        """Last ``recent_days`` of bars as a view of historical_data"""
+        return self.historical_data.iloc[self.recent_start:]
+    
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __contains__(self, key):
+        return key in self.KEYS
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.KEYS else default
+    
+    def nbytes(self):
+        """Approximate bytes held by the bar arrays"""
+        return int(self.values.nbytes + self.index.nbytes)
+
+def _synthetic_history(bars=500, seed=11):
+    """History frame shaped like yfinance output (7 float64 columns, tz-aware dates)"""
+    import numpy as np
+    import pandas as pd
+    
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    index = pd.date_range(end='2024-06-28', periods=bars, freq='B', tz='Asia/Kolkata')
+    return pd.DataFrame({
+        'Open': close * 0.995,
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Volume': rng.integers(100_000, 5_000_000, bars).astype(np.float64),
+        'Dividends': np.zeros(bars),
+        'Stock Splits': np.zeros(bars)
+    }, index=index)
+
+def _synthetic_info(fields, extra_keys=180):
+    """Ticker.info stand-in: the used fields plus the long tail Yahoo returns"""
+    info = {field: 1.5 for field in fields}
+    info['longName'] = 'Synthetic Industries Limited'
+    for i in range(extra_keys):
+        info[f'field{i}'] = f'value-{i}' * (1 + i % 6) if i % 3 else float(i)
+    info['companyOfficers'] = [{'name': f'Officer {i}', 'title': 'Director', 'age': 50} for i in range(10)]
+    info['longBusinessSummary'] = 'Synthetic business description. ' * 40
+    return info
+
+def benchmark(symbols=200, bars=500):
+    """Report traced memory per symbol for dict-of-frames vs compact records"""
+    import tracemalloc
+    from data_collector import StockDataCollector
+    
+    collector = StockDataCollector()
+    fields = list(StockDataCollector.FUNDAMENTAL_FIELDS.values())
+    
+    def legacy(i):
+        hist = _synthetic_history(bars, seed=i)
+        info = _synthetic_info(fields)
+        return {
+            'symbol': f'SYM{i}.NS',
+            'name': info['longName'],
+            'current_price': hist['Close'].iloc[-1],
+            'historical_data': hist,
+            'recent_data': hist.iloc[-63:].copy(),  # the old second history() download
+            'price_decline': 0.0,
+            'max_price_2y': hist['Close'].max(),
+            'fundamental_data': collector.get_fundamental_metrics(info),
+            'info': info
+        }
+    
+    def compact(i, dtype):
+        hist = _synthetic_history(bars, seed=i)
+        info = collector.reduce_info(_synthetic_info(fields))
+        return StockRecord.from_history(f'SYM{i}.NS', info['longName'], hist,
+                                        collector.get_fundamental_metrics(info), info, dtype=dtype)
+    
+    def measure(build):
+        tracemalloc.start()
+        held = [build(i) for i in range(symbols)]
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del held
+        return current / symbols
+    
+    print(f"🧮 Memory per symbol ({bars} bars, {symbols} symbols held):")
+    baseline = measure(legacy)
+    print(f"   dict + DataFrames:  {baseline / 1024:8.1f} KiB")
+    for dtype in ('float64', 'float32'):
+        per_symbol = measure(lambda i: compact(i, dtype))
+        print(f"   StockRecord {dtype}: {per_symbol / 1024:8.1f} KiB  ({baseline / per_symbol:4.1f}x smaller)")
+
+if __name__ == "__main__":
+    benchmark()